@@ -0,0 +1,49 @@
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+
+class CacheTag(db.Model):
+    """Shared version counter per response cache tag.
+
+    Lets every worker, and writers outside the API such as the scraper's
+    ingest pipeline, invalidate the in-process response caches: a worker's
+    cached entries go stale once a tag's version here moves on.
+    """
+    __tablename__ = 'cache_tags'
+
+    tag = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheTag {self.tag} v{self.version}>'
+
+    @classmethod
+    def get_versions(cls):
+        """Map every known tag to its current version.
+
+        Read from the primary on a connection of its own: a lagging read
+        replica would keep serving responses that were already invalidated.
+        """
+        with db.engine.connect() as conn:
+            return dict(conn.execute(select(cls.tag, cls.version)).all())
+
+    @classmethod
+    def bump(cls, tags):
+        """Increment the versions of tags in a transaction of their own"""
+        try:
+            cls._bump(tags)
+        except IntegrityError:
+            # Another writer created one of the tags first; now they all exist
+            cls._bump(tags)
+
+    @classmethod
+    def _bump(cls, tags):
+        table = cls.__table__
+        with db.engine.begin() as conn:
+            for tag in tags:
+                bumped = conn.execute(
+                    update(table).where(table.c.tag == tag).values(version=table.c.version + 1)
+                )
+                if not bumped.rowcount:
+                    conn.execute(insert(table).values(tag=tag, version=1))
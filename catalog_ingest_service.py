@@ -0,0 +1,127 @@
+"""
+Catalog Ingest Service
+
+Bulk upserts of scraped products and stores into the API schema. Chains and
+categories are keyed by a slug of their name and created the first time they
+are seen. Each upsert loads the existing rows with one query per chunk,
+inserts new rows with an executemany insert and updates only the rows whose
+values changed. Columns owned by admins (is_active, and a store's name and
+location) are only set when a row is first inserted, so re-ingesting never
+undoes a soft delete or an edit made through the API, and a None value never
+overwrites an existing one, so a sparse scrape keeps what earlier scrapes
+found. The caller commits.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+
+from src.models.user import db
+from src.models.deal import Deal
+from src.models.grocery_chain import GroceryChain
+from src.models.product import Product
+from src.models.product_category import ProductCategory
+from src.models.store import Store
+
+# Keys per IN list when loading existing rows
+LOOKUP_CHUNK_SIZE = 500
+
+# Columns set on insert only; afterwards they belong to the admin routes
+PRODUCT_INSERT_ONLY_COLUMNS = ('is_active',)
+STORE_INSERT_ONLY_COLUMNS = (
+    'is_active', 'store_name', 'address_street', 'address_city',
+    'address_province', 'postal_code', 'latitude', 'longitude'
+)
+
+
+def make_id(name: str, max_length: int = 20) -> str:
+    """Slug id for a chain or category name (e.g. 'No Frills' -> 'no_frills')"""
+    slug = re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+    return slug[:max_length].rstrip('_') or 'unknown'
+
+
+def _upsert(model, rows: List[Dict], update_existing: bool = True,
+            insert_only: Tuple[str, ...] = ()) -> Tuple[Dict[str, int], List]:
+    """Insert new rows and update changed ones, matched on the model's primary key.
+
+    insert_only columns are written for new rows but never compared or
+    updated on existing ones, and neither are None values. Returns the
+    counts and the keys of the updated rows.
+    """
+    key = model.__mapper__.primary_key[0].key
+    column = getattr(model, key)
+
+    # Later rows for the same key win
+    by_key = {row[key]: row for row in rows}
+    if not by_key:
+        return {'inserted': 0, 'updated': 0}, []
+
+    fields = sorted(set().union(*by_key.values()) - set(insert_only))
+    keys = list(by_key)
+    existing = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        for row in db.session.execute(
+            select(*[getattr(model, field) for field in fields]).where(column.in_(chunk))
+        ).mappings():
+            existing[row[key]] = row
+
+    inserts = [row for row_key, row in by_key.items() if row_key not in existing]
+    updates = []
+    if update_existing:
+        for row_key, row in by_key.items():
+            if row_key not in existing:
+                continue
+            values = {
+                field: value for field, value in row.items()
+                if field not in insert_only and value is not None
+            }
+            if any(existing[row_key][field] != value for field, value in values.items()):
+                updates.append(values)
+
+    if inserts:
+        db.session.execute(insert(model), inserts)
+    if updates:
+        db.session.execute(update(model), updates)
+
+    return {'inserted': len(inserts), 'updated': len(updates)}, [row[key] for row in updates]
+
+
+def ensure_chains(chains: Dict[str, str]) -> int:
+    """Create missing grocery chains from a {chain_id: chain_name} map; returns how many were added"""
+    rows = [{'chain_id': chain_id, 'chain_name': name} for chain_id, name in chains.items()]
+    return _upsert(GroceryChain, rows, update_existing=False)[0]['inserted']
+
+
+def ensure_categories(categories: Dict[str, Tuple[str, Optional[str]]]) -> int:
+    """Create missing categories from a {category_id: (name, parent_category_id)} map; returns how many were added"""
+    # Parents first, so subcategories can reference them
+    ordered = sorted(categories.items(), key=lambda item: item[1][1] is not None)
+    rows = [
+        {'category_id': category_id, 'category_name': name, 'parent_category_id': parent_id}
+        for category_id, (name, parent_id) in ordered
+    ]
+    return _upsert(ProductCategory, rows, update_existing=False)[0]['inserted']
+
+
+def upsert_products(rows: List[Dict]) -> Dict[str, int]:
+    """Insert or update Product rows (dicts of Product columns including product_id).
+
+    Refreshes the deals of updated products, whose category may have changed.
+    """
+    counts, updated_ids = _upsert(Product, rows, insert_only=PRODUCT_INSERT_ONLY_COLUMNS)
+    if updated_ids:
+        Deal.refresh(product_ids=updated_ids)
+    return counts
+
+
+def upsert_stores(rows: List[Dict]) -> Dict[str, int]:
+    """Insert or update Store rows (dicts of Store columns including store_id).
+
+    Refreshes the deals of updated stores, as the store routes do.
+    """
+    counts, updated_ids = _upsert(Store, rows, insert_only=STORE_INSERT_ONLY_COLUMNS)
+    if updated_ids:
+        Deal.refresh(store_ids=updated_ids)
+    return counts
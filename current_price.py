@@ -0,0 +1,99 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from sqlalchemy import func, insert, select
+from src.models.user import db
+
+class CurrentPrice(db.Model):
+    """Pointer to the current Price row for each product-store pair.
+
+    The prices table keeps every historical version; this table holds exactly
+    one row per (product_id, store_id), so current-price reads cost
+    O(stores per product) however long the history grows.
+    """
+    __tablename__ = 'current_prices'
+    __table_args__ = (
+        db.Index('ix_current_prices_store', 'store_id'),
+    )
+
+    product_id = db.Column(db.String(50), db.ForeignKey('products.product_id'), primary_key=True)
+    store_id = db.Column(db.String(50), db.ForeignKey('stores.store_id'), primary_key=True)
+    price_id = db.Column(db.Integer, db.ForeignKey('prices.price_id'), nullable=False, unique=True)
+
+    # Relationships
+    price = db.relationship('Price', lazy='joined')
+
+    def __repr__(self):
+        return f'<CurrentPrice {self.product_id} @ {self.store_id}: {self.price_id}>'
+
+    @classmethod
+    def replace(cls, price, now=None):
+        """Make price the current price for its product-store pair.
+
+        Closes out the previous current price (if any) by setting its valid_to.
+        Must run in the same transaction as the insert of price so the pointer
+        and the history never disagree. Returns the previous Price or None.
+        """
+        now = now or datetime.utcnow()
+
+        # Assign price.price_id
+        db.session.flush()
+
+        current = db.session.get(cls, (price.product_id, price.store_id))
+        if current is None:
+            db.session.add(cls(product_id=price.product_id, store_id=price.store_id, price_id=price.price_id))
+            return None
+
+        previous = current.price
+        previous.valid_to = now
+        current.price_id = price.price_id
+        return previous
+
+    @classmethod
+    def remove(cls, price):
+        """Detach a Price that is about to be deleted.
+
+        If it was current, the most recent remaining version for the pair is
+        reopened and becomes current instead.
+        """
+        from src.models.price import Price
+
+        current = db.session.get(cls, (price.product_id, price.store_id))
+        if current is None or current.price_id != price.price_id:
+            return
+
+        previous = Price.query.filter(
+            Price.product_id == price.product_id,
+            Price.store_id == price.store_id,
+            Price.price_id != price.price_id
+        ).order_by(Price.valid_from.desc(), Price.price_id.desc()).first()
+
+        if previous:
+            previous.valid_to = None
+            current.price_id = previous.price_id
+        else:
+            db.session.delete(current)
+
+        # Release the foreign key before the price row goes away
+        db.session.flush()
+
+    @classmethod
+    def rebuild(cls):
+        """Repopulate the table from open (valid_to IS NULL) price rows.
+
+        Used after seeding and to backfill databases created before this table
+        existed. The caller commits.
+        """
+        from src.models.price import Price
+
+        db.session.query(cls).delete()
+        latest_open = select(
+            Price.product_id,
+            Price.store_id,
+            func.max(Price.price_id)
+        ).where(
+            Price.valid_to.is_(None)
+        ).group_by(Price.product_id, Price.store_id)
+
+        db.session.execute(
+            insert(cls).from_select(['product_id', 'store_id', 'price_id'], latest_open)
+        )
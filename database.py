@@ -0,0 +1,160 @@
+"""
+Database
+
+Engine configuration read from the environment, and the explicit schema
+initialization that used to run at import time in every worker.
+
+DATABASE_URL selects the database (defaulting to the bundled SQLite file).
+Server databases get a sized connection pool with pre-ping and recycling;
+primary SQLite connections are switched to WAL with relaxed syncing and a busy
+timeout, so concurrent gunicorn workers wait for the writer instead of
+failing with "database is locked".
+
+DATABASE_READ_URL optionally adds a read-only engine for GET requests (see
+read_routing). Pointing it at the primary SQLite file gives a separate
+query_only reader on the WAL.
+"""
+
+import os
+import sqlite3
+
+from sqlalchemy import event
+
+from src.models.user import db
+from src.services.read_routing import READ_REPLICA_BIND, init_read_routing
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'app.db')
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 268435456,  # 256 MB
+    'cache_size': -65536,  # 64 MB (negative values are KiB)
+    'temp_store': 'MEMORY'
+}
+
+
+def _normalize_url(url):
+    # Heroku/Railway style URLs use the scheme SQLAlchemy dropped in 1.4
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def get_database_url():
+    """Database URL from DATABASE_URL, falling back to the local SQLite file"""
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        return f'sqlite:///{DEFAULT_SQLITE_PATH}'
+    return _normalize_url(url)
+
+
+def get_read_database_url():
+    """Read replica URL from DATABASE_READ_URL (None when reads use the primary)"""
+    url = os.environ.get('DATABASE_READ_URL')
+    return _normalize_url(url) if url else None
+
+
+def get_engine_options(url):
+    """Engine keyword arguments for a database URL, tunable from the environment"""
+    if url.startswith('sqlite'):
+        return {
+            'connect_args': {
+                'timeout': int(SQLITE_PRAGMAS['busy_timeout']) / 1000,
+                'check_same_thread': False
+            }
+        }
+
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def init_database(app):
+    """Configure the engine from the environment and bind db to the app.
+
+    Explicit SQLALCHEMY_DATABASE_URI / SQLALCHEMY_ENGINE_OPTIONS and
+    READ_DATABASE_URI in the app config take precedence.
+    """
+    url = app.config.setdefault('SQLALCHEMY_DATABASE_URI', get_database_url())
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', get_engine_options(url))
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    _ensure_sqlite_directory(url)
+
+    read_url = app.config.setdefault('READ_DATABASE_URI', get_read_database_url())
+    if read_url:
+        options = get_engine_options(read_url)
+        if read_url.startswith('postgresql'):
+            # Refuse writes even if the replica URL points at a writable server
+            options['connect_args'] = {'options': '-c default_transaction_read_only=on'}
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds.setdefault(READ_REPLICA_BIND, dict(options, url=read_url))
+        _ensure_sqlite_directory(read_url)
+
+    db.init_app(app)
+
+    # Only the primary: replicas and engines created elsewhere keep their own settings
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _set_sqlite_pragmas):
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+
+    init_read_routing(app, db)
+
+
+def _ensure_sqlite_directory(url):
+    if url.startswith('sqlite:///') and ':memory:' not in url:
+        os.makedirs(os.path.dirname(url[len('sqlite:///'):]) or '.', exist_ok=True)
+
+
+def create_schema():
+    """Create missing tables and indexes, and backfill derived tables that are still empty.
+
+    Run once per deploy (flask init-db), not per worker. Must be called inside
+    an app context.
+    """
+    from src.models.current_price import CurrentPrice
+    from src.models.deal import Deal
+    from src.models.price import Price
+    from src.models.price_rollup import PriceRollup
+
+    # The replica bind gets its schema through replication
+    db.create_all(bind_key=None)
+
+    # create_all skips indexes added to tables that already exist
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+    # Backfill current_prices for databases created before it existed
+    if CurrentPrice.query.first() is None and Price.query.first() is not None:
+        CurrentPrice.rebuild()
+        db.session.commit()
+
+    # Backfill price_rollups the same way
+    if PriceRollup.query.first() is None and Price.query.first() is not None:
+        PriceRollup.rebuild()
+        db.session.commit()
+
+    # ...and the deals feed
+    if Deal.query.first() is None and CurrentPrice.query.first() is not None:
+        Deal.refresh()
+        db.session.commit()
@@ -0,0 +1,122 @@
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, case, delete, func, insert, or_, select, tuple_
+from src.models.user import db
+
+class Deal(db.Model):
+    """Materialized feed of current on-sale prices.
+
+    Refreshed whenever prices for a product-store pair are written, with
+    savings, category, chain and location bucket precomputed so the deals
+    page is a single indexed range scan.
+    """
+    __tablename__ = 'deals'
+    __table_args__ = (
+        db.Index('ix_deals_savings', 'savings_amount', 'price_id'),
+        db.Index('ix_deals_newest', 'created_at', 'price_id'),
+        db.Index('ix_deals_category_savings', 'category_id', 'savings_amount', 'price_id'),
+        db.Index('ix_deals_category_newest', 'category_id', 'created_at', 'price_id'),
+    )
+
+    product_id = db.Column(db.String(50), db.ForeignKey('products.product_id'), primary_key=True)
+    store_id = db.Column(db.String(50), db.ForeignKey('stores.store_id'), primary_key=True)
+    price_id = db.Column(db.Integer, db.ForeignKey('prices.price_id'), nullable=False, unique=True)
+    chain_id = db.Column(db.String(20), nullable=False)
+    category_id = db.Column(db.String(20), nullable=False)
+    location_bucket = db.Column(db.String(3))  # Forward sortation area (first 3 postal code characters)
+    current_price = db.Column(db.Numeric(8, 2), nullable=False)
+    regular_price = db.Column(db.Numeric(8, 2))
+    savings_amount = db.Column(db.Numeric(8, 2), nullable=False)
+    savings_percent = db.Column(db.Numeric(5, 2), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<Deal {self.product_id} @ {self.store_id}: -${self.savings_amount}>'
+
+    @classmethod
+    def refresh(cls, pairs=None, store_ids=None, product_ids=None):
+        """Recompute deals from current prices.
+
+        pairs limits the refresh to (product_id, store_id) pairs, store_ids
+        to whole stores and product_ids to a product in every store; with
+        none of them, the whole feed is rebuilt. Runs in the caller's
+        transaction.
+        """
+        from src.models.current_price import CurrentPrice
+        from src.models.price import Price
+        from src.models.product import Product
+        from src.models.store import Store
+
+        if pairs is not None and not pairs:
+            return
+
+        savings = func.coalesce(Price.regular_price - Price.current_price, 0)
+        deals = select(
+            CurrentPrice.product_id,
+            CurrentPrice.store_id,
+            Price.price_id,
+            Store.chain_id,
+            Product.category_id,
+            func.upper(func.substr(Store.postal_code, 1, 3)),
+            Price.current_price,
+            Price.regular_price,
+            savings,
+            case((Price.regular_price > 0, savings * 100 / Price.regular_price), else_=0),
+            Price.created_at
+        ).select_from(CurrentPrice).join(
+            Price, Price.price_id == CurrentPrice.price_id
+        ).join(
+            Store, Store.store_id == CurrentPrice.store_id
+        ).join(
+            Product, Product.product_id == CurrentPrice.product_id
+        ).where(
+            Price.on_sale == True,
+            Store.is_active == True
+        )
+        stale = delete(cls)
+
+        if pairs is not None:
+            pairs = list(pairs)
+            deals = deals.where(tuple_(CurrentPrice.product_id, CurrentPrice.store_id).in_(pairs))
+            stale = stale.where(tuple_(cls.product_id, cls.store_id).in_(pairs))
+
+        if store_ids is not None:
+            deals = deals.where(CurrentPrice.store_id.in_(store_ids))
+            stale = stale.where(cls.store_id.in_(store_ids))
+
+        if product_ids is not None:
+            deals = deals.where(CurrentPrice.product_id.in_(product_ids))
+            stale = stale.where(cls.product_id.in_(product_ids))
+
+        db.session.execute(stale.execution_options(synchronize_session=False))
+        db.session.execute(insert(cls).from_select([
+            'product_id', 'store_id', 'price_id', 'chain_id', 'category_id', 'location_bucket',
+            'current_price', 'regular_price', 'savings_amount', 'savings_percent', 'created_at'
+        ], deals))
+
+    @classmethod
+    def get_page(cls, sort='savings', limit=50, after=None, category=None, chain_ids=None, location_bucket=None):
+        """Get one page of deals ordered by savings or recency, newest/largest first.
+
+        after is the (sort value, price_id) of the last deal on the previous
+        page. Returns up to limit Deal rows.
+        """
+        sort_column = cls.savings_amount if sort == 'savings' else cls.created_at
+        query = cls.query
+
+        if category:
+            query = query.filter(cls.category_id == category)
+
+        if chain_ids:
+            query = query.filter(cls.chain_id.in_(chain_ids))
+
+        if location_bucket:
+            query = query.filter(cls.location_bucket == location_bucket.replace(' ', '')[:3].upper())
+
+        if after is not None:
+            after_value, after_price_id = after
+            query = query.filter(or_(
+                sort_column < after_value,
+                and_(sort_column == after_value, cls.price_id < after_price_id)
+            ))
+
+        return query.order_by(sort_column.desc(), cls.price_id.desc()).limit(limit).all()
@@ -0,0 +1,100 @@
+"""
+Compiled extraction
+
+Spiders describe what to extract as a declarative spec: lists of CSS
+selector variants per field, in the order the site is likely to use them.
+CompiledExtractor translates every selector to XPath once and keeps lxml
+XPath objects, so parsing a tile never re-translates CSS or builds Selector
+wrappers. Each field remembers the variant that last matched and tries it
+first on the next tile, keeping its result only when none of the variants
+listed before it match, so the spec's order still decides.
+"""
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_translator = HTMLTranslator()
+
+
+def css_to_xpath(css):
+    """XPath for a CSS selector evaluated against (and below) the context element"""
+    return _translator.css_to_xpath(css, prefix='descendant-or-self::')
+
+
+class FieldRule:
+    """Selector variants for one field; the first variant that matches wins
+    
+    The variant that matched last is tried first, and its result is used
+    when one boolean XPath over the variants ahead of it finds nothing;
+    otherwise the variants are tried in order.
+    """
+    
+    __slots__ = ('variants', 'preceding', 'last')
+    
+    def __init__(self, selectors):
+        xpaths = [css_to_xpath(css) for css in selectors]
+        self.variants = [etree.XPath(xpath) for xpath in xpaths]
+        # preceding[i]: does any variant listed before variant i match?
+        self.preceding = [None] + [
+            etree.XPath('boolean(%s)' % ' | '.join(xpaths[:index])) for index in range(1, len(xpaths))
+        ]
+        self.last = 0
+    
+    def select(self, element):
+        """Results of the first variant that matches anything (empty list if none do)"""
+        last = self.last
+        if last:
+            results = self.variants[last](element)
+            if results and not self.preceding[last](element):
+                return results
+        
+        for index, variant in enumerate(self.variants):
+            results = variant(element)
+            if results:
+                self.last = index
+                return results
+        return []
+    
+    def first(self, element):
+        """First non-empty result of the first variant with one (None if none do)"""
+        last = self.last
+        if last:
+            for result in self.variants[last](element):
+                if result:
+                    if not self.preceding[last](element):
+                        return result
+                    break
+        
+        for index, variant in enumerate(self.variants):
+            for result in variant(element):
+                if result:
+                    self.last = index
+                    return result
+        return None
+
+
+class CompiledExtractor:
+    """A spider's extraction spec compiled to XPath
+    
+    Spec keys: 'tiles' (product containers), 'tile_fallback' (XPath used when
+    no tile selector matches), 'name', 'brand', 'size' (text selectors),
+    'prices' (elements whose first text holds a price) and
+    'sale_indicators' (elements marking a sale).
+    """
+    
+    def __init__(self, spec):
+        self.tiles = FieldRule(spec['tiles'])
+        self.tile_fallback = etree.XPath(spec['tile_fallback'])
+        self.fields = {name: FieldRule(spec[name]) for name in ('name', 'brand', 'size')}
+        self.prices = etree.XPath(' | '.join(css_to_xpath(css) for css in spec['prices']))
+        self.sale_indicators = etree.XPath(
+            'boolean(%s)' % ' | '.join(css_to_xpath(css) for css in spec['sale_indicators'])
+        )
+        self.image_alts = etree.XPath('.//img/@alt')
+    
+    def find_tiles(self, root):
+        """Product tile elements in a parsed document"""
+        return self.tiles.select(root) or self.tile_fallback(root)
+    
+    def field(self, name, tile):
+        return self.fields[name].first(tile)
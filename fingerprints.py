@@ -0,0 +1,64 @@
+"""
+Content fingerprints for incremental crawls
+
+A FingerprintStore remembers a digest per key (a page URL, a product tile)
+from the last finished crawl of a spider, in a local SQLite file. Spiders
+ask whether content is unchanged and skip extracting it; the digests seen
+during the crawl replace the stored set only when commit() is called after
+the crawl finished, so an interrupted crawl never hides content it did not
+reach.
+"""
+
+import hashlib
+import sqlite3
+
+
+def content_digest(content):
+    """Short hex digest of a str or bytes value"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class FingerprintStore:
+    """Digests from the last finished crawl of one namespace (usually the spider name)"""
+    
+    def __init__(self, path, namespace):
+        self.namespace = namespace
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS content_fingerprints (
+                namespace TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (namespace, kind, key)
+            )
+        ''')
+        self.connection.commit()
+        
+        self.previous = {
+            (kind, key): digest
+            for kind, key, digest in self.connection.execute(
+                'SELECT kind, key, digest FROM content_fingerprints WHERE namespace = ?', (namespace,)
+            )
+        }
+        self.current = {}
+    
+    def unchanged(self, kind, key, digest):
+        """Record the digest for this crawl; True if it matches the last finished crawl"""
+        self.current[(kind, key)] = digest
+        return self.previous.get((kind, key)) == digest
+    
+    def commit(self):
+        """Replace the stored digests with the ones seen during this crawl"""
+        with self.connection:
+            self.connection.execute('DELETE FROM content_fingerprints WHERE namespace = ?', (self.namespace,))
+            self.connection.executemany(
+                'INSERT INTO content_fingerprints (namespace, kind, key, digest) VALUES (?, ?, ?, ?)',
+                [(self.namespace, kind, key, digest) for (kind, key), digest in self.current.items()]
+            )
+        self.previous = dict(self.current)
+    
+    def close(self):
+        self.connection.close()
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from src.services.serialization import Field, ModelEncoder, to_isoformat
 
 class GroceryChain(db.Model):
     __tablename__ = 'grocery_chains'
@@ -29,3 +30,13 @@ class GroceryChain(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+# Column-level mirror of GroceryChain.to_dict() for list endpoints
+GROCERY_CHAIN_ENCODER = ModelEncoder(GroceryChain, [
+    Field('chain_id', GroceryChain.chain_id),
+    Field('chain_name', GroceryChain.chain_name),
+    Field('logo_url', GroceryChain.logo_url),
+    Field('website_url', GroceryChain.website_url),
+    Field('corporate_info', GroceryChain.corporate_info),
+    Field('created_at', GroceryChain.created_at, to_isoformat)
+])
@@ -0,0 +1,59 @@
+"""
+Location Service
+
+Postal code validation and geocoding shared by the location, store and
+price endpoints.
+"""
+
+import re
+
+
+def validate_postal_code(postal_code):
+    """Validate Canadian postal code format"""
+    if not postal_code:
+        return False
+
+    # Remove spaces and convert to uppercase
+    postal_code = postal_code.replace(' ', '').upper()
+
+    # Canadian postal code pattern: A1A1A1
+    pattern = r'^[A-Z]\d[A-Z]\d[A-Z]\d$'
+    return bool(re.match(pattern, postal_code))
+
+def format_postal_code(postal_code):
+    """Format postal code to standard A1A 1A1 format"""
+    if not postal_code:
+        return None
+
+    postal_code = postal_code.replace(' ', '').upper()
+    if len(postal_code) == 6:
+        return f"{postal_code[:3]} {postal_code[3:]}"
+    return postal_code
+
+def geocode_postal_code(postal_code):
+    """
+    Geocode postal code to coordinates.
+    This is a simplified implementation - in production, you would use
+    a geocoding service like Google Maps API or Geocodio.
+    """
+    # Sample coordinates for major Ontario cities
+    # In production, this would call an external geocoding API
+    sample_coordinates = {
+        'M5V': {'latitude': 43.6426, 'longitude': -79.3871, 'city': 'Toronto'},
+        'K1A': {'latitude': 45.4215, 'longitude': -75.6972, 'city': 'Ottawa'},
+        'L5B': {'latitude': 43.5890, 'longitude': -79.6441, 'city': 'Mississauga'},
+        'N2L': {'latitude': 43.4643, 'longitude': -80.5204, 'city': 'Waterloo'},
+        'L8S': {'latitude': 43.2557, 'longitude': -79.8711, 'city': 'Hamilton'},
+        'N6A': {'latitude': 42.9849, 'longitude': -81.2453, 'city': 'London'},
+        'P3A': {'latitude': 46.4917, 'longitude': -80.9930, 'city': 'Sudbury'},
+        'K7L': {'latitude': 44.2312, 'longitude': -76.4860, 'city': 'Kingston'}
+    }
+
+    # Extract first 3 characters for lookup
+    prefix = postal_code.replace(' ', '')[:3]
+
+    if prefix in sample_coordinates:
+        return sample_coordinates[prefix]
+
+    # Default to Toronto if not found
+    return {'latitude': 43.6532, 'longitude': -79.3832, 'city': 'Toronto'}
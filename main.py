@@ -3,6 +3,7 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import click
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 
@@ -16,6 +17,10 @@ from src.models.store import Store
 from src.models.product_category import ProductCategory
 from src.models.product import Product
 from src.models.price import Price
+from src.models.current_price import CurrentPrice
+from src.models.price_rollup import PriceRollup
+from src.models.deal import Deal
+from src.models.cache_tag import CacheTag
 
 # Import all blueprints
 from src.routes.user import user_bp
@@ -24,6 +29,10 @@ from src.routes.products import products_bp
 from src.routes.prices import prices_bp
 from src.routes.locations import locations_bp
 
+from src.services.database import init_database, create_schema
+from src.services.query_counter import init_query_counter
+from src.services.response_cache import init_response_cache
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
@@ -37,14 +46,16 @@ app.register_blueprint(products_bp, url_prefix='/api')
 app.register_blueprint(prices_bp, url_prefix='/api')
 app.register_blueprint(locations_bp, url_prefix='/api')
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Database configuration (DATABASE_URL); tables are created by `flask init-db`
+init_database(app)
+init_query_counter(app)
+init_response_cache(app)
 
-# Create all tables
-with app.app_context():
-    db.create_all()
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and backfill derived tables"""
+    create_schema()
+    click.echo('Database initialized')
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -72,4 +83,4 @@ def health_check():
     }
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002, debug=True)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5002)), debug=os.environ.get('FLASK_DEBUG') == '1')
@@ -3,8 +3,15 @@ import re
 import json
 from urllib.parse import urljoin, urlparse, parse_qs
 from datetime import datetime, timedelta
+from lxml import etree
+from ..extraction import CompiledExtractor
+from ..fingerprints import FingerprintStore, content_digest
 from ..items import GroceryProductItem, FlyerItem
 
+PRICE_PATTERN = re.compile(r'\$(\d+\.?\d*)')
+PRICE_PREFIX_PATTERN = re.compile(r'^\$?\d+\.?\d*')
+UNIT_PRICE_PATTERN = re.compile(r'\$(\d+\.?\d*)\s*/\s*(\d+\s*(?:g|kg|ml|l|lb|oz|un|ea))', re.IGNORECASE)
+
 
 class MetroSpider(scrapy.Spider):
     name = 'metro'
@@ -19,10 +26,58 @@ class MetroSpider(scrapy.Spider):
         'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
     
-    def __init__(self, store_id=None, postal_code=None, *args, **kwargs):
+    # Where Metro puts product data, most likely variant first
+    extractor = CompiledExtractor({
+        'tiles': [
+            '.product-tile',
+            '.product-card',
+            '.product-item',
+            '[data-testid*="product"]',
+            '.tile-product'
+        ],
+        # Any product/tile/card element showing a price
+        'tile_fallback': '//*[(contains(@class, "product") or contains(@class, "tile") or contains(@class, "card")) and contains(., "$")]',
+        'name': [
+            '.product-name::text',
+            '.product-title::text',
+            '.tile-product-name::text',
+            'h3::text',
+            'h4::text',
+            '[data-testid*="name"]::text'
+        ],
+        'brand': [
+            '.product-brand::text',
+            '.brand::text',
+            '.tile-product-brand::text'
+        ],
+        'size': [
+            '.product-size::text',
+            '.size::text',
+            '.tile-product-size::text',
+            '.product-format::text'
+        ],
+        'prices': [
+            '.price',
+            '.product-price',
+            '.tile-price',
+            '[data-testid*="price"]'
+        ],
+        'sale_indicators': [
+            '.sale',
+            '.on-sale',
+            '.discount',
+            '.promo',
+            '[data-testid*="sale"]'
+        ]
+    })
+    
+    def __init__(self, store_id=None, postal_code=None, refresh=None, *args, **kwargs):
         super(MetroSpider, self).__init__(*args, **kwargs)
         self.store_id = store_id
         self.postal_code = postal_code
+        # Extract every product even if unchanged since the last crawl (-a refresh=1)
+        self.refresh = bool(refresh)
+        self.fingerprints = None
         
         # Base URLs
         self.base_url = 'https://www.metro.ca'
@@ -31,6 +86,25 @@ class MetroSpider(scrapy.Spider):
         
         # Store chain information
         self.store_chain = 'Metro'
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(MetroSpider, cls).from_crawler(crawler, *args, **kwargs)
+        
+        fingerprint_settings = crawler.settings.getdict('CONTENT_FINGERPRINTS')
+        if fingerprint_settings.get('path'):
+            spider.fingerprints = FingerprintStore(fingerprint_settings['path'], spider.name)
+        
+        return spider
+    
+    def closed(self, reason):
+        if self.fingerprints is None:
+            return
+        
+        # Only a complete crawl may become the baseline for the next one
+        if reason == 'finished':
+            self.fingerprints.commit()
+        self.fingerprints.close()
         
     def start_requests(self):
         """Generate initial requests"""
@@ -132,32 +206,41 @@ class MetroSpider(scrapy.Spider):
         
         return flyer_item
     
+    def find_product_elements(self, response):
+        """Find the product tiles on a catalog page (lxml elements)"""
+        return self.extractor.find_tiles(response.selector.root)
+    
     def extract_products(self, response, store_info):
-        """Extract product information from catalog page"""
-        
-        products = []
-        
-        # Find product containers - these may be in different CSS selectors
-        product_selectors = [
-            '.product-tile',
-            '.product-card',
-            '.product-item',
-            '[data-testid*="product"]',
-            '.tile-product'
-        ]
+        """Extract product information from catalog page
         
-        product_elements = []
-        for selector in product_selectors:
-            elements = response.css(selector)
-            if elements:
-                product_elements = elements
-                break
+        With a fingerprint store (CONTENT_FINGERPRINTS), tiles whose HTML is
+        unchanged since the last finished crawl are skipped, and so is the
+        whole page when none of its tiles changed.
+        """
         
-        if not product_elements:
-            # Fallback: look for any element containing price information
-            product_elements = response.css('*:contains("$")').xpath('./ancestor-or-self::*[contains(@class, "product") or contains(@class, "tile") or contains(@class, "card")]')
+        products = []
+        product_elements = self.find_product_elements(response)
         
-        for product_element in product_elements:
+        if self.fingerprints is not None:
+            tile_digests = [
+                content_digest(etree.tostring(element, method='html', with_tail=False))
+                for element in product_elements
+            ]
+            page_digest = content_digest(''.join(tile_digests))
+            page_unchanged = self.fingerprints.unchanged('page', response.url, page_digest)
+            tiles_unchanged = [self.fingerprints.unchanged('tile', digest, digest) for digest in tile_digests]
+            
+            if page_unchanged and not self.refresh:
+                self.crawler.stats.inc_value('fingerprints/pages_unchanged')
+                return products
+        else:
+            tiles_unchanged = [False] * len(product_elements)
+        
+        for product_element, unchanged in zip(product_elements, tiles_unchanged):
+            if unchanged and not self.refresh:
+                self.crawler.stats.inc_value('fingerprints/tiles_unchanged')
+                continue
+            
             product = self.parse_product_element(product_element, store_info, response.url)
             if product:
                 products.append(product)
@@ -165,33 +248,22 @@ class MetroSpider(scrapy.Spider):
         return products
     
     def parse_product_element(self, element, store_info, source_url):
-        """Parse individual product element"""
+        """Parse individual product element (an lxml element)"""
         
         try:
             product = GroceryProductItem()
             
-            # Extract product name
-            name_selectors = [
-                '.product-name::text',
-                '.product-title::text',
-                '.tile-product-name::text',
-                'h3::text',
-                'h4::text',
-                '[data-testid*="name"]::text'
-            ]
+            # Every text node of the tile, read once and shared by the extractors below
+            texts = list(element.itertext())
             
-            name = None
-            for selector in name_selectors:
-                name = element.css(selector).get()
-                if name:
-                    break
+            # Extract product name
+            name = self.extractor.field('name', element)
             
             if not name:
                 # Try to get name from any text content
-                all_text = element.css('::text').getall()
-                for text in all_text:
+                for text in texts:
                     text = text.strip()
-                    if text and len(text) > 5 and not re.match(r'^\$?\d+\.?\d*', text):
+                    if text and len(text) > 5 and not PRICE_PREFIX_PATTERN.match(text):
                         name = text
                         break
             
@@ -200,43 +272,19 @@ class MetroSpider(scrapy.Spider):
             
             product['name'] = name.strip()
             
-            # Extract brand information
-            brand_selectors = [
-                '.product-brand::text',
-                '.brand::text',
-                '.tile-product-brand::text'
-            ]
-            
-            brand = None
-            for selector in brand_selectors:
-                brand = element.css(selector).get()
-                if brand:
-                    break
-            
+            # Extract brand and size information
+            brand = self.extractor.field('brand', element)
             product['brand'] = brand.strip() if brand else None
             
-            # Extract size/weight information
-            size_selectors = [
-                '.product-size::text',
-                '.size::text',
-                '.tile-product-size::text',
-                '.product-format::text'
-            ]
-            
-            size = None
-            for selector in size_selectors:
-                size = element.css(selector).get()
-                if size:
-                    break
-            
+            size = self.extractor.field('size', element)
             product['size'] = size.strip() if size else None
             
             # Extract pricing information
-            prices = self.extract_prices(element)
+            prices = self.extract_prices(element, texts)
             product.update(prices)
             
             # Extract sale information
-            sale_info = self.extract_sale_info(element)
+            sale_info = self.extract_sale_info(element, texts)
             product.update(sale_info)
             
             # Store information
@@ -247,11 +295,11 @@ class MetroSpider(scrapy.Spider):
             
             # Generate product ID
             product_name_clean = re.sub(r'[^a-zA-Z0-9]', '_', name.lower())
-            product['product_id'] = f"metro_{product_name_clean}_{product.get('size', '').replace(' ', '_').lower()}"
+            product['product_id'] = f"metro_{product_name_clean}_{(product.get('size') or '').replace(' ', '_').lower()}"
             
             # Additional attributes
             product['organic'] = 'organic' in name.lower()
-            product['canadian_product'] = self.detect_canadian_product(element)
+            product['canadian_product'] = self.detect_canadian_product(element, texts)
             
             # Metadata
             product['source_url'] = source_url
@@ -263,7 +311,7 @@ class MetroSpider(scrapy.Spider):
             self.logger.error(f"Error parsing product element: {e}")
             return None
     
-    def extract_prices(self, element):
+    def extract_prices(self, element, texts):
         """Extract pricing information from product element"""
         
         prices = {
@@ -274,31 +322,16 @@ class MetroSpider(scrapy.Spider):
             'unit_price_measure': None
         }
         
-        # Look for price elements
-        price_selectors = [
-            '.price',
-            '.product-price',
-            '.tile-price',
-            '[data-testid*="price"]'
-        ]
-        
-        price_elements = []
-        for selector in price_selectors:
-            elements = element.css(selector)
-            if elements:
-                price_elements.extend(elements)
-        
-        if not price_elements:
-            # Fallback: look for any text containing dollar signs
-            price_elements = element.css('*:contains("$")')
+        # First text of each price element, or every text node with a dollar sign as a fallback
+        price_texts = [next(price_elem.itertext(), None) for price_elem in self.extractor.prices(element)]
+        if not price_texts:
+            price_texts = [text for text in texts if '$' in text]
         
         # Extract price values
         all_prices = []
-        for price_elem in price_elements:
-            price_text = price_elem.css('::text').get()
+        for price_text in price_texts:
             if price_text:
-                price_matches = re.findall(r'\$(\d+\.?\d*)', price_text)
-                for match in price_matches:
+                for match in PRICE_PATTERN.findall(price_text):
                     try:
                         all_prices.append(float(match))
                     except ValueError:
@@ -315,10 +348,8 @@ class MetroSpider(scrapy.Spider):
             prices['current_price'] = all_prices[0]
         
         # Extract unit pricing
-        unit_price_pattern = r'\$(\d+\.?\d*)\s*/\s*(\d+\s*(?:g|kg|ml|l|lb|oz|un|ea))'
-        unit_price_text = element.css('::text').getall()
-        for text in unit_price_text:
-            unit_match = re.search(unit_price_pattern, text, re.IGNORECASE)
+        for text in texts:
+            unit_match = UNIT_PRICE_PATTERN.search(text)
             if unit_match:
                 prices['unit_price'] = float(unit_match.group(1))
                 prices['unit_price_measure'] = unit_match.group(2)
@@ -326,7 +357,7 @@ class MetroSpider(scrapy.Spider):
         
         return prices
     
-    def extract_sale_info(self, element):
+    def extract_sale_info(self, element, texts):
         """Extract sale information"""
         
         sale_info = {
@@ -337,27 +368,17 @@ class MetroSpider(scrapy.Spider):
         }
         
         # Check for sale indicators
-        sale_indicators = [
-            '.sale',
-            '.on-sale',
-            '.discount',
-            '.promo',
-            '[data-testid*="sale"]'
-        ]
-        
-        for indicator in sale_indicators:
-            if element.css(indicator):
-                sale_info['on_sale'] = True
-                break
+        if self.extractor.sale_indicators(element):
+            sale_info['on_sale'] = True
         
         # Check for "Save" text or similar
-        all_text = ' '.join(element.css('::text').getall()).lower()
+        all_text = ' '.join(texts).lower()
         if 'save' in all_text or 'sale' in all_text or 'promo' in all_text:
             sale_info['on_sale'] = True
         
         return sale_info
     
-    def detect_canadian_product(self, element):
+    def detect_canadian_product(self, element, texts):
         """Detect if product is Canadian"""
         
         # Look for Canadian indicators
@@ -368,15 +389,14 @@ class MetroSpider(scrapy.Spider):
             'maple leaf'
         ]
         
-        all_text = ' '.join(element.css('::text').getall()).lower()
+        all_text = ' '.join(texts).lower()
         
         for indicator in canadian_indicators:
             if indicator in all_text:
                 return True
         
         # Check for Canadian flag or maple leaf images
-        img_alts = element.css('img::attr(alt)').getall()
-        for alt in img_alts:
+        for alt in self.extractor.image_alts(element):
             if alt and ('canada' in alt.lower() or 'maple' in alt.lower()):
                 return True
         
@@ -0,0 +1,229 @@
+# Define here the models for your downloader middleware
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
+
+import logging
+import sqlite3
+import threading
+import zlib
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from twisted.internet.defer import DeferredList
+from twisted.internet.threads import deferToThread
+
+logger = logging.getLogger(__name__)
+
+
+class ConditionalRequestMiddleware:
+    """Downloader middleware that revalidates pages with ETag/Last-Modified
+    
+    Stores the validators and (compressed) body of every GET response that
+    carries an ETag or Last-Modified header, keyed by URL, in a local SQLite
+    file. Later requests for the same URL send If-None-Match and
+    If-Modified-Since; a 304 reply is replaced by the stored body with
+    status 200 and a 'not_modified' flag, so callbacks run unchanged and
+    can check response.flags to skip work. Requests with the
+    'dont_revalidate' meta key are left alone.
+    
+    The hooks run on the reactor thread, so the validators are loaded into
+    memory when the spider opens and new pages are buffered and written
+    batch_size at a time in a thread; the rest are written when the spider
+    closes. Only a 304 reads the file, for the one stored body it replays.
+    """
+    
+    def __init__(self, path, batch_size=100, stats=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.stats = stats
+        self.connection = None
+        self.writer = None
+        self.write_lock = threading.Lock()
+        # url -> (etag, last_modified)
+        self.validators = {}
+        # url -> (etag, last_modified, content_type, body) not yet written
+        self.pending = {}
+        self.writing = {}
+        self.flushes = []
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        conditional_settings = crawler.settings.getdict('CONDITIONAL_REQUESTS')
+        if not conditional_settings.get('path'):
+            raise NotConfigured('CONDITIONAL_REQUESTS path is not set')
+        
+        middleware = cls(
+            conditional_settings['path'],
+            batch_size=int(conditional_settings.get('batch_size', 100)),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+    
+    def spider_opened(self, spider):
+        # Writes go through their own connection, used by one writer thread at a time
+        self.writer = sqlite3.connect(self.path, check_same_thread=False)
+        with self.writer:
+            self.writer.execute('PRAGMA journal_mode=WAL')
+            self.writer.execute('''
+                CREATE TABLE IF NOT EXISTS http_validators (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    stored_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        
+        # Reads stay on the reactor thread; WAL keeps them from waiting on a write
+        self.connection = sqlite3.connect(self.path)
+        self.validators = {
+            url: (etag, last_modified)
+            for url, etag, last_modified in self.connection.execute(
+                'SELECT url, etag, last_modified FROM http_validators'
+            )
+        }
+    
+    def spider_closed(self, spider):
+        if not self.flushes:
+            self.close()
+            return None
+        # Let the batches still being written finish first
+        return DeferredList(self.flushes).addBoth(lambda _: self.close())
+    
+    def close(self):
+        self.write_rows(self.pending)
+        self.pending = {}
+        self.connection.close()
+        self.writer.close()
+    
+    def process_request(self, request, spider):
+        if request.method != 'GET' or request.meta.get('dont_revalidate'):
+            return None
+        
+        validators = self.validators.get(request.url)
+        if validators is None:
+            return None
+        
+        etag, last_modified = validators
+        if etag:
+            request.headers.setdefault('If-None-Match', etag)
+        if last_modified:
+            request.headers.setdefault('If-Modified-Since', last_modified)
+        self.inc_stat('conditional/revalidated')
+        return None
+    
+    def process_response(self, request, response, spider):
+        if request.method != 'GET' or request.meta.get('dont_revalidate'):
+            return response
+        
+        if response.status == 304:
+            return self.replay(request, response)
+        
+        if response.status == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self.store(request.url, etag, last_modified, response)
+        
+        return response
+    
+    def replay(self, request, response):
+        stored = self.load(request.url)
+        if stored is None:
+            # Validators we did not send (e.g. set by the spider); let the callback see the 304
+            return response
+        
+        content_type, body = stored
+        headers = Headers(response.headers)
+        if content_type:
+            headers['Content-Type'] = content_type
+        
+        self.inc_stat('conditional/not_modified')
+        self.inc_stat('conditional/bytes_saved', len(body))
+        
+        response_class = responsetypes.from_args(headers=headers, url=request.url, body=body)
+        return response.replace(
+            cls=response_class,
+            status=200,
+            headers=headers,
+            body=body,
+            flags=response.flags + ['not_modified'],
+        )
+    
+    def load(self, url):
+        """(content_type, body) stored for url, or None"""
+        row = self.pending.get(url) or self.writing.get(url)
+        if row is not None:
+            return row[2], row[3]
+        
+        if url not in self.validators:
+            return None
+        row = self.connection.execute(
+            'SELECT content_type, body FROM http_validators WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        content_type, compressed = row
+        return content_type, zlib.decompress(compressed)
+    
+    def store(self, url, etag, last_modified, response):
+        content_type = response.headers.get('Content-Type')
+        etag = etag.decode('latin-1') if etag else None
+        last_modified = last_modified.decode('latin-1') if last_modified else None
+        
+        self.validators[url] = (etag, last_modified)
+        self.pending[url] = (
+            etag,
+            last_modified,
+            content_type.decode('latin-1') if content_type else None,
+            response.body,
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write the buffered pages in a thread"""
+        rows, self.pending = self.pending, {}
+        self.writing.update(rows)
+        
+        flush = deferToThread(self.write_rows, rows)
+        self.flushes.append(flush)
+        
+        def written(result):
+            self.flushes.remove(flush)
+            for url, row in rows.items():
+                if self.writing.get(url) is row:
+                    del self.writing[url]
+            return result
+        
+        def failed(failure):
+            # Stop revalidating pages whose bodies could not be stored
+            for url in rows:
+                if url not in self.pending:
+                    self.validators.pop(url, None)
+            self.inc_stat('conditional/write_failed', len(rows))
+            logger.error(f"Error storing {len(rows)} pages for revalidation: {failure.value}")
+        
+        return flush.addBoth(written).addErrback(failed)
+    
+    def write_rows(self, rows):
+        if not rows:
+            return
+        with self.write_lock, self.writer:
+            self.writer.executemany('''
+                INSERT OR REPLACE INTO http_validators (url, etag, last_modified, content_type, body)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [
+                (url, etag, last_modified, content_type, zlib.compress(body))
+                for url, (etag, last_modified, content_type, body) in rows.items()
+            ])
+    
+    def inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
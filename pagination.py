@@ -0,0 +1,52 @@
+"""
+Pagination
+
+Opaque cursors for keyset pagination. A cursor encodes the sort key of the
+last row on a page; the next page filters on "sort key after this one"
+instead of an OFFSET, so it costs the same at any depth.
+"""
+
+import base64
+import json
+
+
+def encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    raw = json.dumps([str(value) if value is not None else None for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """Decode a cursor into its sort key values, converting each with the matching type.
+
+    Raises ValueError for malformed cursors.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError('Invalid cursor')
+
+    try:
+        return [convert(value) if value is not None else None for convert, value in zip(types, values)]
+    except (ValueError, TypeError, ArithmeticError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+
+
+def parse_page_args(args, default_limit, max_limit, *cursor_types):
+    """Read the limit and cursor query arguments of a paginated endpoint.
+
+    Returns (limit, after) where after is the decoded sort key of the previous
+    page's last row, or None for the first page. Raises ValueError for
+    malformed cursors.
+    """
+    limit = args.get('limit', default=default_limit, type=int)
+    limit = max(1, min(limit, max_limit))
+
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor, *cursor_types) if cursor else None
+
+    return limit, after
@@ -3,13 +3,100 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import gzip
+import hashlib
 import json
+import queue
+import re
 import sqlite3
 import os
+import sys
+import threading
+import time
+from array import array
+from collections import deque
 from datetime import datetime
+from decimal import Decimal
 from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet import defer, task
 from .items import GroceryProductItem, StoreLocationItem, FlyerItem
 
+try:
+    import orjson
+except ImportError:
+    # Fallback to the standard library encoder
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    # zstd compression of JSON Lines output is unavailable
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # ParquetWriterPipeline is disabled
+    pa = pq = None
+
+
+def dump_json_line(data):
+    """Serialize one item as a compact JSON line (bytes)"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str) + b'\n'
+    return (json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+
+def to_float(value):
+    """Price-like value (Decimal, str or number) as a float, None when missing or invalid"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_timestamp(value):
+    """ISO timestamp string (as set on items) as a naive datetime"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def partition_value(value):
+    """Make a value safe for use as a hive-style partition directory"""
+    return re.sub(r'[^\w.-]+', '_', str(value)).strip('_') or 'unknown'
+
+
+def read_json_lines(path):
+    """Yield the items of a finished JsonWriterPipeline file, decompressing by extension"""
+    if path.endswith('.gz'):
+        handle = gzip.open(path, 'rb')
+    elif path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('Reading .zst files requires the zstandard package')
+        handle = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    else:
+        handle = open(path, 'rb')
+    
+    with handle:
+        buffer = b''
+        for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+        if buffer.strip():
+            yield json.loads(buffer)
+
 
 class ValidationPipeline:
     """Pipeline to validate scraped items"""
@@ -41,11 +128,140 @@ class ValidationPipeline:
         return item
 
 
+class FingerprintSet:
+    """Set of 64-bit fingerprints in a flat open-addressing array
+    
+    Uses 8 bytes per slot (about 16 bytes per fingerprint at the maximum
+    load factor) instead of a Python set of strings. Membership is exact for
+    fingerprints; two different keys collide with probability of roughly
+    len(self) / 2**64 per lookup, which false_positive_rate reports.
+    """
+    
+    MAX_LOAD = 0.5
+    
+    def __init__(self, capacity=1024):
+        size = 16
+        while size * self.MAX_LOAD < capacity:
+            size *= 2
+        self.table = array('Q', [0]) * size
+        self.mask = size - 1
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def __iter__(self):
+        return (value for value in self.table if value)
+    
+    def __contains__(self, fingerprint):
+        table, mask = self.table, self.mask
+        index = fingerprint & mask
+        while True:
+            value = table[index]
+            if value == fingerprint:
+                return True
+            if not value:
+                return False
+            index = (index + 1) & mask
+    
+    def add(self, fingerprint):
+        """Add a fingerprint; returns False if it was already present"""
+        table, mask = self.table, self.mask
+        index = fingerprint & mask
+        while True:
+            value = table[index]
+            if value == fingerprint:
+                return False
+            if not value:
+                break
+            index = (index + 1) & mask
+        
+        table[index] = fingerprint
+        self.count += 1
+        if self.count > len(table) * self.MAX_LOAD:
+            self._grow()
+        return True
+    
+    def _grow(self):
+        values = list(self)
+        self.table = array('Q', [0]) * (len(self.table) * 2)
+        self.mask = len(self.table) - 1
+        self.count = 0
+        for value in values:
+            self.add(value)
+    
+    @property
+    def memory_bytes(self):
+        return self.table.itemsize * len(self.table)
+    
+    @property
+    def false_positive_rate(self):
+        return self.count / 2 ** 64
+    
+    def save(self, path):
+        """Write the fingerprints to path, replacing it atomically"""
+        with open(path + '.part', 'wb') as f:
+            array('Q', self).tofile(f)
+        os.replace(path + '.part', path)
+    
+    @classmethod
+    def load(cls, path):
+        """Read a set written by save() (empty if path does not exist)"""
+        values = array('Q')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                values.frombytes(f.read())
+        
+        fingerprints = cls(capacity=len(values))
+        for value in values:
+            fingerprints.add(value)
+        return fingerprints
+
+
+def fingerprint(data):
+    """Stable non-zero 64-bit fingerprint of a JSON-serializable value"""
+    digest = hashlib.blake2b(
+        json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'),
+        digest_size=8,
+    ).digest()
+    # 0 marks an empty slot in FingerprintSet
+    return int.from_bytes(digest, 'little') or 1
+
+
 class DuplicatesPipeline:
-    """Pipeline to filter out duplicate items"""
+    """Pipeline to filter out duplicate and unchanged items
     
-    def __init__(self):
-        self.ids_seen = set()
+    Drops a product seen twice for the same store within a crawl, and, when
+    drop_unchanged is on, any product whose content (every field except
+    scraped_at) matches the previous finished crawl. Content fingerprints
+    are kept in a FingerprintSet saved to DEDUPE['path'] when the spider
+    closes; an interrupted crawl merges its fingerprints into the previous
+    set rather than replacing it.
+    
+    Unchanged items are dropped before every writer, so drop_unchanged is off
+    by default: the databases and exports then keep seeing every product.
+    """
+    
+    VOLATILE_FIELDS = ('scraped_at',)
+    
+    def __init__(self, path=None, drop_unchanged=False, stats=None):
+        self.path = path
+        self.drop_unchanged = drop_unchanged
+        self.stats = stats
+        self.ids_seen = FingerprintSet()
+        self.previous = FingerprintSet.load(path) if path else FingerprintSet()
+        self.current = FingerprintSet(capacity=len(self.previous))
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        dedupe_settings = crawler.settings.getdict("DEDUPE")
+        pipeline = cls(
+            path=dedupe_settings.get('path'),
+            drop_unchanged=dedupe_settings.get('drop_unchanged', False),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
     
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
@@ -56,44 +272,553 @@ class DuplicatesPipeline:
             store_id = adapter.get('store_id', 'unknown')
             unique_id = f"{product_id}_{store_id}"
             
-            if unique_id in self.ids_seen:
+            if not self.ids_seen.add(fingerprint(unique_id)):
+                self.inc_stat('dedupe/duplicates_dropped')
                 raise DropItem(f"Duplicate item found: {unique_id}")
-            else:
-                self.ids_seen.add(unique_id)
+            
+            content = fingerprint({
+                key: value for key, value in adapter.items() if key not in self.VOLATILE_FIELDS
+            })
+            self.current.add(content)
+            
+            if self.drop_unchanged and content in self.previous:
+                self.inc_stat('dedupe/unchanged_dropped')
+                raise DropItem(f"Unchanged since last crawl: {unique_id}")
         
         return item
+    
+    def spider_closed(self, spider, reason):
+        if self.stats is not None:
+            self.stats.set_value('dedupe/fingerprints', len(self.current))
+            self.stats.set_value('dedupe/memory_bytes', sum(
+                fingerprints.memory_bytes for fingerprints in (self.ids_seen, self.previous, self.current)
+            ))
+            self.stats.set_value('dedupe/false_positive_rate', self.previous.false_positive_rate)
+        
+        if not self.path:
+            return
+        
+        if reason != 'finished':
+            # Keep what the previous crawl saw for the pages this one never reached
+            for value in self.previous:
+                self.current.add(value)
+        
+        self.current.save(self.path)
+        spider.logger.info(f"Saved {len(self.current)} item fingerprints to {self.path}")
+    
+    def inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
 
 
 class JsonWriterPipeline:
-    """Pipeline to write items to JSON file"""
+    """Pipeline to write items to JSON Lines files
+    
+    One compact JSON object per line, written through an in-memory buffer
+    and optionally compressed with gzip or zstd. Each file is written under
+    a .part name and renamed into place once it reaches max_bytes on disk
+    (or the spider closes), so loaders watching the output directory only
+    see complete files and can consume each one while the crawl continues.
+    """
+    
+    EXTENSIONS = {
+        None: '.jsonl',
+        'gzip': '.jsonl.gz',
+        'zstd': '.jsonl.zst',
+    }
+    
+    def __init__(self, directory='.', compression=None, max_bytes=100 * 1024 * 1024,
+                 buffer_size=1024 * 1024, stats=None):
+        if compression not in self.EXTENSIONS:
+            raise NotConfigured(f'Unsupported JSON Lines compression: {compression}')
+        if compression == 'zstd' and zstandard is None:
+            raise NotConfigured('zstd compression requires the zstandard package')
+        
+        self.directory = directory
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        self.stats = stats
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        output_settings = crawler.settings.getdict("JSONL_OUTPUT")
+        return cls(
+            directory=output_settings.get('directory', '.'),
+            compression=output_settings.get('compression'),
+            max_bytes=int(output_settings.get('max_bytes', 100 * 1024 * 1024)),
+            buffer_size=int(output_settings.get('buffer_size', 1024 * 1024)),
+            stats=crawler.stats,
+        )
     
     def open_spider(self, spider):
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'grocery_data_{spider.name}_{timestamp}.json'
-        self.file = open(filename, 'w', encoding='utf-8')
-        self.file.write('[\n')
-        self.first_item = True
+        self.basename = f'grocery_data_{spider.name}_{timestamp}'
+        os.makedirs(self.directory, exist_ok=True)
+        self.part = 0
+        self.open_part()
     
     def close_spider(self, spider):
-        self.file.write('\n]')
-        self.file.close()
+        self.close_part()
     
     def process_item(self, item, spider):
-        if not self.first_item:
-            self.file.write(',\n')
+        line = dump_json_line(ItemAdapter(item).asdict())
+        self.buffer.append(line)
+        self.buffered += len(line)
+        self.part_items += 1
+        
+        if self.buffered >= self.buffer_size:
+            self.write_buffer()
+            if self.raw.tell() >= self.max_bytes:
+                self.close_part()
+                self.open_part()
+        
+        return item
+    
+    def open_part(self):
+        self.part += 1
+        self.path = os.path.join(self.directory, f'{self.basename}_{self.part:04d}{self.EXTENSIONS[self.compression]}')
+        self.raw = open(self.path + '.part', 'wb')
+        
+        if self.compression == 'gzip':
+            self.file = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=6)
+        elif self.compression == 'zstd':
+            self.file = zstandard.ZstdCompressor(level=3).stream_writer(self.raw, closefd=False)
         else:
-            self.first_item = False
+            self.file = self.raw
+        
+        self.buffer = []
+        self.buffered = 0
+        self.part_items = 0
+    
+    def write_buffer(self):
+        if self.buffer:
+            self.file.write(b''.join(self.buffer))
+            self.inc_stat('jsonl/bytes_uncompressed', self.buffered)
+            self.buffer = []
+            self.buffered = 0
+    
+    def close_part(self):
+        """Finish the current file and move it into place"""
+        self.write_buffer()
+        if self.file is not self.raw:
+            self.file.close()
+        self.inc_stat('jsonl/bytes_written', self.raw.tell())
+        self.raw.close()
+        
+        if not self.part_items:
+            os.remove(self.path + '.part')
+            return
+        
+        os.replace(self.path + '.part', self.path)
+        self.inc_stat('jsonl/files')
+        self.inc_stat('jsonl/items', self.part_items)
+    
+    def inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+
+class ParquetWriterPipeline:
+    """Pipeline to write product items as partitioned Parquet files
+    
+    Product fields are collected into typed Arrow columns and written as
+    record batches, one file per store chain and scrape date in a
+    hive-style layout (store_chain=Metro/scrape_date=2024-01-15/...). The
+    partition values are encoded in the path, so readers such as
+    pyarrow.dataset or pandas.read_parquet can filter on them and load only
+    the columns they need. Finished files are renamed into place when the
+    spider closes.
+    """
+    
+    # (field, Arrow type) for every GroceryProductItem column except the partition keys
+    COLUMNS = [
+        ('product_id', 'string'),
+        ('name', 'string'),
+        ('brand', 'string'),
+        ('description', 'string'),
+        ('category', 'string'),
+        ('subcategory', 'string'),
+        ('size', 'string'),
+        ('weight', 'string'),
+        ('unit', 'string'),
+        ('regular_price', 'float64'),
+        ('sale_price', 'float64'),
+        ('current_price', 'float64'),
+        ('unit_price', 'float64'),
+        ('unit_price_measure', 'string'),
+        ('on_sale', 'bool'),
+        ('sale_start_date', 'string'),
+        ('sale_end_date', 'string'),
+        ('discount_percentage', 'float64'),
+        ('store_id', 'string'),
+        ('store_name', 'string'),
+        ('store_location', 'string'),
+        ('organic', 'bool'),
+        ('local_product', 'bool'),
+        ('canadian_product', 'bool'),
+        ('scraped_at', 'timestamp'),
+        ('source_url', 'string'),
+        ('flyer_week', 'string'),
+    ]
+    
+    def __init__(self, directory, batch_size=10000, compression='zstd', stats=None):
+        if pa is None:
+            raise NotConfigured('Parquet output requires the pyarrow package')
+        
+        self.directory = directory
+        self.batch_size = batch_size
+        self.compression = compression
+        self.stats = stats
+        arrow_types = {
+            'string': pa.string(),
+            'float64': pa.float64(),
+            'bool': pa.bool_(),
+            'timestamp': pa.timestamp('us'),
+        }
+        self.schema = pa.schema([(name, arrow_types[type_name]) for name, type_name in self.COLUMNS])
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        output_settings = crawler.settings.getdict("PARQUET_OUTPUT")
+        if not output_settings.get('directory'):
+            raise NotConfigured('PARQUET_OUTPUT directory is not set')
+        
+        return cls(
+            directory=output_settings['directory'],
+            batch_size=int(output_settings.get('batch_size', 10000)),
+            compression=output_settings.get('compression', 'zstd'),
+            stats=crawler.stats,
+        )
+    
+    def open_spider(self, spider):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.filename = f'{spider.name}_{timestamp}.parquet'
+        # (store_chain, scrape_date) -> column buffers, open writer and path
+        self.columns = {}
+        self.writers = {}
+    
+    def close_spider(self, spider):
+        for partition in list(self.columns):
+            self.write_batch(partition)
+        
+        for path, writer in self.writers.values():
+            writer.close()
+            os.replace(path + '.part', path)
+            self.inc_stat('parquet/files')
+    
+    def process_item(self, item, spider):
+        if not isinstance(item, GroceryProductItem):
+            return item
+        
+        adapter = ItemAdapter(item)
+        scraped_at = parse_timestamp(adapter.get('scraped_at'))
+        partition = (
+            adapter.get('store_chain') or 'unknown',
+            (scraped_at or datetime.now()).date().isoformat(),
+        )
+        
+        columns = self.columns.get(partition)
+        if columns is None:
+            columns = self.columns[partition] = {name: [] for name, _ in self.COLUMNS}
+        
+        for name, type_name in self.COLUMNS:
+            value = adapter.get(name)
+            if type_name == 'float64':
+                value = to_float(value)
+            elif type_name == 'bool':
+                value = bool(value) if value is not None else None
+            elif type_name == 'timestamp':
+                value = scraped_at
+            elif value is not None:
+                value = str(value)
+            columns[name].append(value)
+        
+        if len(columns['product_id']) >= self.batch_size:
+            self.write_batch(partition)
+        
+        return item
+    
+    def write_batch(self, partition):
+        columns = self.columns.pop(partition)
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(columns[name], type=field.type) for name, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        
+        if partition not in self.writers:
+            store_chain, scrape_date = partition
+            partition_dir = os.path.join(
+                self.directory,
+                f'store_chain={partition_value(store_chain)}',
+                f'scrape_date={scrape_date}',
+            )
+            os.makedirs(partition_dir, exist_ok=True)
+            path = os.path.join(partition_dir, self.filename)
+            self.writers[partition] = (path, pq.ParquetWriter(path + '.part', self.schema, compression=self.compression))
+        
+        self.writers[partition][1].write_batch(batch)
+        self.inc_stat('parquet/rows', batch.num_rows)
+        self.inc_stat('parquet/batches')
+    
+    def inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+
+class BatchWriterPipeline:
+    """Base for pipelines that write items in batches on a dedicated thread
+    
+    Items are turned into rows on the reactor thread and buffered; every
+    batch_size rows or flush_interval seconds, whichever comes first, the
+    buffer goes to the writer thread as one batch, plus a final flush when
+    the spider closes. The writer thread owns the database connection, so
+    the reactor never blocks on I/O. Batches reach it through a queue bounded
+    at queue_size; when the queue is full, process_item returns a Deferred
+    that fires once there is room again, which holds back the scraper
+    instead of buffering without limit.
+    
+    Subclasses implement item_row, open_writer, write and close_writer.
+    """
+    
+    # Prefix of this pipeline's keys in the spider stats
+    stats_prefix = 'writer'
+    
+    # Queue entry telling the writer thread to close the connection and exit
+    STOP = object()
+    
+    def __init__(self, batch_size=500, flush_interval=5.0, queue_size=8, stats=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.stats = stats
+    
+    def item_row(self, item, adapter):
+        """Row to buffer for an item, or None to let it pass untouched (reactor thread)"""
+        raise NotImplementedError
+    
+    def open_writer(self):
+        """Open the connection and prepare the schema (writer thread)"""
+        raise NotImplementedError
+    
+    def write(self, rows):
+        """Write one batch of rows in a single transaction (writer thread).
+        
+        Returns a dict of counters to add to the spider stats; 'failed'
+        counts rows that could not be written.
+        """
+        raise NotImplementedError
+    
+    def close_writer(self):
+        """Close the connection (writer thread)"""
+        raise NotImplementedError
+    
+    def open_spider(self, spider):
+        # Imported here so Scrapy has installed the configured reactor first
+        from twisted.internet import reactor
+        
+        self.reactor = reactor
+        self.logger = spider.logger
+        
+        self.pending = []
+        self.last_flush = time.monotonic()
+        
+        # Batches the writer thread can't take yet, with the Deferreds waiting on them
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.blocked = deque()
+        
+        self.ready = defer.Deferred()
+        self.closed = defer.Deferred()
+        self.writer = threading.Thread(target=self.run_writer, name=f'{self.stats_prefix}-writer', daemon=True)
+        self.writer.start()
+        
+        # Flush on time as well as on size, so a slow crawl doesn't hold items
+        self.flush_timer = task.LoopingCall(self.flush_if_due)
+        self.flush_timer.start(self.flush_interval, now=False)
+        
+        return self.ready
+    
+    def close_spider(self, spider):
+        """Hand over the last batch and wait for the writer to drain the queue"""
+        if self.flush_timer.running:
+            self.flush_timer.stop()
+        self.flush()
+        self.enqueue(self.STOP)
+        return self.closed
+    
+    def process_item(self, item, spider):
+        row = self.item_row(item, ItemAdapter(item))
+        if row is None:
+            return item
+        
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            waiting = self.flush()
+            if waiting is not None:
+                return waiting.addCallback(lambda _: item)
         
-        line = json.dumps(ItemAdapter(item).asdict(), indent=2, ensure_ascii=False)
-        self.file.write(line)
         return item
+    
+    def run_writer(self):
+        """Writer thread: open the connection, then write batches until STOP"""
+        try:
+            self.open_writer()
+        except Exception as e:
+            self.reactor.callFromThread(self.ready.errback, e)
+            self.reactor.callFromThread(self.closed.callback, None)
+            return
+        self.reactor.callFromThread(self.ready.callback, None)
+        
+        while True:
+            batch = self.queue.get()
+            self.reactor.callFromThread(self.release_blocked)
+            if batch is self.STOP:
+                break
+            self.write_batch(batch)
+        
+        self.close_writer()
+        self.reactor.callFromThread(self.closed.callback, None)
+    
+    def flush_if_due(self):
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        """Hand all buffered rows to the writer thread as one batch.
+        
+        Returns a Deferred to wait on when the queue is full, otherwise None.
+        """
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return None
+        
+        batch, self.pending = self.pending, []
+        return self.enqueue(batch)
+    
+    def enqueue(self, batch):
+        """Queue a batch for the writer, or park it (in order) while the queue is full"""
+        if not self.blocked:
+            try:
+                self.queue.put_nowait(batch)
+                return None
+            except queue.Full:
+                pass
+        
+        self.inc_stat('queue_full')
+        waiting = defer.Deferred()
+        self.blocked.append((batch, waiting))
+        return waiting
+    
+    def release_blocked(self):
+        """Move parked batches into the queue as the writer frees slots (reactor thread)"""
+        while self.blocked:
+            batch, waiting = self.blocked[0]
+            try:
+                self.queue.put_nowait(batch)
+            except queue.Full:
+                return
+            self.blocked.popleft()
+            waiting.callback(None)
+    
+    def write_batch(self, batch):
+        """Write one batch and report its counters and latency (writer thread)"""
+        started = time.monotonic()
+        try:
+            counters = self.write(batch)
+        except Exception as e:
+            self.logger.error(f"Error writing batch of {len(batch)} items: {e}")
+            self.reactor.callFromThread(self.inc_stat, 'items_failed', len(batch))
+            return
+        elapsed = time.monotonic() - started
+        
+        self.reactor.callFromThread(self.record_batch, len(batch), counters, elapsed)
+    
+    def record_batch(self, count, counters, elapsed):
+        """Update the spider stats after a batch is committed (reactor thread)"""
+        failed = counters.pop('failed', 0)
+        self.inc_stat('flushes')
+        self.inc_stat('items_written', count - failed)
+        if failed:
+            self.inc_stat('items_failed', failed)
+        for key, value in counters.items():
+            self.inc_stat(key, value)
+        self.inc_stat('flush_seconds_total', elapsed)
+        
+        if self.stats is not None:
+            prefix = self.stats_prefix
+            self.stats.set_value(f'{prefix}/flush_seconds_last', round(elapsed, 4))
+            self.stats.max_value(f'{prefix}/flush_seconds_max', round(elapsed, 4))
+            total_seconds = self.stats.get_value(f'{prefix}/flush_seconds_total')
+            if total_seconds:
+                self.stats.set_value(
+                    f'{prefix}/rows_per_second',
+                    round(self.stats.get_value(f'{prefix}/items_written', 0) / total_seconds)
+                )
+    
+    def inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f'{self.stats_prefix}/{key}', count)
 
 
-class SQLitePipeline:
-    """Pipeline to store items in SQLite database"""
+class SQLitePipeline(BatchWriterPipeline):
+    """Pipeline to store items in SQLite database
+    
+    Rows are written with executemany in one transaction per batch (see
+    BatchWriterPipeline).
+    """
+    
+    stats_prefix = 'sqlite'
+    
+    # Product columns that define a price version; re-scraping an item that
+    # matches its latest row on all of them only refreshes scraped_at
+    PRICE_VERSION_FIELDS = (
+        'regular_price', 'sale_price', 'current_price', 'unit_price',
+        'unit_price_measure', 'on_sale', 'sale_start_date', 'sale_end_date',
+        'discount_percentage'
+    )
     
-    def __init__(self, sqlite_db):
+    PRODUCT_COLUMNS = (
+        'product_id', 'name', 'brand', 'description', 'category', 'subcategory',
+        'size', 'weight', 'unit', 'regular_price', 'sale_price', 'current_price',
+        'unit_price', 'unit_price_measure', 'on_sale', 'sale_start_date',
+        'sale_end_date', 'discount_percentage', 'store_chain', 'store_id',
+        'store_name', 'store_location', 'organic', 'local_product',
+        'canadian_product', 'scraped_at', 'source_url', 'flyer_week'
+    )
+    
+    STORE_LOCATION_COLUMNS = (
+        'store_id', 'store_name', 'chain_name', 'street_address', 'city',
+        'province', 'postal_code', 'country', 'latitude', 'longitude',
+        'phone_number', 'store_hours', 'services', 'scraped_at', 'source_url'
+    )
+    
+    FLYER_COLUMNS = (
+        'flyer_id', 'store_chain', 'title', 'start_date', 'end_date',
+        'week_of', 'page_count', 'product_count', 'categories',
+        'scraped_at', 'source_url'
+    )
+    
+    # Set on every connection; WAL lets the API and exports read mid-crawl
+    PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'temp_store': 'MEMORY',
+        'cache_size': -32768,  # 32 MB (negative values are KiB)
+        'busy_timeout': 5000,  # ms
+    }
+    
+    # Keeps IN lists under SQLite's bound parameter limit
+    LOOKUP_CHUNK_SIZE = 500
+    
+    def __init__(self, sqlite_db, batch_size=500, flush_interval=5.0, queue_size=8, stats=None):
+        super().__init__(batch_size, flush_interval, queue_size, stats)
         self.sqlite_db = sqlite_db
+        
+        self.version_indexes = [self.PRODUCT_COLUMNS.index(field) for field in self.PRICE_VERSION_FIELDS]
+        self.product_id_index = self.PRODUCT_COLUMNS.index('product_id')
+        self.store_id_index = self.PRODUCT_COLUMNS.index('store_id')
+        self.scraped_at_index = self.PRODUCT_COLUMNS.index('scraped_at')
+        self.source_url_index = self.PRODUCT_COLUMNS.index('source_url')
     
     @classmethod
     def from_crawler(cls, crawler):
@@ -102,14 +827,20 @@ class SQLitePipeline:
             db_settings = {'sqlite_db': 'grocery_data.db'}
         return cls(
             sqlite_db=db_settings['sqlite_db'],
+            batch_size=int(db_settings.get('batch_size', 500)),
+            flush_interval=float(db_settings.get('flush_interval', 5.0)),
+            queue_size=int(db_settings.get('queue_size', 8)),
+            stats=crawler.stats,
         )
     
-    def open_spider(self, spider):
+    def open_writer(self):
         self.connection = sqlite3.connect(self.sqlite_db)
         self.cursor = self.connection.cursor()
+        for name, value in self.PRAGMAS.items():
+            self.cursor.execute(f'PRAGMA {name}={value}')
         self.create_tables()
     
-    def close_spider(self, spider):
+    def close_writer(self):
         self.connection.close()
     
     def create_tables(self):
@@ -193,180 +924,447 @@ class SQLitePipeline:
         
         self.connection.commit()
     
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        
+    def item_row(self, item, adapter):
         if isinstance(item, GroceryProductItem):
-            self.insert_product(adapter)
+            return 'products', [adapter.get(column) for column in self.PRODUCT_COLUMNS]
         elif isinstance(item, StoreLocationItem):
-            self.insert_store_location(adapter)
+            return 'store_locations', tuple(adapter.get(column) for column in self.STORE_LOCATION_COLUMNS)
         elif isinstance(item, FlyerItem):
-            self.insert_flyer(adapter)
+            row = {column: adapter.get(column) for column in self.FLYER_COLUMNS}
+            row['categories'] = json.dumps(row['categories']) if row['categories'] else None
+            return 'flyers', tuple(row.values())
+        return None
+    
+    def write(self, rows):
+        tables = {'products': [], 'store_locations': [], 'flyers': []}
+        for table, row in rows:
+            tables[table].append(row)
         
-        return item
+        with self.connection:
+            inserted, refreshed, failed = self.write_products(tables['products'])
+            failed += self.write_rows('store_locations', self.STORE_LOCATION_COLUMNS, tables['store_locations'])
+            failed += self.write_rows('flyers', self.FLYER_COLUMNS, tables['flyers'])
+        
+        return {'products_inserted': inserted, 'products_refreshed': refreshed, 'failed': failed}
     
-    def insert_product(self, adapter):
-        """Insert product into database"""
+    def write_rows(self, table, columns, rows):
+        """Insert or replace rows, isolating the ones that violate a constraint.
+        
+        Returns the number of rows that failed.
+        """
+        if not rows:
+            return 0
+        
+        sql = f'''
+            INSERT OR REPLACE INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        '''
         try:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO products (
-                    product_id, name, brand, description, category, subcategory,
-                    size, weight, unit, regular_price, sale_price, current_price,
-                    unit_price, unit_price_measure, on_sale, sale_start_date,
-                    sale_end_date, discount_percentage, store_chain, store_id,
-                    store_name, store_location, organic, local_product,
-                    canadian_product, scraped_at, source_url, flyer_week
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                adapter.get('product_id'),
-                adapter.get('name'),
-                adapter.get('brand'),
-                adapter.get('description'),
-                adapter.get('category'),
-                adapter.get('subcategory'),
-                adapter.get('size'),
-                adapter.get('weight'),
-                adapter.get('unit'),
-                adapter.get('regular_price'),
-                adapter.get('sale_price'),
-                adapter.get('current_price'),
-                adapter.get('unit_price'),
-                adapter.get('unit_price_measure'),
-                adapter.get('on_sale'),
-                adapter.get('sale_start_date'),
-                adapter.get('sale_end_date'),
-                adapter.get('discount_percentage'),
-                adapter.get('store_chain'),
-                adapter.get('store_id'),
-                adapter.get('store_name'),
-                adapter.get('store_location'),
-                adapter.get('organic'),
-                adapter.get('local_product'),
-                adapter.get('canadian_product'),
-                adapter.get('scraped_at'),
-                adapter.get('source_url'),
-                adapter.get('flyer_week')
-            ))
-            self.connection.commit()
-        except sqlite3.Error as e:
-            spider.logger.error(f"Error inserting product: {e}")
+            self.cursor.executemany(sql, rows)
+        except sqlite3.IntegrityError:
+            # Replaying is safe: every row replaces on its unique key
+            failed = 0
+            for row in rows:
+                try:
+                    self.cursor.execute(sql, row)
+                except sqlite3.IntegrityError as e:
+                    self.logger.error(f"Error inserting into {table}: {e}")
+                    failed += 1
+            return failed
+        
+        return 0
     
-    def insert_store_location(self, adapter):
-        """Insert store location into database"""
-        try:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO store_locations (
-                    store_id, store_name, chain_name, street_address, city,
-                    province, postal_code, country, latitude, longitude,
-                    phone_number, store_hours, services, scraped_at, source_url
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                adapter.get('store_id'),
-                adapter.get('store_name'),
-                adapter.get('chain_name'),
-                adapter.get('street_address'),
-                adapter.get('city'),
-                adapter.get('province'),
-                adapter.get('postal_code'),
-                adapter.get('country'),
-                adapter.get('latitude'),
-                adapter.get('longitude'),
-                adapter.get('phone_number'),
-                adapter.get('store_hours'),
-                adapter.get('services'),
-                adapter.get('scraped_at'),
-                adapter.get('source_url')
-            ))
-            self.connection.commit()
-        except sqlite3.Error as e:
-            spider.logger.error(f"Error inserting store location: {e}")
+    def write_products(self, rows):
+        """Insert products whose price changed and refresh scraped_at on the rest.
+        
+        Returns (inserted, refreshed, failed) counts.
+        """
+        if not rows:
+            return 0, 0, 0
+        
+        latest = self.load_latest_versions({(row[self.product_id_index], row[self.store_id_index]) for row in rows})
+        
+        inserts = []
+        refreshes = []
+        for row in rows:
+            key = (row[self.product_id_index], row[self.store_id_index])
+            version = tuple(row[index] for index in self.version_indexes)
+            current = latest.get(key)
+            
+            if current is None or current[1] != version:
+                inserts.append(row)
+                latest[key] = (None, version, row)
+            elif current[0] is None:
+                # Unchanged from a row earlier in this batch; refresh it before it's written
+                current[2][self.scraped_at_index] = row[self.scraped_at_index]
+                current[2][self.source_url_index] = row[self.source_url_index]
+            else:
+                refreshes.append((row[self.scraped_at_index], row[self.source_url_index], current[0]))
+        
+        if refreshes:
+            self.cursor.executemany('UPDATE products SET scraped_at = ?, source_url = ? WHERE id = ?', refreshes)
+        failed = self.write_rows('products', self.PRODUCT_COLUMNS, inserts)
+        
+        return len(inserts) - failed, len(rows) - len(inserts), failed
     
-    def insert_flyer(self, adapter):
-        """Insert flyer into database"""
+    def load_latest_versions(self, keys):
+        """Map (product_id, store_id) keys to (id, price version, None) of their latest stored row
+        
+        Each key is one seek on the (product_id, store_id, scraped_at) unique
+        index, so the cost follows the batch size rather than the length of
+        the price history.
+        """
+        latest = {}
+        keys = list(keys)
+        
+        # Two parameters per key
+        chunk_size = self.LOOKUP_CHUNK_SIZE // 2
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            self.cursor.execute(f'''
+                WITH keys (product_id, store_id) AS (VALUES {', '.join(['(?, ?)'] * len(chunk))})
+                SELECT p.id, p.product_id, p.store_id, {', '.join(f'p.{field}' for field in self.PRICE_VERSION_FIELDS)}
+                FROM keys
+                JOIN products p ON p.id = (
+                    SELECT id FROM products
+                    WHERE product_id IS keys.product_id AND store_id IS keys.store_id
+                    ORDER BY scraped_at DESC, id DESC
+                    LIMIT 1
+                )
+            ''', [value for key in chunk for value in key])
+            for row in self.cursor.fetchall():
+                latest[(row[1], row[2])] = (row[0], tuple(row[3:]), None)
+        
+        return latest
+
+
+class APIIngestPipeline(BatchWriterPipeline):
+    """Pipeline to ingest items into the API database
+    
+    Store locations and products are upserted into the API's stores and
+    products tables, and product prices go through the API's
+    PriceIngestService: a price that repeats the current version only
+    refreshes scraped_at, while a change closes out the previous version,
+    moves the current-price pointer and updates the rollups and deals feed,
+    as POST /api/prices does. Prices for stores the API doesn't know yet are
+    counted as failed.
+    
+    Enabled by setting API_INGEST['database_url']; the API package (src)
+    must be importable, e.g. through API_INGEST['api_root'].
+    """
+    
+    stats_prefix = 'api_ingest'
+    
+    # Response cache tags to invalidate after each batch
+    CACHE_TAGS = ('prices', 'products', 'stores')
+    
+    PROVINCE_CODES = {
+        'alberta': 'AB', 'british columbia': 'BC', 'manitoba': 'MB',
+        'new brunswick': 'NB', 'newfoundland and labrador': 'NL',
+        'northwest territories': 'NT', 'nova scotia': 'NS', 'nunavut': 'NU',
+        'ontario': 'ON', 'prince edward island': 'PE', 'quebec': 'QC',
+        'saskatchewan': 'SK', 'yukon': 'YT'
+    }
+    
+    # Log at most this many per-row price errors per batch
+    MAX_LOGGED_ERRORS = 10
+    
+    def __init__(self, database_url, api_root=None, data_source='scraper', cache_redis_url=None,
+                 batch_size=500, flush_interval=5.0, queue_size=8, stats=None):
+        super().__init__(batch_size, flush_interval, queue_size, stats)
+        self.database_url = database_url
+        self.api_root = api_root
+        self.data_source = data_source
+        self.cache_redis_url = cache_redis_url
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        ingest_settings = crawler.settings.getdict("API_INGEST")
+        if not ingest_settings.get('database_url'):
+            raise NotConfigured('API_INGEST database_url is not set')
+        return cls(
+            database_url=ingest_settings['database_url'],
+            api_root=ingest_settings.get('api_root'),
+            data_source=ingest_settings.get('data_source', 'scraper'),
+            cache_redis_url=ingest_settings.get('cache_redis_url'),
+            batch_size=int(ingest_settings.get('batch_size', 500)),
+            flush_interval=float(ingest_settings.get('flush_interval', 5.0)),
+            queue_size=int(ingest_settings.get('queue_size', 8)),
+            stats=crawler.stats,
+        )
+    
+    def open_writer(self):
+        if self.api_root and self.api_root not in sys.path:
+            sys.path.insert(0, self.api_root)
+        
+        from flask import Flask
+        from src.models.user import db
+        # Register every model the ingest touches through relationships
+        from src.models.grocery_chain import GroceryChain
+        from src.models.store import Store
+        from src.models.product_category import ProductCategory
+        from src.models.product import Product
+        from src.models.price import Price
+        from src.models.current_price import CurrentPrice
+        from src.models.price_rollup import PriceRollup
+        from src.models.deal import Deal
+        from src.models.cache_tag import CacheTag
+        from src.services import catalog_ingest_service
+        from src.services.database import init_database
+        from src.services.price_ingest_service import PriceIngestService
+        from src.services.response_cache import RedisCacheBackend
+        
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = self.database_url
+        init_database(app)
+        
+        # The writer thread keeps this context for its whole life
+        self.app_context = app.app_context()
+        self.app_context.push()
+        
+        self.db = db
+        self.cache_tags = CacheTag
+        self.catalog = catalog_ingest_service
+        self.price_ingest = PriceIngestService(chunk_size=self.batch_size)
+        self.cache = RedisCacheBackend(self.cache_redis_url) if self.cache_redis_url else None
+    
+    def close_writer(self):
+        self.db.session.remove()
+        self.app_context.pop()
+    
+    def item_row(self, item, adapter):
+        if isinstance(item, GroceryProductItem):
+            return 'product', adapter.asdict()
+        elif isinstance(item, StoreLocationItem):
+            return 'store', adapter.asdict()
+        return None
+    
+    def write(self, rows):
+        chains = {}
+        categories = {}
+        stores = []
+        products = []
+        prices = []
+        skipped = 0
+        
+        for kind, data in rows:
+            if kind == 'store':
+                row = self.store_row(data, chains)
+                if row is None:
+                    skipped += 1
+                    continue
+                stores.append(row)
+            else:
+                row = self.product_row(data, categories)
+                if row is None:
+                    skipped += 1
+                    continue
+                products.append(row)
+                if data.get('store_id') and data.get('current_price') is not None:
+                    prices.append(self.price_payload(data))
+        
+        # Catalog first, so the prices below find their products and stores
         try:
-            categories_json = json.dumps(adapter.get('categories')) if adapter.get('categories') else None
-            
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO flyers (
-                    flyer_id, store_chain, title, start_date, end_date,
-                    week_of, page_count, product_count, categories,
-                    scraped_at, source_url
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                adapter.get('flyer_id'),
-                adapter.get('store_chain'),
-                adapter.get('title'),
-                adapter.get('start_date'),
-                adapter.get('end_date'),
-                adapter.get('week_of'),
-                adapter.get('page_count'),
-                adapter.get('product_count'),
-                categories_json,
-                adapter.get('scraped_at'),
-                adapter.get('source_url')
-            ))
-            self.connection.commit()
-        except sqlite3.Error as e:
-            spider.logger.error(f"Error inserting flyer: {e}")
+            self.catalog.ensure_chains(chains)
+            self.catalog.ensure_categories(categories)
+            store_counts = self.catalog.upsert_stores(stores)
+            product_counts = self.catalog.upsert_products(products)
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+        
+        summary = self.price_ingest.ingest(prices)
+        for error in summary['errors'][:self.MAX_LOGGED_ERRORS]:
+            self.logger.warning(f"API ingest: {error}")
+        
+        # In-process caches of the API workers follow cache_tags; Redis keeps its own versions.
+        # The batch is committed by now, so a failed bump only leaves cached responses stale
+        try:
+            self.cache_tags.bump(self.CACHE_TAGS)
+        except Exception as e:
+            self.logger.error(f"API ingest: failed to bump cache tags: {e}")
+        if self.cache is not None:
+            try:
+                self.cache.bump_tags(self.CACHE_TAGS)
+            except Exception as e:
+                self.logger.error(f"API ingest: failed to bump Redis cache tags: {e}")
+        
+        return {
+            'stores_inserted': store_counts['inserted'],
+            'stores_updated': store_counts['updated'],
+            'products_inserted': product_counts['inserted'],
+            'products_updated': product_counts['updated'],
+            'prices_created': summary['created'],
+            'prices_unchanged': summary['unchanged'],
+            'prices_failed': summary['failed'],
+            'failed': skipped
+        }
+    
+    def store_row(self, data, chains):
+        """Store columns for a store location item, or None when it lacks required fields"""
+        required = ('store_id', 'store_name', 'street_address', 'city', 'province',
+                    'postal_code', 'latitude', 'longitude')
+        if any(data.get(field) in (None, '') for field in required):
+            return None
+        
+        chain_name = data.get('chain_name') or 'Unknown'
+        chain_id = self.catalog.make_id(chain_name)
+        chains.setdefault(chain_id, chain_name)
+        
+        province = data['province'].strip()
+        province = self.PROVINCE_CODES.get(province.lower(), province.upper()[:2])
+        
+        return {
+            'store_id': data['store_id'],
+            'chain_id': chain_id,
+            'store_name': data['store_name'],
+            'address_street': data['street_address'],
+            'address_city': data['city'],
+            'address_province': province,
+            'postal_code': data['postal_code'].upper()[:7],
+            'latitude': Decimal(str(data['latitude'])),
+            'longitude': Decimal(str(data['longitude'])),
+            'phone': data.get('phone_number'),
+            'hours': data.get('store_hours'),
+            'services': data.get('services'),
+            # Insert only: an admin may deactivate the store later
+            'is_active': True
+        }
+    
+    def product_row(self, data, categories):
+        """Product columns for a product item, or None when it lacks an id or name"""
+        if not data.get('product_id') or not data.get('name'):
+            return None
+        
+        category_name = data.get('category') or 'Uncategorized'
+        category_id = self.catalog.make_id(category_name)
+        categories.setdefault(category_id, (category_name, None))
+        
+        subcategory_id = None
+        if data.get('subcategory'):
+            subcategory_id = self.catalog.make_id(data['subcategory'])
+            categories.setdefault(subcategory_id, (data['subcategory'], category_id))
+        
+        attributes = {
+            field: data[field] for field in ('organic', 'local_product', 'canadian_product')
+            if data.get(field) is not None
+        }
+        
+        return {
+            'product_id': data['product_id'],
+            'name': data['name'],
+            'brand': data.get('brand'),
+            'category_id': category_id,
+            'subcategory_id': subcategory_id,
+            'size': data.get('size'),
+            'unit_type': data.get('unit'),
+            'attributes': attributes or None,
+            # Insert only, like the store's
+            'is_active': True
+        }
+    
+    def price_payload(self, data):
+        """PriceIngestService payload for a product item"""
+        return {
+            'product_id': data['product_id'],
+            'store_id': data['store_id'],
+            'current_price': data['current_price'],
+            'regular_price': data.get('regular_price'),
+            'on_sale': bool(data.get('on_sale')),
+            'sale_start_date': data.get('sale_start_date'),
+            'sale_end_date': data.get('sale_end_date'),
+            'price_per_unit': data.get('unit_price'),
+            'data_source': self.data_source,
+            'scraped_at': data.get('scraped_at')
+        }
+
+
+class PriceAggregate:
+    """Running price statistics for one normalized product name"""
+    
+    __slots__ = ('count', 'min_price', 'max_price', 'total', 'best_by_store')
+    
+    def __init__(self):
+        self.count = 0
+        self.min_price = None
+        self.max_price = None
+        self.total = 0.0
+        # store -> (lowest price, product_id)
+        self.best_by_store = {}
+    
+    def add(self, store, price, product_id):
+        self.count += 1
+        self.total += price
+        if self.min_price is None or price < self.min_price:
+            self.min_price = price
+        if self.max_price is None or price > self.max_price:
+            self.max_price = price
+        
+        best = self.best_by_store.get(store)
+        if best is None or price < best[0]:
+            self.best_by_store[store] = (price, product_id)
 
 
 class PriceComparisonPipeline:
-    """Pipeline to calculate price comparisons and savings"""
+    """Pipeline to calculate price comparisons and savings
+    
+    Keeps running aggregates per normalized product name (count, min, max,
+    sum and the best price per store with its product id) rather than the
+    items themselves, so memory grows with distinct products, not with
+    the crawl. The comparison file is written one product per line.
+    """
     
     def __init__(self):
-        self.products_by_name = {}
+        self.aggregates = {}
     
     def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        
         if isinstance(item, GroceryProductItem):
-            product_name = adapter.get('name', '').lower().strip()
-            current_price = adapter.get('current_price')
+            adapter = ItemAdapter(item)
+            product_name = ' '.join((adapter.get('name') or '').lower().split())
+            current_price = to_float(adapter.get('current_price'))
             
             if product_name and current_price:
-                if product_name not in self.products_by_name:
-                    self.products_by_name[product_name] = []
-                
-                self.products_by_name[product_name].append({
-                    'store': adapter.get('store_chain'),
-                    'price': current_price,
-                    'item': item
-                })
+                aggregate = self.aggregates.get(product_name)
+                if aggregate is None:
+                    aggregate = self.aggregates[product_name] = PriceAggregate()
+                aggregate.add(adapter.get('store_chain'), current_price, adapter.get('product_id'))
         
         return item
     
     def close_spider(self, spider):
-        """Calculate price comparisons when spider closes"""
+        """Write price comparisons when spider closes"""
         
-        comparison_data = []
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'price_comparisons_{timestamp}.jsonl'
+        compared = 0
         
-        for product_name, stores_data in self.products_by_name.items():
-            if len(stores_data) > 1:
-                prices = [data['price'] for data in stores_data]
-                min_price = min(prices)
-                max_price = max(prices)
-                avg_price = sum(prices) / len(prices)
+        with open(filename + '.part', 'wb') as f:
+            for product_name, aggregate in self.aggregates.items():
+                if aggregate.count < 2:
+                    continue
                 
-                comparison = {
+                min_price, max_price = aggregate.min_price, aggregate.max_price
+                f.write(dump_json_line({
                     'product_name': product_name,
-                    'stores_count': len(stores_data),
+                    'stores_count': aggregate.count,
                     'min_price': min_price,
                     'max_price': max_price,
-                    'avg_price': avg_price,
+                    'avg_price': aggregate.total / aggregate.count,
                     'price_difference': max_price - min_price,
                     'savings_percentage': ((max_price - min_price) / max_price * 100) if max_price > 0 else 0,
-                    'stores': stores_data
-                }
-                
-                comparison_data.append(comparison)
-        
-        # Save comparison data
-        if comparison_data:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'price_comparisons_{timestamp}.json'
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(comparison_data, f, indent=2, ensure_ascii=False, default=str)
-            
-            spider.logger.info(f"Price comparison data saved to {filename}")
-            spider.logger.info(f"Found {len(comparison_data)} products with price differences")
+                    'stores': [
+                        {'store': store, 'price': price, 'product_id': product_id}
+                        for store, (price, product_id) in aggregate.best_by_store.items()
+                    ]
+                }))
+                compared += 1
+        
+        if not compared:
+            os.remove(filename + '.part')
+            return
+        
+        os.replace(filename + '.part', filename)
+        spider.logger.info(f"Price comparison data saved to {filename}")
+        spider.logger.info(f"Found {compared} products with price differences")
 
@@ -1,9 +1,28 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date
+from sqlalchemy import or_
+from sqlalchemy.orm import contains_eager, joinedload
 from src.models.user import db
+from src.models.current_price import CurrentPrice
+from src.models.grocery_chain import GroceryChain
+from src.models.store import Store
+from src.services.serialization import Field, ModelEncoder, to_float, to_isoformat
 
 class Price(db.Model):
     __tablename__ = 'prices'
+    __table_args__ = (
+        # Price history and version lookups per product-store pair
+        db.Index('ix_prices_product_store_valid_to', 'product_id', 'store_id', 'valid_to'),
+        db.Index('ix_prices_product_valid_from', 'product_id', 'valid_from'),
+        # Open versions only, for rebuilding current_prices
+        db.Index('ix_prices_open', 'product_id', 'store_id', 'price_id',
+                 sqlite_where=db.text('valid_to IS NULL'), postgresql_where=db.text('valid_to IS NULL')),
+    )
+    
+    # Fields that define a price version; a scrape that matches the current
+    # version on all of them only refreshes scraped_at
+    VERSIONED_FIELDS = ('current_price', 'regular_price', 'on_sale', 'sale_start_date',
+                        'sale_end_date', 'price_per_unit', 'stock_status')
     
     price_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     product_id = db.Column(db.String(50), db.ForeignKey('products.product_id'), nullable=False)
@@ -50,6 +69,10 @@ class Price(db.Model):
             
         return result
     
+    def matches(self, values):
+        """Check whether a dict of Price column values repeats this version"""
+        return all(getattr(self, field) == values.get(field) for field in self.VERSIONED_FIELDS)
+    
     @property
     def savings(self):
         """Calculate savings if on sale"""
@@ -78,35 +101,141 @@ class Price(db.Model):
             
         return True
     
+    @classmethod
+    def with_store_details(cls, query):
+        """Eager-load the store and chain read by to_dict(include_store_details=True)"""
+        return query.options(joinedload(cls.store).joinedload(Store.chain))
+    
+    @classmethod
+    def with_product_details(cls, query):
+        """Eager-load the product and categories read by Product.to_dict()"""
+        from src.models.product import Product
+        
+        return query.options(
+            joinedload(cls.product).joinedload(Product.category),
+            joinedload(cls.product).joinedload(Product.subcategory)
+        )
+    
+    @classmethod
+    def current(cls, query):
+        """Restrict a price query to current prices via the current_prices table"""
+        return query.join(CurrentPrice, CurrentPrice.price_id == cls.price_id)
+    
     @classmethod
     def get_current_prices_for_product(cls, product_id, store_ids=None):
         """Get all current prices for a product, optionally filtered by stores"""
-        query = cls.query.filter(
-            cls.product_id == product_id,
-            cls.valid_to.is_(None)
+        query = cls.current(cls.with_store_details(cls.query)).filter(
+            CurrentPrice.product_id == product_id
         )
         
         if store_ids:
-            query = query.filter(cls.store_id.in_(store_ids))
+            query = query.filter(CurrentPrice.store_id.in_(store_ids))
             
         return query.all()
     
     @classmethod
-    def get_price_comparison(cls, product_id, store_ids=None):
-        """Get price comparison data for a product across stores"""
-        prices = cls.get_current_prices_for_product(product_id, store_ids)
+    def get_current_prices_near(cls, product_id, latitude, longitude, radius_km):
+        """Get current prices for a product at active stores within radius_km of a point.
+        
+        Returns (price, distance_km) tuples sorted by distance. The store filter
+        is a join on the store bounding box rather than an IN list of store ids.
+        """
+        # The store joined for the radius filter populates price.store, so
+        # to_dict(include_store_details=True) needs no further queries
+        query = cls.current(cls.query).join(
+            Store, cls.store_id == Store.store_id
+        ).options(
+            contains_eager(cls.store).joinedload(Store.chain)
+        ).filter(
+            CurrentPrice.product_id == product_id
+        )
+        query = Store.within_radius(query, latitude, longitude, radius_km)
+        
+        nearby = []
+        for price in query.all():
+            distance = price.store.calculate_distance(latitude, longitude)
+            if distance <= radius_km:
+                nearby.append((price, distance))
+        
+        nearby.sort(key=lambda x: x[1])
+        return nearby
+    
+    @classmethod
+    def get_history_store_ids(cls, product_id, since, store_ids=None, after=None, limit=50):
+        """Ids of up to limit stores with price versions for a product at or after since, ordered by store_id"""
+        query = db.session.query(cls.store_id).filter(
+            cls.product_id == product_id,
+            or_(cls.valid_to.is_(None), cls.valid_to >= since)
+        ).distinct()
+        
+        if store_ids:
+            query = query.filter(cls.store_id.in_(store_ids))
+        
+        if after is not None:
+            query = query.filter(cls.store_id > after)
+        
+        return [store_id for store_id, in query.order_by(cls.store_id).limit(limit)]
+    
+    @classmethod
+    def get_price_changes(cls, product_id, since, store_ids=None):
+        """Price versions for a product in effect at or after since, newest first.
+        
+        Each row is a (store_id, valid_from, valid_to, current_price,
+        regular_price, on_sale) tuple rather than an ORM object.
+        """
+        query = db.session.query(
+            cls.store_id, cls.valid_from, cls.valid_to, cls.current_price, cls.regular_price, cls.on_sale
+        ).filter(
+            cls.product_id == product_id,
+            or_(cls.valid_to.is_(None), cls.valid_to >= since)
+        ).order_by(cls.valid_from.desc())
+        
+        if store_ids:
+            query = query.filter(cls.store_id.in_(store_ids))
+        
+        return query.all()
+    
+    @classmethod
+    def get_price_comparison(cls, product_id, store_ids=None, location=None):
+        """Get price comparison data for a product across stores.
+        
+        location is an optional dict with latitude, longitude and radius_km;
+        when given, only nearby stores are compared and each price carries
+        its distance_km.
+        """
+        if location:
+            nearby = cls.get_current_prices_near(
+                product_id, location['latitude'], location['longitude'], location['radius_km']
+            )
+            prices = [price for price, _ in nearby]
+            distances = {price.store_id: round(distance, 2) for price, distance in nearby}
+        else:
+            prices = cls.get_current_prices_for_product(product_id, store_ids)
+            distances = {}
         
         if not prices:
             return None
             
         price_list = [float(p.current_price) for p in prices]
+        best = min(prices, key=lambda p: p.current_price)
+        
+        price_dicts = []
+        for p in prices:
+            price_dict = p.to_dict(include_store_details=True)
+            if location:
+                price_dict['distance_km'] = distances[p.store_id]
+            price_dicts.append(price_dict)
+        
+        best_price = {
+            'price': min(price_list),
+            'store_id': best.store_id
+        }
+        if location:
+            best_price['distance_km'] = distances[best.store_id]
         
         return {
-            'prices': [p.to_dict(include_store_details=True) for p in prices],
-            'best_price': {
-                'price': min(price_list),
-                'store_id': min(prices, key=lambda p: p.current_price).store_id
-            },
+            'prices': price_dicts,
+            'best_price': best_price,
             'average_price': sum(price_list) / len(price_list),
             'price_range': {
                 'min': min(price_list),
@@ -115,3 +244,31 @@ class Price(db.Model):
             'total_stores': len(prices)
         }
 
+
+# Column-level mirror of Price.to_dict() for list endpoints
+PRICE_ENCODER = ModelEncoder(Price, [
+    Field('price_id', Price.price_id),
+    Field('product_id', Price.product_id),
+    Field('store_id', Price.store_id),
+    Field('current_price', Price.current_price, float),
+    Field('regular_price', Price.regular_price, to_float),
+    Field('on_sale', Price.on_sale),
+    Field('sale_start_date', Price.sale_start_date, to_isoformat),
+    Field('sale_end_date', Price.sale_end_date, to_isoformat),
+    Field('price_per_unit', Price.price_per_unit, to_float),
+    Field('stock_status', Price.stock_status),
+    Field('data_source', Price.data_source),
+    Field('scraped_at', Price.scraped_at, to_isoformat),
+    Field('valid_from', Price.valid_from, to_isoformat),
+    Field('valid_to', Price.valid_to, to_isoformat),
+    Field('last_updated', Price.created_at, to_isoformat)
+])
+
+# ...and of Price.to_dict(include_store_details=True)
+_STORE_JOIN = (Store, Price.store_id == Store.store_id)
+_CHAIN_JOIN = (GroceryChain, Store.chain_id == GroceryChain.chain_id)
+PRICE_DETAIL_ENCODER = PRICE_ENCODER.extend([
+    Field('store_name', Store.store_name, joins=(_STORE_JOIN,)),
+    Field('chain_name', GroceryChain.chain_name, joins=(_STORE_JOIN, _CHAIN_JOIN)),
+    Field('address', Store.address_street + ', ' + Store.address_city + ', ' + Store.address_province, joins=(_STORE_JOIN,))
+])
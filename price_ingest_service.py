@@ -0,0 +1,283 @@
+"""
+Price Ingest Service
+
+Set-based ingestion of scraped price rows. Rows are processed in chunks, one
+transaction per chunk: product and store existence is checked with one query
+each and rows are compared against the current versions. Rows that repeat the
+current version only refresh its scraped_at. For real changes the previous
+current prices are closed out with a single UPDATE, new rows go in through an
+executemany insert, the current_prices pointers are rewritten in bulk and the
+daily/weekly price rollups and the deals feed are updated.
+"""
+
+import gzip
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Iterator, List
+
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models.user import db
+from src.models.price import Price
+from src.models.current_price import CurrentPrice
+from src.models.price_rollup import PriceRollup
+from src.models.deal import Deal
+from src.models.product import Product
+from src.models.store import Store
+
+REQUIRED_FIELDS = ['product_id', 'store_id', 'current_price', 'data_source']
+
+# Rows per transaction; also bounds the size of the IN lists sent to the database
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _parse_decimal(data: Dict, field: str):
+    value = data.get(field)
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'Invalid {field}: {value!r}')
+
+
+def _parse_date(data: Dict, field: str):
+    value = data.get(field)
+    return datetime.fromisoformat(value).date() if value else None
+
+
+def parse_price_row(data: Dict, now: datetime = None) -> Dict:
+    """Validate one incoming price payload and return Price column values.
+
+    Raises ValueError describing the first problem found.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected a price object')
+
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+        value = data[field]
+        if value is None or (isinstance(value, str) and not value.strip()):
+            raise ValueError(f'Empty required field: {field}')
+
+    for field in ('product_id', 'store_id', 'data_source'):
+        if not isinstance(data[field], str):
+            raise ValueError(f'Invalid {field}: {data[field]!r}')
+
+    now = now or datetime.utcnow()
+
+    return {
+        'product_id': data['product_id'],
+        'store_id': data['store_id'],
+        'current_price': _parse_decimal(data, 'current_price'),
+        'regular_price': _parse_decimal(data, 'regular_price'),
+        'on_sale': bool(data.get('on_sale', False)),
+        'sale_start_date': _parse_date(data, 'sale_start_date'),
+        'sale_end_date': _parse_date(data, 'sale_end_date'),
+        'price_per_unit': _parse_decimal(data, 'price_per_unit'),
+        'stock_status': data.get('stock_status', 'unknown'),
+        'data_source': data['data_source'],
+        'scraped_at': datetime.fromisoformat(data['scraped_at']) if data.get('scraped_at') else now,
+        'valid_from': now,
+        'valid_to': None,
+        'created_at': now
+    }
+
+
+def iter_ndjson(stream, compressed: bool = False) -> Iterator:
+    """Yield one payload per non-blank line of a newline-delimited JSON stream.
+
+    The stream is read incrementally, optionally through gzip. Lines that are
+    not valid JSON are yielded as ValueError instances so the ingester can
+    report them against their record index without stopping the upload.
+    """
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f'Invalid JSON: {e}')
+
+
+def _same_version(current, row: Dict) -> bool:
+    """Check whether row repeats the price version current (a mapping of Price columns)"""
+    return all(current[field] == row[field] for field in Price.VERSIONED_FIELDS)
+
+
+class PriceIngestService:
+    """Chunked, set-based price ingestion"""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def ingest(self, rows: Iterable[Dict]) -> Dict:
+        """Ingest price payloads and return totals with per-row errors"""
+        summary = {'received': 0, 'created': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+
+        for result in self.ingest_batches(rows):
+            for key in ('received', 'created', 'unchanged', 'failed'):
+                summary[key] += result[key]
+            summary['errors'].extend(result['errors'])
+
+        return summary
+
+    def ingest_batches(self, rows: Iterable[Dict]) -> Iterator[Dict]:
+        """Ingest payloads chunk by chunk, yielding each chunk's result after it commits"""
+        chunk = []
+        for index, data in enumerate(rows):
+            chunk.append((index, data))
+            if len(chunk) >= self.chunk_size:
+                yield self._ingest_chunk(chunk)
+                chunk = []
+
+        if chunk:
+            yield self._ingest_chunk(chunk)
+
+    def _ingest_chunk(self, chunk: List) -> Dict:
+        now = datetime.utcnow()
+        result = {'received': len(chunk), 'created': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+
+        def fail(index, message):
+            result['failed'] += 1
+            result['errors'].append(f'Price {index}: {message}')
+
+        parsed = []
+        for index, data in chunk:
+            if isinstance(data, Exception):
+                fail(index, str(data))
+                continue
+            try:
+                parsed.append((index, parse_price_row(data, now)))
+            except (ValueError, TypeError) as e:
+                fail(index, str(e))
+
+        if not parsed:
+            return result
+
+        # Check product and store existence with one query each
+        product_ids = {row['product_id'] for _, row in parsed}
+        store_ids = {row['store_id'] for _, row in parsed}
+        known_products = set(db.session.scalars(
+            select(Product.product_id).where(Product.product_id.in_(product_ids))
+        ))
+        known_stores = set(db.session.scalars(
+            select(Store.store_id).where(Store.store_id.in_(store_ids))
+        ))
+
+        valid = []
+        for index, row in parsed:
+            if row['product_id'] not in known_products:
+                fail(index, 'Product not found')
+                continue
+
+            if row['store_id'] not in known_stores:
+                fail(index, 'Store not found')
+                continue
+
+            valid.append(row)
+
+        if not valid:
+            return result
+
+        # Compare against the current versions, loaded with one query
+        current = self._load_current_prices({(row['product_id'], row['store_id']) for row in valid})
+
+        rows = []
+        touched = {}
+        latest_by_pair = {}
+        for row in valid:
+            pair = (row['product_id'], row['store_id'])
+            previous = latest_by_pair.get(pair)
+
+            if previous is not None:
+                # Earlier row for the same pair in this chunk
+                if _same_version(previous, row):
+                    previous['scraped_at'] = max(previous['scraped_at'], row['scraped_at'])
+                    result['unchanged'] += 1
+                    continue
+                previous['valid_to'] = now
+            elif pair in current and _same_version(current[pair], row):
+                # Unchanged since the last scrape: keep the version open, refresh scraped_at
+                price_id = current[pair]['price_id']
+                touched[price_id] = max(touched.get(price_id, row['scraped_at']), row['scraped_at'])
+                result['unchanged'] += 1
+                continue
+
+            latest_by_pair[pair] = row
+            rows.append(row)
+
+        pairs = list(latest_by_pair)
+        try:
+            if touched:
+                db.session.execute(
+                    update(Price),
+                    [{'price_id': price_id, 'scraped_at': scraped_at} for price_id, scraped_at in touched.items()]
+                )
+            if rows:
+                self._close_current_prices(pairs, now)
+                db.session.execute(insert(Price), rows)
+                self._point_current_prices(pairs)
+                PriceRollup.record(rows)
+                Deal.refresh(pairs)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            result['failed'] += len(rows) + result['unchanged']
+            result['unchanged'] = 0
+            result['errors'].append(f'Prices {chunk[0][0]}-{chunk[-1][0]}: {e}')
+            return result
+
+        result['created'] = len(rows)
+        return result
+
+    def _load_current_prices(self, pairs) -> Dict:
+        """Map (product_id, store_id) to the versioned fields of its current price"""
+        if not pairs:
+            return {}
+
+        columns = [getattr(Price, field) for field in Price.VERSIONED_FIELDS]
+        rows = db.session.execute(
+            select(Price.price_id, Price.product_id, Price.store_id, *columns)
+            .join(CurrentPrice, CurrentPrice.price_id == Price.price_id)
+            .where(tuple_(CurrentPrice.product_id, CurrentPrice.store_id).in_(list(pairs)))
+        ).mappings()
+
+        return {(row['product_id'], row['store_id']): row for row in rows}
+
+    def _close_current_prices(self, pairs: List, now: datetime):
+        """Set valid_to on the current price of every pair in one UPDATE"""
+        current_ids = select(CurrentPrice.price_id).where(
+            tuple_(CurrentPrice.product_id, CurrentPrice.store_id).in_(pairs)
+        )
+        db.session.execute(
+            update(Price).where(Price.price_id.in_(current_ids)).values(valid_to=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _point_current_prices(self, pairs: List):
+        """Repoint current_prices at the newly inserted open rows"""
+        db.session.execute(
+            delete(CurrentPrice).where(
+                tuple_(CurrentPrice.product_id, CurrentPrice.store_id).in_(pairs)
+            ).execution_options(synchronize_session=False)
+        )
+        latest_open = select(
+            Price.product_id,
+            Price.store_id,
+            func.max(Price.price_id)
+        ).where(
+            tuple_(Price.product_id, Price.store_id).in_(pairs),
+            Price.valid_to.is_(None)
+        ).group_by(Price.product_id, Price.store_id)
+
+        db.session.execute(
+            insert(CurrentPrice).from_select(['product_id', 'store_id', 'price_id'], latest_open)
+        )
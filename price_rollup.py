@@ -0,0 +1,223 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+from src.models.user import db
+
+# Rollup periods kept in the price_rollups table
+ROLLUP_PERIODS = ('day', 'week')
+
+# Resolutions accepted by the price history endpoint; 'change' reads the raw
+# price versions, which are already run-length encoded by valid_from/valid_to
+HISTORY_RESOLUTIONS = ('change',) + ROLLUP_PERIODS
+
+def period_start(period, day):
+    """First day of the rollup period containing day (weeks start on Monday)"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+class PriceRollup(db.Model):
+    """Daily and weekly price aggregates per product-store pair"""
+    __tablename__ = 'price_rollups'
+    __table_args__ = (
+        # Rollup series for a product, newest period first
+        db.Index('ix_price_rollups_product_period', 'product_id', 'period', 'period_start'),
+    )
+
+    product_id = db.Column(db.String(50), db.ForeignKey('products.product_id'), primary_key=True)
+    store_id = db.Column(db.String(50), db.ForeignKey('stores.store_id'), primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)  # day, week
+    period_start = db.Column(db.Date, primary_key=True)
+    min_price = db.Column(db.Numeric(8, 2), nullable=False)
+    max_price = db.Column(db.Numeric(8, 2), nullable=False)
+    close_price = db.Column(db.Numeric(8, 2), nullable=False)  # Last price recorded in the period
+    on_sale = db.Column(db.Boolean, default=False)  # On sale at any point in the period
+
+    def __repr__(self):
+        return f'<PriceRollup {self.product_id} @ {self.store_id} {self.period} {self.period_start}>'
+
+    @staticmethod
+    def resolution_for_days(days):
+        """Pick the history resolution that keeps a chart of the given span small"""
+        if days <= 31:
+            return 'change'
+        if days <= 120:
+            return 'day'
+        return 'week'
+
+    @classmethod
+    def record(cls, rows):
+        """Fold newly written price rows into the daily and weekly rollups.
+
+        rows are Price column dicts (product_id, store_id, current_price,
+        on_sale, valid_from) in write order. Existing rollups are loaded with
+        one query; the caller commits.
+        """
+        updates = {}
+        for row in rows:
+            price = row['current_price']
+            for period in ROLLUP_PERIODS:
+                key = (row['product_id'], row['store_id'], period, period_start(period, row['valid_from'].date()))
+                aggregate = updates.get(key)
+                if aggregate is None:
+                    updates[key] = {
+                        'min_price': price,
+                        'max_price': price,
+                        'close_price': price,
+                        'on_sale': bool(row.get('on_sale'))
+                    }
+                else:
+                    aggregate['min_price'] = min(aggregate['min_price'], price)
+                    aggregate['max_price'] = max(aggregate['max_price'], price)
+                    aggregate['close_price'] = price
+                    aggregate['on_sale'] = aggregate['on_sale'] or bool(row.get('on_sale'))
+
+        if not updates:
+            return
+
+        existing = {
+            (rollup.product_id, rollup.store_id, rollup.period, rollup.period_start): rollup
+            for rollup in cls.query.filter(
+                tuple_(cls.product_id, cls.store_id, cls.period, cls.period_start).in_(list(updates))
+            )
+        }
+
+        for key, aggregate in updates.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                product_id, store_id, period, start = key
+                db.session.add(cls(product_id=product_id, store_id=store_id, period=period, period_start=start, **aggregate))
+            else:
+                rollup.min_price = min(rollup.min_price, aggregate['min_price'])
+                rollup.max_price = max(rollup.max_price, aggregate['max_price'])
+                rollup.close_price = aggregate['close_price']
+                rollup.on_sale = rollup.on_sale or aggregate['on_sale']
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Recompute all rollups from the prices table (for seeding and backfills). The caller commits."""
+        from src.models.price import Price
+
+        db.session.query(cls).delete()
+
+        columns = db.session.query(
+            Price.product_id, Price.store_id, Price.current_price, Price.on_sale, Price.valid_from
+        ).order_by(Price.valid_from, Price.price_id).execution_options(yield_per=batch_size)
+
+        batch = []
+        for product_id, store_id, current_price, on_sale, valid_from in columns:
+            batch.append({
+                'product_id': product_id,
+                'store_id': store_id,
+                'current_price': current_price,
+                'on_sale': on_sale,
+                'valid_from': valid_from
+            })
+            if len(batch) >= batch_size:
+                cls.record(batch)
+                batch = []
+
+        cls.record(batch)
+
+    @classmethod
+    def get_store_ids(cls, product_id, period, since, store_ids=None, after=None, limit=50):
+        """Ids of up to limit stores with a rollup in effect for a product since a date, ordered by store_id.
+
+        A store is included when it has a rollup inside the window or still
+        has a current price for the product: rollups are only written when a
+        price changes, so a current price may well predate the window.
+        """
+        from src.models.current_price import CurrentPrice
+
+        in_window = db.select(cls.store_id).where(
+            cls.product_id == product_id,
+            cls.period == period,
+            cls.period_start >= period_start(period, since)
+        )
+        current = db.select(CurrentPrice.store_id).where(CurrentPrice.product_id == product_id)
+        candidates = db.union(in_window, current).subquery()
+
+        query = db.session.query(candidates.c.store_id)
+
+        if store_ids:
+            query = query.filter(candidates.c.store_id.in_(store_ids))
+
+        if after is not None:
+            query = query.filter(candidates.c.store_id > after)
+
+        return [store_id for store_id, in query.order_by(candidates.c.store_id).limit(limit)]
+
+    @classmethod
+    def get_series(cls, product_id, period, since, store_ids=None, until=None):
+        """Rollup rows for a product from since to until (default today) as plain column tuples, newest first.
+
+        Rollups are only written when a price changes, so each store's series
+        is filled forward: every period without a rollup repeats the closing
+        price of the period before it, starting from the store's latest
+        rollup before the window. Stores with a current price are filled up
+        to the period containing until; the others end at their last rollup.
+        """
+        from src.models.current_price import CurrentPrice
+
+        window_start = period_start(period, since)
+        window_end = period_start(period, until or datetime.utcnow().date())
+        step = timedelta(weeks=1) if period == 'week' else timedelta(days=1)
+        columns = (cls.store_id, cls.period_start, cls.min_price, cls.max_price, cls.close_price, cls.on_sale)
+
+        query = db.session.query(*columns).filter(
+            cls.product_id == product_id,
+            cls.period == period,
+            cls.period_start >= window_start
+        )
+
+        latest_before = db.session.query(
+            cls.store_id, db.func.max(cls.period_start).label('period_start')
+        ).filter(
+            cls.product_id == product_id,
+            cls.period == period,
+            cls.period_start < window_start
+        )
+
+        current = db.session.query(CurrentPrice.store_id).filter(CurrentPrice.product_id == product_id)
+
+        if store_ids:
+            query = query.filter(cls.store_id.in_(store_ids))
+            latest_before = latest_before.filter(cls.store_id.in_(store_ids))
+            current = current.filter(CurrentPrice.store_id.in_(store_ids))
+
+        latest_before = latest_before.group_by(cls.store_id).subquery()
+        carried = db.session.query(*columns).join(
+            latest_before,
+            db.and_(cls.store_id == latest_before.c.store_id, cls.period_start == latest_before.c.period_start)
+        ).filter(
+            cls.product_id == product_id,
+            cls.period == period
+        )
+
+        # store_id -> {period_start: row}
+        rollups = {}
+        for row in query:
+            rollups.setdefault(row[0], {})[row[1]] = tuple(row)
+        for store_id, _, _, _, close_price, on_sale in carried:
+            rollups.setdefault(store_id, {}).setdefault(
+                window_start, (store_id, window_start, close_price, close_price, close_price, on_sale)
+            )
+        open_store_ids = {store_id for store_id, in current}
+
+        rows = []
+        for store_id, by_start in rollups.items():
+            end = window_end if store_id in open_store_ids else max(by_start)
+            previous = None
+            start = window_start
+            while start <= end:
+                row = by_start.get(start)
+                if row is None and previous is not None:
+                    close_price, on_sale = previous[4], previous[5]
+                    row = (store_id, start, close_price, close_price, close_price, on_sale)
+                if row is not None:
+                    rows.append(row)
+                    previous = row
+                start += step
+
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
@@ -1,14 +1,25 @@
-from flask import Blueprint, jsonify, request
-from src.models.price import Price
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from src.models.price import Price, PRICE_DETAIL_ENCODER
+from src.models.current_price import CurrentPrice
+from src.models.price_rollup import PriceRollup, HISTORY_RESOLUTIONS
+from src.models.deal import Deal
 from src.models.product import Product
 from src.models.store import Store
 from src.models.user import db
+from src.services.price_ingest_service import PriceIngestService, iter_ndjson, parse_price_row
+from src.services.pagination import encode_cursor, parse_page_args
+from src.services.response_cache import cached_response, invalidate_tags
+from src.services.serialization import json_response
+from src.services.location_service import validate_postal_code, format_postal_code, geocode_postal_code
 from datetime import datetime, timedelta
+from decimal import Decimal
+import json
 from sqlalchemy import and_, desc
 
 prices_bp = Blueprint('prices', __name__)
 
 @prices_bp.route('/prices/compare', methods=['GET'])
+@cached_response(tags=('prices', 'stores'))
 def compare_prices():
     """Compare prices for a specific product across multiple stores"""
     product_id = request.args.get('product_id')
@@ -23,16 +34,21 @@ def compare_prices():
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
-    # Get stores within radius if postal code provided
-    store_ids = None
+    # Restrict to stores within radius if postal code provided
+    location = None
     if postal_code:
-        # TODO: Implement geocoding for postal code
-        # For now, get all active stores
-        stores = Store.query.filter(Store.is_active == True).all()
-        store_ids = [store.store_id for store in stores]
+        if not validate_postal_code(postal_code):
+            return jsonify({'error': 'Invalid postal code format'}), 400
+        
+        location_data = geocode_postal_code(format_postal_code(postal_code))
+        location = {
+            'latitude': location_data['latitude'],
+            'longitude': location_data['longitude'],
+            'radius_km': radius_km
+        }
     
     # Get price comparison
-    comparison = Price.get_price_comparison(product_id, store_ids)
+    comparison = Price.get_price_comparison(product_id, location=location)
     
     if not comparison:
         return jsonify({
@@ -52,18 +68,32 @@ def compare_prices():
         'price_comparison': comparison['prices'],
         'best_price': comparison['best_price'],
         'average_price': round(comparison['average_price'], 2),
-        'price_range': comparison['price_range']
+        'price_range': comparison['price_range'],
+        'location': location
     })
 
 @prices_bp.route('/prices/history/<product_id>', methods=['GET'])
 def get_price_history(product_id):
-    """Get price history for a product"""
+    """Get price history for a product
+    
+    Short spans return every price change; longer spans are served from the
+    daily or weekly rollups. Pass resolution=change|day|week to override.
+    """
     days = request.args.get('days', default=30, type=int)
     store_ids = request.args.getlist('store_ids')
     
     if days > 365:
         days = 365
     
+    resolution = request.args.get('resolution') or PriceRollup.resolution_for_days(days)
+    if resolution not in HISTORY_RESOLUTIONS:
+        return jsonify({'error': f'resolution must be one of: {", ".join(HISTORY_RESOLUTIONS)}'}), 400
+    
+    try:
+        limit, after = parse_page_args(request.args, 50, 200, str)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Check if product exists
     product = Product.query.get(product_id)
     if not product:
@@ -73,41 +103,51 @@ def get_price_history(product_id):
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
     
-    # Build query
-    query = Price.query.filter(
-        Price.product_id == product_id,
-        Price.created_at >= start_date
-    ).order_by(desc(Price.created_at))
-    
-    if store_ids:
-        query = query.filter(Price.store_id.in_(store_ids))
-    
-    prices = query.all()
-    
-    # Group by store and date for easier visualization
-    history_by_store = {}
-    for price in prices:
-        store_id = price.store_id
-        if store_id not in history_by_store:
-            history_by_store[store_id] = {
-                'store_id': store_id,
-                'store_name': price.store.store_name,
-                'chain_name': price.store.chain.chain_name if price.store.chain else None,
-                'price_points': []
-            }
-        
-        history_by_store[store_id]['price_points'].append({
-            'date': price.created_at.isoformat(),
-            'price': float(price.current_price),
-            'on_sale': price.on_sale,
-            'regular_price': float(price.regular_price) if price.regular_price else None
+    # Paginate by store: each page carries the full series for up to limit stores
+    if resolution == 'change':
+        page_store_ids = Price.get_history_store_ids(product_id, start_date, store_ids, after[0] if after else None, limit)
+    else:
+        page_store_ids = PriceRollup.get_store_ids(product_id, resolution, start_date.date(), store_ids, after[0] if after else None, limit)
+    
+    # Group by store for easier visualization
+    points_by_store = {store_id: [] for store_id in page_store_ids}
+    if page_store_ids and resolution == 'change':
+        for store_id, valid_from, valid_to, price, regular_price, on_sale in Price.get_price_changes(product_id, start_date, page_store_ids):
+            points_by_store[store_id].append({
+                'date': valid_from.isoformat(),
+                'valid_to': valid_to.isoformat() if valid_to else None,
+                'price': float(price),
+                'on_sale': on_sale,
+                'regular_price': float(regular_price) if regular_price else None
+            })
+    elif page_store_ids:
+        for store_id, period_start, min_price, max_price, close_price, on_sale in PriceRollup.get_series(product_id, resolution, start_date.date(), page_store_ids):
+            points_by_store[store_id].append({
+                'date': period_start.isoformat(),
+                'price': float(close_price),
+                'min_price': float(min_price),
+                'max_price': float(max_price),
+                'on_sale': on_sale
+            })
+    
+    store_names = Store.get_display_names(list(points_by_store))
+    history_by_store = []
+    for store_id, price_points in points_by_store.items():
+        store_name, chain_name = store_names.get(store_id, (None, None))
+        history_by_store.append({
+            'store_id': store_id,
+            'store_name': store_name,
+            'chain_name': chain_name,
+            'price_points': price_points
         })
     
     return jsonify({
         'product': product.to_dict(),
         'history_days': days,
-        'stores': list(history_by_store.values()),
-        'total_price_points': len(prices)
+        'resolution': resolution,
+        'stores': history_by_store,
+        'total_price_points': sum(len(points) for points in points_by_store.values()),
+        'next_cursor': encode_cursor(page_store_ids[-1]) if len(page_store_ids) == limit else None
     })
 
 @prices_bp.route('/prices', methods=['POST'])
@@ -115,48 +155,39 @@ def create_price():
     """Create a new price entry (admin/scraper only)"""
     data = request.json
     
-    # Validate required fields
-    required_fields = ['product_id', 'store_id', 'current_price', 'data_source']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    try:
+        values = parse_price_row(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
     
     # Check if product and store exist
-    product = Product.query.get(data['product_id'])
+    product = Product.query.get(values['product_id'])
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
-    store = Store.query.get(data['store_id'])
+    store = Store.query.get(values['store_id'])
     if not store:
         return jsonify({'error': 'Store not found'}), 404
     
-    # Invalidate previous current price for this product-store combination
-    current_price = Price.query.filter(
-        Price.product_id == data['product_id'],
-        Price.store_id == data['store_id'],
-        Price.valid_to.is_(None)
-    ).first()
-    
-    if current_price:
-        current_price.valid_to = datetime.utcnow()
+    # An unchanged scrape only refreshes scraped_at on the current version
+    current = CurrentPrice.query.get((values['product_id'], values['store_id']))
+    if current and current.price.matches(values):
+        current.price.scraped_at = max(current.price.scraped_at, values['scraped_at'])
+        db.session.commit()
+        invalidate_tags('prices')
+        return jsonify(current.price.to_dict()), 200
     
     # Create new price entry
-    price = Price(
-        product_id=data['product_id'],
-        store_id=data['store_id'],
-        current_price=data['current_price'],
-        regular_price=data.get('regular_price'),
-        on_sale=data.get('on_sale', False),
-        sale_start_date=datetime.fromisoformat(data['sale_start_date']).date() if data.get('sale_start_date') else None,
-        sale_end_date=datetime.fromisoformat(data['sale_end_date']).date() if data.get('sale_end_date') else None,
-        price_per_unit=data.get('price_per_unit'),
-        stock_status=data.get('stock_status', 'unknown'),
-        data_source=data['data_source'],
-        scraped_at=datetime.fromisoformat(data['scraped_at']) if data.get('scraped_at') else datetime.utcnow()
-    )
+    price = Price(**values)
     
     db.session.add(price)
+    
+    # Invalidate previous current price for this product-store combination
+    CurrentPrice.replace(price)
+    PriceRollup.record([values])
+    Deal.refresh([(price.product_id, price.store_id)])
     db.session.commit()
+    invalidate_tags('prices')
     
     return jsonify(price.to_dict()), 201
 
@@ -168,118 +199,138 @@ def bulk_create_prices():
     if not isinstance(data, list):
         return jsonify({'error': 'Expected array of prices'}), 400
     
-    created_prices = []
-    errors = []
+    summary = PriceIngestService().ingest(data)
+    
+    if summary['created']:
+        status = 201
+    elif summary['unchanged']:
+        status = 200
+    else:
+        status = 400
     
-    for i, price_data in enumerate(data):
+    if status != 400:
+        invalidate_tags('prices')
+    
+    return jsonify(summary), status
+
+@prices_bp.route('/prices/bulk/stream', methods=['POST'])
+def stream_create_prices():
+    """Bulk create prices from a newline-delimited JSON upload (admin/scraper only)
+    
+    The body is read and ingested one batch at a time (send Content-Encoding:
+    gzip for compressed uploads). One progress line is streamed back per
+    batch, followed by a summary line, so memory stays flat for any upload size.
+    """
+    compressed = request.headers.get('Content-Encoding', '').lower() == 'gzip'
+    batch_size = request.args.get('batch_size', default=500, type=int)
+    batch_size = max(1, min(batch_size, 5000))
+    
+    def generate():
+        totals = {'received': 0, 'created': 0, 'unchanged': 0, 'failed': 0}
+        rows = iter_ndjson(request.stream, compressed=compressed)
+        
         try:
-            # Validate required fields
-            required_fields = ['product_id', 'store_id', 'current_price', 'data_source']
-            for field in required_fields:
-                if field not in price_data:
-                    errors.append(f'Price {i}: Missing required field: {field}')
-                    continue
-            
-            # Check if product and store exist
-            if not Product.query.get(price_data['product_id']):
-                errors.append(f'Price {i}: Product not found')
-                continue
-            
-            if not Store.query.get(price_data['store_id']):
-                errors.append(f'Price {i}: Store not found')
-                continue
-            
-            # Invalidate previous current price
-            current_price = Price.query.filter(
-                Price.product_id == price_data['product_id'],
-                Price.store_id == price_data['store_id'],
-                Price.valid_to.is_(None)
-            ).first()
-            
-            if current_price:
-                current_price.valid_to = datetime.utcnow()
-            
-            # Create new price entry
-            price = Price(
-                product_id=price_data['product_id'],
-                store_id=price_data['store_id'],
-                current_price=price_data['current_price'],
-                regular_price=price_data.get('regular_price'),
-                on_sale=price_data.get('on_sale', False),
-                sale_start_date=datetime.fromisoformat(price_data['sale_start_date']).date() if price_data.get('sale_start_date') else None,
-                sale_end_date=datetime.fromisoformat(price_data['sale_end_date']).date() if price_data.get('sale_end_date') else None,
-                price_per_unit=price_data.get('price_per_unit'),
-                stock_status=price_data.get('stock_status', 'unknown'),
-                data_source=price_data['data_source'],
-                scraped_at=datetime.fromisoformat(price_data['scraped_at']) if price_data.get('scraped_at') else datetime.utcnow()
-            )
-            
-            db.session.add(price)
-            created_prices.append(price.to_dict())
-            
-        except Exception as e:
-            errors.append(f'Price {i}: {str(e)}')
-    
-    if created_prices:
-        db.session.commit()
+            for batch, result in enumerate(PriceIngestService(batch_size).ingest_batches(rows)):
+                for key in totals:
+                    totals[key] += result[key]
+                if result['created'] or result['unchanged']:
+                    invalidate_tags('prices')
+                yield json.dumps(dict(result, batch=batch)) + '\n'
+        except (OSError, EOFError) as e:
+            # Truncated or corrupt gzip body; earlier batches are already committed
+            yield json.dumps({'error': f'Could not read upload: {e}'}) + '\n'
+        
+        yield json.dumps(dict(totals, done=True)) + '\n'
     
-    return jsonify({
-        'created': len(created_prices),
-        'errors': errors
-    }), 201 if created_prices else 400
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @prices_bp.route('/prices/current/<product_id>', methods=['GET'])
+@cached_response(tags=('prices', 'stores'))
 def get_current_prices(product_id):
     """Get all current prices for a product"""
+    try:
+        fields = PRICE_DETAIL_ENCODER.resolve_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
-    prices = Price.get_current_prices_for_product(product_id)
+    rows = Price.current(PRICE_DETAIL_ENCODER.query(fields)).filter(
+        CurrentPrice.product_id == product_id
+    ).all()
+    encode = PRICE_DETAIL_ENCODER.compile(fields)
     
-    return jsonify({
+    return json_response({
         'product': product.to_dict(),
-        'current_prices': [price.to_dict(include_store_details=True) for price in prices],
-        'total_stores': len(prices)
+        'current_prices': [encode(row) for row in rows],
+        'total_stores': len(rows)
     })
 
 @prices_bp.route('/prices/deals', methods=['GET'])
+@cached_response(tags=('prices', 'stores'))
 def get_deals():
-    """Get current deals and sales"""
-    limit = request.args.get('limit', default=50, type=int)
+    """Get current deals and sales
+    
+    Served from the precomputed deals feed. sort=newest (default) or
+    savings; filter by category, chains and location (postal code prefix);
+    pass the returned next_cursor as cursor to fetch the following page.
+    """
     category = request.args.get('category')
+    chains = request.args.getlist('chains')
+    location = request.args.get('location')
+    sort = request.args.get('sort', default='newest')
     
-    if limit > 100:
-        limit = 100
+    if sort not in ('newest', 'savings'):
+        return jsonify({'error': 'sort must be one of: newest, savings'}), 400
     
-    # Get current prices that are on sale
-    query = Price.query.filter(
-        Price.valid_to.is_(None),
-        Price.on_sale == True
-    ).order_by(desc(Price.created_at))
+    try:
+        limit, after = parse_page_args(
+            request.args, 50, 100, Decimal if sort == 'savings' else datetime.fromisoformat, int
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if category:
-        query = query.join(Product).filter(Product.category_id == category)
+    deals = Deal.get_page(sort, limit, after, category, chains or None, location)
     
-    deals = query.limit(limit).all()
+    # Load the page's prices with their stores and products in one query
+    prices = Price.with_product_details(Price.with_store_details(Price.query)).filter(
+        Price.price_id.in_([deal.price_id for deal in deals])
+    ).all()
+    prices_by_id = {price.price_id: price for price in prices}
     
     deals_data = []
-    for price in deals:
+    for deal in deals:
+        price = prices_by_id[deal.price_id]
         deal_data = price.to_dict(include_store_details=True)
         deal_data['product'] = price.product.to_dict()
-        deal_data['savings'] = price.savings
+        deal_data['savings'] = float(deal.savings_amount)
+        deal_data['savings_percent'] = float(deal.savings_percent)
         deals_data.append(deal_data)
     
+    next_cursor = None
+    if len(deals) == limit:
+        last = deals[-1]
+        next_cursor = encode_cursor(
+            last.savings_amount if sort == 'savings' else last.created_at.isoformat(),
+            last.price_id
+        )
+    
     return jsonify({
         'deals': deals_data,
-        'total_deals': len(deals_data)
+        'total_deals': len(deals_data),
+        'next_cursor': next_cursor
     })
 
 @prices_bp.route('/prices/<int:price_id>', methods=['DELETE'])
 def delete_price(price_id):
     """Delete a price entry (admin only)"""
     price = Price.query.get_or_404(price_id)
+    CurrentPrice.remove(price)
+    Deal.refresh([(price.product_id, price.store_id)])
     db.session.delete(price)
     db.session.commit()
+    invalidate_tags('prices')
     return '', 204
 
@@ -51,10 +51,13 @@ class Product(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
         
-        if include_prices and self.prices:
+        if include_prices:
             # Get current prices only
-            current_prices = [p for p in self.prices if p.valid_to is None]
-            result['prices'] = [price.to_dict() for price in current_prices]
+            from src.models.price import Price
+            
+            current_prices = Price.get_current_prices_for_product(self.product_id)
+            if current_prices:
+                result['prices'] = [price.to_dict() for price in current_prices]
             
         return result
     
@@ -62,17 +65,16 @@ class Product(db.Model):
         """Get current prices for this product, optionally filtered by location"""
         from src.models.price import Price
         
-        query = Price.query.filter(
-            Price.product_id == self.product_id,
-            Price.valid_to.is_(None)  # Current prices only
-        )
-        
         if postal_code:
-            # TODO: Implement location-based filtering
-            # This would require geocoding the postal code and filtering stores by distance
-            pass
+            from src.services.location_service import format_postal_code, geocode_postal_code
             
-        return query.all()
+            location = geocode_postal_code(format_postal_code(postal_code))
+            nearby = Price.get_current_prices_near(
+                self.product_id, location['latitude'], location['longitude'], radius_km
+            )
+            return [price for price, _ in nearby]
+        
+        return Price.get_current_prices_for_product(self.product_id)
     
     def get_best_price(self, postal_code=None, radius_km=10):
         """Get the best (lowest) current price for this product"""
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from ..services.product_matcher_service import ProductMatcherService
+from ..services.response_cache import cached_response
 
 products_bp = Blueprint('products', __name__)
 matcher_service = ProductMatcherService()
@@ -57,6 +58,7 @@ def compare_product_prices(product_id):
 
 
 @products_bp.route('/categories', methods=['GET'])
+@cached_response(tags=('products',), ttl=3600)
 def get_categories():
     """Get all product categories"""
     
@@ -79,6 +81,7 @@ def get_categories():
 
 
 @products_bp.route('/brands', methods=['GET'])
+@cached_response(tags=('products',), ttl=3600)
 def get_brands():
     """Get all product brands"""
     
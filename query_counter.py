@@ -0,0 +1,39 @@
+"""
+Query Counter
+
+Counts the SQL statements executed while handling each request and reports
+the total in an X-Query-Count response header, so N+1 regressions show up
+in tests and in the browser's network tab.
+"""
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def get_query_count():
+    """Number of SQL statements executed so far in the current request"""
+    return g.get('query_count', 0) if has_request_context() else 0
+
+
+def init_query_counter(app):
+    """Register the counter on all engines and the debug header on the app.
+    
+    The header is sent when QUERY_COUNT_HEADER is set in the app config,
+    defaulting to the app's debug flag.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+    
+    @app.after_request
+    def add_query_count_header(response):
+        if app.config.get('QUERY_COUNT_HEADER', app.debug):
+            response.headers[QUERY_COUNT_HEADER] = str(get_query_count())
+        return response
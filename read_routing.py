@@ -0,0 +1,101 @@
+"""
+Read Routing
+
+Sends the reads of GET/HEAD requests to a read-only engine so search,
+comparison and listing traffic does not compete with scraper writes.
+
+The read engine is the 'replica' bind (see database.init_database): a
+replica URL, or for local setups a second SQLite file or a query_only
+connection to the primary's WAL file. Everything else stays on the primary:
+non-GET requests, any statement that writes, flushes, and every read in a
+request after its first write. Views that must see their own writes use
+read_from_primary, code paths can switch with use_primary(), and clients
+that just wrote can send an X-Read-Primary header.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+READ_REPLICA_BIND = 'replica'
+
+READ_METHODS = ('GET', 'HEAD')
+
+READ_PRIMARY_HEADER = 'X-Read-Primary'
+
+
+class RoutingSession(Session):
+    """Session that picks the replica engine for reads when the request allows it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            engine = self._db.engines.get(READ_REPLICA_BIND)
+            if engine is not None:
+                return engine
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not has_request_context() or not g.get('read_replica'):
+            return False
+
+        if self._flushing or getattr(clause, 'is_dml', False):
+            # Read-your-writes: the rest of the request stays on the primary
+            g.read_replica = False
+            return False
+
+        return clause is None or getattr(clause, 'is_select', False)
+
+
+def read_from_primary(view):
+    """Serve a GET view entirely from the primary database"""
+    view.read_from_primary = True
+    return view
+
+
+@contextmanager
+def use_primary():
+    """Route the reads inside the block to the primary database"""
+    if not has_request_context():
+        yield
+        return
+
+    previous = g.get('read_replica', False)
+    g.read_replica = False
+    try:
+        yield
+    finally:
+        g.read_replica = previous
+
+
+def _set_query_only(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA query_only=ON')
+
+
+def init_read_routing(app, db):
+    """Route GET/HEAD requests to the replica bind when one is configured.
+
+    Call after db.init_app(app). SQLite replica connections are opened with
+    query_only, so a stray write fails instead of diverging from the primary.
+    """
+    with app.app_context():
+        engine = db.engines.get(READ_REPLICA_BIND)
+
+    if engine is None:
+        return
+
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _set_query_only):
+        event.listen(engine, 'connect', _set_query_only)
+
+    @app.before_request
+    def route_reads():
+        view = current_app.view_functions.get(request.endpoint)
+        g.read_replica = (
+            request.method in READ_METHODS
+            and not getattr(view, 'read_from_primary', False)
+            and not request.headers.get(READ_PRIMARY_HEADER)
+        )
@@ -0,0 +1,202 @@
+"""
+Response Cache
+
+Caches the bodies of read-only API responses keyed by route and normalized
+query arguments. Entries are tagged (e.g. 'prices', 'stores') and the write
+routes invalidate by tag. Every cached response carries an ETag, so clients
+that send If-None-Match get a 304 without a body.
+
+Invalidation bumps a per-tag version instead of hunting down keys: an entry
+remembers the versions of its tags when stored and is treated as a miss once
+any of them moves on. Versions are shared by every process: in Redis for the
+Redis backend, in the cache_tags table for the in-process one.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Iterable, Optional
+
+from flask import current_app, make_response, request
+
+from src.models.cache_tag import CacheTag
+
+
+class LRUCacheBackend:
+    """In-process least-recently-used cache (per worker)
+
+    Entries live in the worker, but tag versions are shared through the
+    cache_tags table, so a write in any worker, or by the scraper's ingest,
+    invalidates every worker's entries. Versions are re-read at most every
+    poll_interval seconds, and right away after this worker bumps a tag.
+    """
+
+    def __init__(self, max_entries: int = 1024, poll_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.poll_interval = poll_interval
+        self._entries = OrderedDict()
+        self._tag_versions = {}
+        self._tags_read_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Dict, ttl: int):
+        entry = dict(entry, expires_at=time.time() + ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        if time.time() - self._tags_read_at >= self.poll_interval:
+            versions = CacheTag.get_versions()
+            with self._lock:
+                self._tag_versions = versions
+                self._tags_read_at = time.time()
+
+        with self._lock:
+            return {tag: self._tag_versions.get(tag, 0) for tag in tags}
+
+    def bump_tags(self, tags: Iterable[str]):
+        CacheTag.bump(tags)
+        with self._lock:
+            # Re-read on the next lookup so this worker sees its own write
+            self._tags_read_at = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tag_versions.clear()
+            self._tags_read_at = 0.0
+
+
+class RedisCacheBackend:
+    """Cache shared by all workers through Redis"""
+
+    def __init__(self, url: str, prefix: str = 'grocery:cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Dict]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        entry['body'] = entry['body'].encode('latin-1')
+        return entry
+
+    def set(self, key: str, entry: Dict, ttl: int):
+        entry = dict(entry, body=entry['body'].decode('latin-1'))
+        self.client.set(self.prefix + key, json.dumps(entry), ex=ttl)
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        tags = list(tags)
+        values = self.client.mget([f'{self.prefix}tag:{tag}' for tag in tags]) if tags else []
+        return {tag: int(value or 0) for tag, value in zip(tags, values)}
+
+    def bump_tags(self, tags: Iterable[str]):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(f'{self.prefix}tag:{tag}')
+        pipeline.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+def init_response_cache(app):
+    """Create the configured cache backend and attach it to the app.
+
+    RESPONSE_CACHE_BACKEND selects 'memory' (default), 'redis' (using
+    RESPONSE_CACHE_REDIS_URL) or 'none' to disable caching.
+    """
+    backend_name = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+
+    if backend_name == 'none':
+        backend = None
+    elif backend_name == 'redis':
+        backend = RedisCacheBackend(app.config['RESPONSE_CACHE_REDIS_URL'])
+    else:
+        backend = LRUCacheBackend(
+            app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024),
+            app.config.get('RESPONSE_CACHE_TAG_POLL_SECONDS', 1.0)
+        )
+
+    app.extensions['response_cache'] = backend
+    return backend
+
+
+def _get_backend():
+    return current_app.extensions.get('response_cache')
+
+
+def _cache_key():
+    """Route plus query arguments, sorted so argument order does not matter"""
+    args = sorted((key, value) for key, values in request.args.lists() for value in values)
+    query = '&'.join(f'{key}={value}' for key, value in args)
+    return f'{request.path}?{query}'
+
+
+def cached_response(tags, ttl=300):
+    """Cache a GET view's 200 responses under the given invalidation tags"""
+    tags = tuple(tags)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = _get_backend()
+            if backend is None:
+                return view(*args, **kwargs)
+
+            key = _cache_key()
+            versions = backend.tag_versions(tags)
+
+            entry = backend.get(key)
+            if entry is not None and entry['tag_versions'] == versions:
+                response = current_app.response_class(entry['body'], status=200, mimetype=entry['mimetype'])
+                response.headers['X-Cache'] = 'HIT'
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'tag_versions': versions
+                }
+                backend.set(key, entry, ttl)
+                response.headers['X-Cache'] = 'MISS'
+
+            response.set_etag(entry['etag'])
+            return response.make_conditional(request)
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_tags(*tags):
+    """Drop every cached response carrying any of the tags"""
+    backend = _get_backend()
+    if backend is not None:
+        backend.bump_tags(tags)
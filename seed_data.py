@@ -14,6 +14,9 @@ from src.models.store import Store
 from src.models.product_category import ProductCategory
 from src.models.product import Product
 from src.models.price import Price
+from src.models.current_price import CurrentPrice
+from src.models.price_rollup import PriceRollup
+from src.models.deal import Deal
 
 def seed_database():
     """Seed the database with sample data"""
@@ -461,6 +464,13 @@ def seed_database():
         
         for price in prices:
             db.session.add(price)
+        db.session.flush()
+        
+        # Point current_prices at the seeded rows, then build the history
+        # rollups and the deals feed
+        CurrentPrice.rebuild()
+        PriceRollup.rebuild()
+        Deal.refresh()
         
         # Commit all changes
         db.session.commit()
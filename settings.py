@@ -7,6 +7,8 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+
 BOT_NAME = 'grocery_scraper'
 
 SPIDER_MODULES = ['grocery_scraper.spiders']
@@ -47,6 +49,8 @@ SPIDER_MIDDLEWARES = {
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     'grocery_scraper.middlewares.GroceryScraperDownloaderMiddleware': 543,
+    # Below HttpCompressionMiddleware (590) so stored bodies are decompressed
+    'grocery_scraper.middlewares.ConditionalRequestMiddleware': 580,
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
     'scrapy.downloadermiddlewares.retry.RetryMiddleware': 90,
     'scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware': 110,
@@ -64,13 +68,69 @@ ITEM_PIPELINES = {
     'grocery_scraper.pipelines.ValidationPipeline': 300,
     'grocery_scraper.pipelines.DuplicatesPipeline': 400,
     'grocery_scraper.pipelines.SQLitePipeline': 500,
+    'grocery_scraper.pipelines.APIIngestPipeline': 550,
     'grocery_scraper.pipelines.JsonWriterPipeline': 600,
+    'grocery_scraper.pipelines.ParquetWriterPipeline': 650,
     'grocery_scraper.pipelines.PriceComparisonPipeline': 700,
 }
 
+# Duplicate filtering (DuplicatesPipeline)
+DEDUPE = {
+    'path': 'dedupe_fingerprints.bin',  # Content fingerprints kept between crawls (None for in-memory only)
+    # Drop items identical to the previous finished crawl. This runs before every
+    # writer, so dropped products never reach the databases or the exports: their
+    # scraped_at, rollups and current prices go stale and the exports become
+    # deltas rather than snapshots. Only enable it for delta-only runs.
+    'drop_unchanged': False,
+}
+
+# Skip catalog pages and product tiles unchanged since the last finished crawl.
+# Skipped products are never emitted, so their scraped_at, rollups and current
+# prices are not refreshed; off (path None) unless a run only needs the changes.
+CONTENT_FINGERPRINTS = {
+    'path': None,  # e.g. 'content_fingerprints.db'
+}
+
+# ETag/Last-Modified revalidation of pages (ConditionalRequestMiddleware); off
+# (path None) unless set, since it keeps a copy of every validated page on disk
+CONDITIONAL_REQUESTS = {
+    'path': None,  # e.g. 'conditional_requests.db'
+    'batch_size': 100,  # Pages buffered before they are written in a thread
+}
+
 # Database settings
 DATABASE = {
-    'sqlite_db': 'grocery_data.db'
+    'sqlite_db': 'grocery_data.db',
+    'batch_size': 500,  # Items per write transaction
+    'flush_interval': 5.0,  # Seconds before a partial batch is written
+    'queue_size': 8,  # Batches waiting for the writer thread before the scraper is held back
+}
+
+# Ingest straight into the API database (disabled while database_url is unset)
+API_INGEST = {
+    'database_url': os.environ.get('API_DATABASE_URL'),
+    'api_root': os.environ.get('API_ROOT'),  # Directory containing the API's src package
+    'data_source': 'scraper',
+    'cache_redis_url': os.environ.get('RESPONSE_CACHE_REDIS_URL'),  # Also invalidate the Redis response cache when the API uses it
+    'batch_size': 500,
+    'flush_interval': 5.0,
+    'queue_size': 8,
+}
+
+# JSON Lines output (JsonWriterPipeline)
+JSONL_OUTPUT = {
+    'directory': os.environ.get('JSONL_OUTPUT_DIR', '.'),
+    'compression': None,  # None, 'gzip' or 'zstd' (requires zstandard)
+    'max_bytes': 100 * 1024 * 1024,  # Rotate to a new file past this size on disk
+    'buffer_size': 1024 * 1024,  # Bytes buffered in memory between writes
+}
+
+# Partitioned Parquet output of product items (ParquetWriterPipeline, requires
+# pyarrow); off unless PARQUET_OUTPUT_DIR names the output directory
+PARQUET_OUTPUT = {
+    'directory': os.environ.get('PARQUET_OUTPUT_DIR'),
+    'batch_size': 10000,  # Rows per record batch and partition
+    'compression': 'zstd',
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
@@ -105,13 +165,6 @@ LOG_FILE = 'scrapy.log'
 
 # Feed exports
 FEEDS = {
-    'products.json': {
-        'format': 'json',
-        'encoding': 'utf8',
-        'store_empty': False,
-        'fields': None,
-        'indent': 2,
-    },
     'products.csv': {
         'format': 'csv',
         'encoding': 'utf8',
@@ -1,9 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import Float, and_, cast, or_
 from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+from src.services.serialization import Field, ModelEncoder, to_float, to_isoformat, to_list
+import math
+
+# Approximate length of one degree of latitude in kilometers
+KM_PER_DEGREE_LAT = 111.0
 
 class Store(db.Model):
     __tablename__ = 'stores'
+    __table_args__ = (
+        # Store listings by chain, paged by store_id
+        db.Index('ix_stores_active_chain', 'is_active', 'chain_id', 'store_id'),
+        # Bounding-box prefilter of nearby-store searches
+        db.Index('ix_stores_active_location', 'is_active', 'latitude', 'longitude'),
+    )
     
     store_id = db.Column(db.String(50), primary_key=True)
     chain_id = db.Column(db.String(20), db.ForeignKey('grocery_chains.chain_id'), nullable=False)
@@ -59,20 +72,172 @@ class Store(db.Model):
     
     def calculate_distance(self, lat, lng):
         """Calculate distance from store to given coordinates using Haversine formula"""
-        import math
+        return haversine_km(float(self.latitude), float(self.longitude), lat, lng)
+    
+    @staticmethod
+    def bounding_box(lat, lng, radius_km):
+        """Return (min_lat, max_lat, min_lng, max_lng) enclosing a radius around a point"""
+        lat_delta = radius_km / KM_PER_DEGREE_LAT
+        # Longitude degrees shrink towards the poles; clamp to avoid division by zero
+        lng_delta = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        return lat - lat_delta, lat + lat_delta, lng - lng_delta, lng + lng_delta
+    
+    @classmethod
+    def within_radius(cls, query, lat, lng, radius_km):
+        """Restrict a query joined to stores to the bounding box of a radius.
+        
+        The box is a cheap, index-friendly prefilter; callers still check the
+        exact Haversine distance on the (few) rows it returns.
+        """
+        min_lat, max_lat, min_lng, max_lng = cls.bounding_box(lat, lng, radius_km)
+        return query.filter(
+            cls.is_active == True,
+            cls.latitude.between(min_lat, max_lat),
+            cls.longitude.between(min_lng, max_lng)
+        )
+    
+    @classmethod
+    def get_display_names(cls, store_ids):
+        """Map store ids to (store_name, chain_name) with a single query"""
+        from src.models.grocery_chain import GroceryChain
+        
+        if not store_ids:
+            return {}
+        
+        rows = db.session.query(cls.store_id, cls.store_name, GroceryChain.chain_name).outerjoin(
+            GroceryChain, cls.chain_id == GroceryChain.chain_id
+        ).filter(cls.store_id.in_(store_ids))
+        
+        return {store_id: (store_name, chain_name) for store_id, store_name, chain_name in rows}
+    
+    @classmethod
+    def page_query(cls, query, limit, after=None, chain_ids=None):
+        """Restrict a store query to up to limit active stores ordered by store_id, starting after the store_id after"""
+        query = query.filter(cls.is_active == True)
+        
+        if chain_ids:
+            query = query.filter(cls.chain_id.in_(chain_ids))
+        
+        if after is not None:
+            query = query.filter(cls.store_id > after)
+        
+        return query.order_by(cls.store_id).limit(limit)
+    
+    @classmethod
+    def get_page(cls, limit, after=None, chain_ids=None):
+        """Get up to limit active stores ordered by store_id, starting after the store_id after"""
+        return cls.page_query(cls.query, limit, after, chain_ids).all()
+    
+    @classmethod
+    def find_nearby_rows(cls, query, lat, lng, radius_km, chain_ids=None):
+        """Column-only variant of find_nearby for a query over stores.
+        
+        The query's last two columns must be latitude and longitude. Returns
+        (row, distance_km) tuples, closest first.
+        """
+        query = cls.within_radius(query, lat, lng, radius_km)
         
-        # Convert to radians
-        lat1, lng1 = math.radians(float(self.latitude)), math.radians(float(self.longitude))
-        lat2, lng2 = math.radians(lat), math.radians(lng)
+        if chain_ids:
+            query = query.filter(cls.chain_id.in_(chain_ids))
         
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlng = lng2 - lng1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-        c = 2 * math.asin(math.sqrt(a))
+        nearby = []
+        for row in query:
+            distance = haversine_km(float(row[-2]), float(row[-1]), lat, lng)
+            if distance <= radius_km:
+                nearby.append((row, distance))
         
-        # Earth's radius in kilometers
-        r = 6371
+        nearby.sort(key=lambda x: x[1])
+        return nearby
+    
+    @classmethod
+    def nearby_page_query(cls, query, lat, lng, radius_km, limit=None, after=None, chain_ids=None):
+        """Restrict a store query to up to limit active stores within radius_km of a point, closest first.
+        
+        Adds a trailing distance_sq column: the squared distance in km from an
+        equirectangular approximation, which stays within a fraction of a
+        percent of the Haversine distance over the radii this serves. Rows are
+        ordered by (distance_sq, store_id) and start after the after pair;
+        the cursor predicate and limit run in the database, so a page never
+        loads the stores outside it.
+        """
+        lng_km = KM_PER_DEGREE_LAT * math.cos(math.radians(lat))
+        lat_offset = (cls.latitude - lat) * KM_PER_DEGREE_LAT
+        lng_offset = (cls.longitude - lng) * lng_km
+        distance_sq = cast(lat_offset * lat_offset + lng_offset * lng_offset, Float)
+        
+        query = cls.within_radius(query, lat, lng, radius_km).add_columns(
+            distance_sq.label('distance_sq')
+        ).filter(distance_sq <= radius_km ** 2)
+        
+        if chain_ids:
+            query = query.filter(cls.chain_id.in_(chain_ids))
+        
+        if after is not None:
+            after_distance_sq, after_store_id = after
+            query = query.filter(or_(
+                distance_sq > after_distance_sq,
+                and_(distance_sq == after_distance_sq, cls.store_id > after_store_id)
+            ))
+        
+        return query.order_by(distance_sq, cls.store_id).limit(limit)
+    
+    @classmethod
+    def find_nearby(cls, lat, lng, radius_km, chain_ids=None):
+        """Get active stores within radius_km of a point as (store, distance_km) tuples, closest first"""
+        query = cls.within_radius(cls.query, lat, lng, radius_km)
+        
+        if chain_ids:
+            query = query.filter(cls.chain_id.in_(chain_ids))
         
-        return c * r
+        nearby = []
+        for store in query.all():
+            distance = store.calculate_distance(lat, lng)
+            if distance <= radius_km:
+                nearby.append((store, distance))
+        
+        nearby.sort(key=lambda x: x[1])
+        return nearby
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometers between two points"""
+    # Convert to radians
+    lat1, lng1 = math.radians(lat1), math.radians(lng1)
+    lat2, lng2 = math.radians(lat2), math.radians(lng2)
+    
+    # Haversine formula
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    
+    # Earth's radius in kilometers
+    r = 6371
+    
+    return c * r
+
 
+# Column-level mirror of Store.to_dict() for list endpoints. The compact view
+# is what map pins need and skips the JSON columns entirely.
+STORE_ENCODER = ModelEncoder(Store, [
+    Field('store_id', Store.store_id),
+    Field('chain_id', Store.chain_id),
+    Field('chain_name', GroceryChain.chain_name, joins=((GroceryChain, Store.chain_id == GroceryChain.chain_id),)),
+    Field('store_name', Store.store_name),
+    Field('address.street', Store.address_street),
+    Field('address.city', Store.address_city),
+    Field('address.province', Store.address_province),
+    Field('address.postal_code', Store.postal_code),
+    Field('coordinates.latitude', Store.latitude, to_float),
+    Field('coordinates.longitude', Store.longitude, to_float),
+    Field('contact.phone', Store.phone),
+    Field('contact.website', Store.website_url),
+    Field('hours', Store.hours),
+    Field('services', Store.services, to_list),
+    Field('features', Store.features, to_list),
+    Field('is_active', Store.is_active),
+    Field('created_at', Store.created_at, to_isoformat),
+    Field('updated_at', Store.updated_at, to_isoformat)
+], views={
+    'compact': ['store_id', 'chain_id', 'store_name', 'coordinates']
+})
@@ -1,61 +1,125 @@
 from flask import Blueprint, jsonify, request
-from src.models.store import Store
-from src.models.grocery_chain import GroceryChain
+from src.models.store import Store, STORE_ENCODER
+from src.models.grocery_chain import GroceryChain, GROCERY_CHAIN_ENCODER
+from src.models.deal import Deal
 from src.models.user import db
+from src.services.pagination import encode_cursor, parse_page_args
+from src.services.response_cache import cached_response, invalidate_tags
+from src.services.serialization import json_response
 import math
 
 stores_bp = Blueprint('stores', __name__)
 
 @stores_bp.route('/stores', methods=['GET'])
 def get_stores():
-    """Get all stores or filter by location"""
+    """Get all stores or filter by location
+    
+    Without limit or cursor this returns every matching store as a bare
+    array, as it always has. Passing either switches to pages of
+    {stores, total_stores, next_cursor}, keyed by store_id (or by distance
+    when coordinates are given); pass the returned next_cursor as cursor to
+    fetch the following page. Use view=compact or fields=a,b,c to return
+    only some fields.
+    """
     latitude = request.args.get('latitude', type=float)
     longitude = request.args.get('longitude', type=float)
     radius_km = request.args.get('radius_km', default=10, type=float)
     chains = request.args.getlist('chains')
+    nearby = bool(latitude and longitude)
+    paginated = 'limit' in request.args or 'cursor' in request.args
     
-    query = Store.query.filter(Store.is_active == True)
+    try:
+        if nearby:
+            limit, after = parse_page_args(request.args, 100, 500, float, str)
+        else:
+            limit, after = parse_page_args(request.args, 100, 500, str)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if chains:
-        query = query.filter(Store.chain_id.in_(chains))
+    if not paginated:
+        limit = None
     
-    stores = query.all()
+    try:
+        fields = STORE_ENCODER.resolve_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    encode = STORE_ENCODER.compile(fields)
     
     # Filter by distance if coordinates provided
-    if latitude and longitude:
-        stores_with_distance = []
-        for store in stores:
-            distance = store.calculate_distance(latitude, longitude)
-            if distance <= radius_km:
-                store_dict = store.to_dict()
-                store_dict['distance_km'] = round(distance, 2)
-                stores_with_distance.append(store_dict)
+    if nearby:
+        rows = Store.nearby_page_query(
+            STORE_ENCODER.query(fields), latitude, longitude, radius_km, limit, after, chains or None
+        ).all()
+        
+        stores = []
+        for row in rows:
+            store_dict = encode(row)
+            store_dict['distance_km'] = round(math.sqrt(row[-1]), 2)
+            stores.append(store_dict)
         
-        # Sort by distance
-        stores_with_distance.sort(key=lambda x: x['distance_km'])
-        return jsonify(stores_with_distance)
+        # The store_id key column sits between the fields and the squared distance
+        next_cursor = encode_cursor(rows[-1][-1], rows[-1][-2]) if len(rows) == limit else None
+    else:
+        # Plain listing: select only the requested columns as tuples
+        rows = Store.page_query(STORE_ENCODER.query(fields), limit, after[0] if after else None, chains or None).all()
+        stores = [encode(row) for row in rows]
+        # The store_id key column trails the requested fields
+        next_cursor = encode_cursor(rows[-1][-1]) if len(rows) == limit else None
     
-    return jsonify([store.to_dict() for store in stores])
+    if not paginated:
+        return json_response(stores)
+    
+    return json_response({
+        'stores': stores,
+        'total_stores': len(stores),
+        'next_cursor': next_cursor
+    })
 
 @stores_bp.route('/stores/<store_id>', methods=['GET'])
+@cached_response(tags=('stores',))
 def get_store(store_id):
     """Get detailed information for a specific store"""
     store = Store.query.get_or_404(store_id)
     return jsonify(store.to_dict())
 
 @stores_bp.route('/stores/chains', methods=['GET'])
+@cached_response(tags=('stores',))
 def get_chains():
     """Get all grocery chains"""
-    chains = GroceryChain.query.all()
-    return jsonify([chain.to_dict() for chain in chains])
+    try:
+        fields = GROCERY_CHAIN_ENCODER.resolve_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    encode = GROCERY_CHAIN_ENCODER.compile(fields)
+    return json_response([encode(row) for row in GROCERY_CHAIN_ENCODER.query(fields)])
 
 @stores_bp.route('/stores/chains/<chain_id>', methods=['GET'])
 def get_chain(chain_id):
-    """Get specific grocery chain with its stores"""
+    """Get specific grocery chain with its stores
+    
+    Lists every store unless limit or cursor is passed; then stores holds
+    one page and next_cursor fetches the following one, as in GET /stores.
+    """
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    try:
+        limit, after = parse_page_args(request.args, 100, 500, str)
+        fields = STORE_ENCODER.resolve_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not paginated:
+        limit = None
+    
     chain = GroceryChain.query.get_or_404(chain_id)
+    rows = Store.page_query(STORE_ENCODER.query(fields), limit, after[0] if after else None, [chain_id]).all()
+    encode = STORE_ENCODER.compile(fields)
+    
     chain_dict = chain.to_dict()
-    chain_dict['stores'] = [store.to_dict() for store in chain.stores if store.is_active]
-    return jsonify(chain_dict)
+    chain_dict['stores'] = [encode(row) for row in rows]
+    if paginated:
+        chain_dict['next_cursor'] = encode_cursor(rows[-1][-1]) if len(rows) == limit else None
+    return json_response(chain_dict)
 
 @stores_bp.route('/stores', methods=['POST'])
 def create_store():
@@ -98,6 +162,7 @@ def create_store():
     
     db.session.add(store)
     db.session.commit()
+    invalidate_tags('stores')
     
     return jsonify(store.to_dict()), 201
 
@@ -117,7 +182,11 @@ def update_store(store_id):
         if field in data:
             setattr(store, field, data[field])
     
+    # Store activity and postal code feed into the deals materialization
+    db.session.flush()
+    Deal.refresh(store_ids=[store_id])
     db.session.commit()
+    invalidate_tags('stores')
     return jsonify(store.to_dict())
 
 @stores_bp.route('/stores/<store_id>', methods=['DELETE'])
@@ -125,6 +194,9 @@ def delete_store(store_id):
     """Soft delete a store (admin only)"""
     store = Store.query.get_or_404(store_id)
     store.is_active = False
+    db.session.flush()
+    Deal.refresh(store_ids=[store_id])
     db.session.commit()
+    invalidate_tags('stores')
     return '', 204
 
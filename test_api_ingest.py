@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+API ingest tests
+
+Runs APIIngestPipeline's writer methods against a throwaway SQLite file
+holding the API schema, without a running reactor.
+"""
+import logging
+import os
+import sys
+import tempfile
+
+import pytest
+from itemadapter import ItemAdapter
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from grocery_scraper.items import GroceryProductItem, StoreLocationItem
+from grocery_scraper.pipelines import APIIngestPipeline
+
+
+def _store():
+    return StoreLocationItem(
+        store_id='metro_1', store_name='Metro Queen', chain_name='Metro',
+        street_address='1 Queen St', city='Toronto', province='Ontario',
+        postal_code='M5V 3A8', latitude=43.6532, longitude=-79.3832
+    )
+
+
+def _product(**fields):
+    item = GroceryProductItem(
+        product_id='metro_milk', name='Milk', store_id='metro_1',
+        current_price=3.99, regular_price=4.99, on_sale=True, **fields
+    )
+    # Set after construction, which stamps the current time
+    item['scraped_at'] = '2024-01-01T00:00:00'
+    return item
+
+
+@pytest.fixture()
+def pipeline():
+    from src.services.database import create_schema
+
+    pipeline = APIIngestPipeline(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'api.db')}")
+    pipeline.logger = logging.getLogger('test')
+    pipeline.open_writer()
+    create_schema()
+    yield pipeline
+    pipeline.db.engine.dispose()
+    pipeline.close_writer()
+
+
+def _write(pipeline, *items):
+    return pipeline.write([pipeline.item_row(item, ItemAdapter(item)) for item in items])
+
+
+def test_sparse_scrape_keeps_existing_columns(pipeline):
+    from src.models.product import Product
+
+    _write(pipeline, _store(), _product(brand='Neilson', category='Dairy', subcategory='Milk', organic=True))
+    _write(pipeline, _product(category='Dairy'))
+
+    product = pipeline.db.session.get(Product, 'metro_milk')
+    assert (product.brand, product.subcategory_id, product.attributes) == ('Neilson', 'milk', {'organic': True})
+
+
+def test_category_change_refreshes_deals(pipeline):
+    from src.models.deal import Deal
+
+    _write(pipeline, _store(), _product(category='Dairy'))
+    assert [deal.category_id for deal in Deal.query.all()] == ['dairy']
+
+    # Same price, so only the catalog update can move the deal
+    counters = _write(pipeline, _product(category='Grocery'))
+    assert counters['products_updated'] == 1
+    assert [deal.category_id for deal in Deal.query.all()] == ['grocery']
+
+
+def test_failed_cache_bump_keeps_the_batch(pipeline, caplog):
+    from src.models.product import Product
+
+    class FailingTags:
+        @staticmethod
+        def bump(tags):
+            raise RuntimeError('database is locked')
+
+    pipeline.cache_tags = FailingTags
+    counters = _write(pipeline, _store(), _product(category='Dairy'))
+
+    assert counters['products_inserted'] == 1 and counters['prices_created'] == 1
+    assert pipeline.db.session.get(Product, 'metro_milk') is not None
+    assert 'failed to bump cache tags' in caplog.text
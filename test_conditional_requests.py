@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Conditional request tests
+
+Drives ConditionalRequestMiddleware's request and response hooks directly,
+as the downloader would, against a throwaway validator file. Batches are
+only written in a thread with a running reactor, so these tests keep below
+batch_size and rely on the write at spider close.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from grocery_scraper.middlewares import ConditionalRequestMiddleware
+
+URL = 'https://www.metro.ca/en/flyer'
+BODY = b'<html><body><div class="product-tile">Milk $4.99</div></body></html>'
+VALIDATORS = {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+
+
+def _open(path):
+    middleware = ConditionalRequestMiddleware(path, stats=MemoryStatsCollector(get_crawler()))
+    middleware.spider_opened(None)
+    return middleware
+
+
+@pytest.fixture()
+def path():
+    return os.path.join(tempfile.mkdtemp(), 'conditional_requests.db')
+
+
+@pytest.fixture()
+def middleware(path):
+    middleware = _open(path)
+    yield middleware
+    middleware.spider_closed(None)
+
+
+def _fetch(middleware, request, response):
+    """Send request through the middleware and answer it with response"""
+    assert middleware.process_request(request, None) is None
+    return middleware.process_response(request, response, None)
+
+
+def _page(headers=VALIDATORS):
+    return HtmlResponse(URL, status=200, headers=dict(headers, **{'Content-Type': 'text/html; charset=utf-8'}),
+                        body=BODY)
+
+
+def test_first_request_is_unconditional(middleware):
+    request = Request(URL)
+    _fetch(middleware, request, _page())
+
+    assert b'If-None-Match' not in request.headers
+    assert b'If-Modified-Since' not in request.headers
+
+
+def test_later_requests_send_the_stored_validators(middleware):
+    _fetch(middleware, Request(URL), _page())
+
+    request = Request(URL)
+    middleware.process_request(request, None)
+    assert request.headers['If-None-Match'] == b'"v1"'
+    assert request.headers['If-Modified-Since'] == VALIDATORS['Last-Modified'].encode()
+
+
+def test_not_modified_replays_the_stored_page(middleware):
+    _fetch(middleware, Request(URL), _page())
+
+    request = Request(URL)
+    response = _fetch(middleware, request, Response(URL, status=304))
+
+    assert isinstance(response, HtmlResponse)
+    assert response.status == 200
+    assert response.body == BODY
+    assert 'not_modified' in response.flags
+    assert response.css('.product-tile::text').get() == 'Milk $4.99'
+
+    stats = middleware.stats.get_stats()
+    assert stats['conditional/not_modified'] == 1
+    assert stats['conditional/bytes_saved'] == len(BODY)
+
+
+def test_changed_page_replaces_the_stored_copy(middleware):
+    _fetch(middleware, Request(URL), _page())
+    _fetch(middleware, Request(URL), HtmlResponse(URL, status=200, headers={'ETag': '"v2"'}, body=b'<html>new</html>'))
+
+    request = Request(URL)
+    response = _fetch(middleware, request, Response(URL, status=304))
+    assert request.headers['If-None-Match'] == b'"v2"'
+    assert response.body == b'<html>new</html>'
+
+
+def test_pages_without_validators_are_not_stored(middleware):
+    _fetch(middleware, Request(URL), _page(headers={}))
+
+    request = Request(URL)
+    middleware.process_request(request, None)
+    assert b'If-None-Match' not in request.headers
+
+
+def test_unknown_not_modified_passes_through(middleware):
+    response = _fetch(middleware, Request(URL, headers={'If-None-Match': '"spider"'}), Response(URL, status=304))
+    assert response.status == 304
+
+
+def test_dont_revalidate_and_post_are_left_alone(middleware):
+    _fetch(middleware, Request(URL), _page())
+
+    for request in (Request(URL, meta={'dont_revalidate': True}), Request(URL, method='POST')):
+        response = _fetch(middleware, request, Response(URL, status=304))
+        assert b'If-None-Match' not in request.headers
+        assert response.status == 304
+
+
+def test_validators_and_pages_carry_to_the_next_crawl(path):
+    first = _open(path)
+    _fetch(first, Request(URL), _page())
+    first.spider_closed(None)
+
+    second = _open(path)
+    assert second.validators == {URL: ('"v1"', VALIDATORS['Last-Modified'])}
+    request = Request(URL)
+    response = _fetch(second, request, Response(URL, status=304))
+    second.spider_closed(None)
+
+    assert request.headers['If-None-Match'] == b'"v1"'
+    assert response.body == BODY and 'not_modified' in response.flags
+
+
+def test_requests_do_not_touch_the_file(middleware):
+    _fetch(middleware, Request(URL), _page())
+    connection, middleware.connection = middleware.connection, None
+
+    request = Request(URL)
+    middleware.process_request(request, None)
+    assert request.headers['If-None-Match'] == b'"v1"'
+
+    middleware.connection = connection
+
+
+def test_disabled_by_default():
+    from grocery_scraper import settings
+
+    assert settings.CONDITIONAL_REQUESTS['path'] is None
+
+
+def test_disabled_without_a_path():
+    crawler = get_crawler(settings_dict={'CONDITIONAL_REQUESTS': {'path': None}})
+    with pytest.raises(NotConfigured):
+        ConditionalRequestMiddleware.from_crawler(crawler)
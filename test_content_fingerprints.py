@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Content fingerprint tests
+
+FingerprintStore on its own, and MetroSpider skipping unchanged catalog
+pages and product tiles across crawls sharing a fingerprint file.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from grocery_scraper.fingerprints import FingerprintStore, content_digest
+from grocery_scraper.spiders.metro_spider import MetroSpider
+
+CATALOG_URL = 'https://www.metro.ca/en/online-grocery/flyer'
+STORE_INFO = {'store_id': 'metro_1', 'store_name': 'Metro'}
+
+
+@pytest.fixture()
+def path():
+    return os.path.join(tempfile.mkdtemp(), 'content_fingerprints.db')
+
+
+def test_content_digest_accepts_str_and_bytes():
+    assert content_digest('tile') == content_digest(b'tile')
+    assert content_digest('tile') != content_digest('tile ')
+    assert len(content_digest('tile')) == 32
+
+
+def test_nothing_is_unchanged_before_a_commit(path):
+    store = FingerprintStore(path, 'metro')
+    assert not store.unchanged('page', CATALOG_URL, 'a')
+    store.close()
+
+    store = FingerprintStore(path, 'metro')
+    assert not store.unchanged('page', CATALOG_URL, 'a')
+    store.close()
+
+
+def test_committed_digests_carry_to_the_next_crawl(path):
+    store = FingerprintStore(path, 'metro')
+    store.unchanged('page', CATALOG_URL, 'a')
+    store.unchanged('tile', 'x', 'x')
+    store.commit()
+    store.close()
+
+    store = FingerprintStore(path, 'metro')
+    assert store.unchanged('page', CATALOG_URL, 'a')
+    assert store.unchanged('tile', 'x', 'x')
+    assert not store.unchanged('page', CATALOG_URL, 'b')
+    store.close()
+
+
+def test_commit_replaces_the_previous_crawl(path):
+    store = FingerprintStore(path, 'metro')
+    store.unchanged('tile', 'old', 'old')
+    store.commit()
+    store.close()
+
+    store = FingerprintStore(path, 'metro')
+    store.unchanged('tile', 'new', 'new')
+    store.commit()
+    store.close()
+
+    store = FingerprintStore(path, 'metro')
+    assert not store.unchanged('tile', 'old', 'old')
+    assert store.unchanged('tile', 'new', 'new')
+    store.close()
+
+
+def test_namespaces_are_separate(path):
+    store = FingerprintStore(path, 'metro')
+    store.unchanged('page', CATALOG_URL, 'a')
+    store.commit()
+    store.close()
+
+    store = FingerprintStore(path, 'loblaws')
+    assert not store.unchanged('page', CATALOG_URL, 'a')
+    store.close()
+
+
+def _catalog(*tiles):
+    body = ''.join(
+        f'<div class="product-tile"><div class="product-name">{name}</div>'
+        f'<span class="product-size">1 unit</span><span class="price">${price}</span></div>'
+        for name, price in tiles
+    )
+    return HtmlResponse(CATALOG_URL, body=f'<html><body>{body}</body></html>', encoding='utf-8')
+
+
+def _crawl(path, response, reason='finished', **kwargs):
+    """Extract one catalog page in a fresh spider; returns the product names"""
+    crawler = get_crawler(MetroSpider, {'CONTENT_FINGERPRINTS': {'path': path}})
+    spider = MetroSpider.from_crawler(crawler, **kwargs)
+    products = spider.extract_products(response, STORE_INFO)
+    spider.closed(reason)
+    return [product['name'] for product in products]
+
+
+def test_fingerprints_off_without_a_path():
+    crawler = get_crawler(MetroSpider, {'CONTENT_FINGERPRINTS': {'path': None}})
+    assert MetroSpider.from_crawler(crawler).fingerprints is None
+
+
+def test_unchanged_page_is_skipped(path):
+    response = _catalog(('Milk', '4.99'), ('Bread', '2.49'))
+    assert _crawl(path, response) == ['Milk', 'Bread']
+    assert _crawl(path, response) == []
+
+
+def test_only_changed_tiles_are_extracted(path):
+    _crawl(path, _catalog(('Milk', '4.99'), ('Bread', '2.49')))
+    assert _crawl(path, _catalog(('Milk', '4.99'), ('Bread', '1.99'))) == ['Bread']
+
+
+def test_refresh_extracts_everything(path):
+    response = _catalog(('Milk', '4.99'), ('Bread', '2.49'))
+    _crawl(path, response)
+    assert _crawl(path, response, refresh='1') == ['Milk', 'Bread']
+
+
+def test_interrupted_crawl_is_not_committed(path):
+    response = _catalog(('Milk', '4.99'))
+    _crawl(path, response, reason='shutdown')
+    assert _crawl(path, response) == ['Milk']
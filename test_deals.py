@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Deals feed tests
+
+Prices go in through PriceIngestService, as the bulk endpoints write them,
+and the feed is read back through /api/prices/deals on a small app backed
+by a throwaway SQLite file.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+from src.models.product_category import ProductCategory
+from src.models.product import Product
+from src.models.store import Store
+from src.models.deal import Deal
+from src.routes.prices import prices_bp
+from src.services.database import create_schema, init_database
+from src.services.price_ingest_service import PriceIngestService
+
+# (product_id, category_id)
+PRODUCTS = [('milk', 'dairy'), ('cheese', 'dairy'), ('apples', 'produce')]
+STORES = ['store_a', 'store_b']
+
+
+def _price(product_id, store_id, current, regular, on_sale):
+    return {
+        'product_id': product_id,
+        'store_id': store_id,
+        'current_price': current,
+        'regular_price': regular,
+        'on_sale': on_sale,
+        'data_source': 'test'
+    }
+
+
+@pytest.fixture()
+def app():
+    db_path = os.path.join(tempfile.mkdtemp(), 'deals.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    init_database(app)
+    app.register_blueprint(prices_bp, url_prefix='/api')
+
+    with app.app_context():
+        create_schema()
+        db.session.add(GroceryChain(chain_id='metro', chain_name='Metro'))
+        db.session.add_all(ProductCategory(category_id=category, category_name=category.title())
+                           for category in {category for _, category in PRODUCTS})
+        db.session.add_all(Product(product_id=product_id, name=product_id.title(), category_id=category)
+                           for product_id, category in PRODUCTS)
+        db.session.add_all(Store(store_id=store_id, chain_id='metro', store_name=store_id,
+                                 address_street='1 Main St', address_city='Toronto', address_province='ON',
+                                 postal_code='M5V 3A8', latitude=43.65, longitude=-79.38)
+                           for store_id in STORES)
+        db.session.commit()
+
+        PriceIngestService().ingest([
+            _price('milk', 'store_a', 4.00, 5.00, True),
+            _price('milk', 'store_b', 5.00, 5.00, False),
+            _price('cheese', 'store_a', 6.00, 9.00, True),
+            _price('apples', 'store_b', 3.50, 4.00, True),
+        ])
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _deal_pairs(app):
+    with app.app_context():
+        return sorted((deal.product_id, deal.store_id) for deal in Deal.query)
+
+
+def test_feed_holds_current_sale_prices(app):
+    assert _deal_pairs(app) == [('apples', 'store_b'), ('cheese', 'store_a'), ('milk', 'store_a')]
+
+    with app.app_context():
+        deal = db.session.get(Deal, ('cheese', 'store_a'))
+        assert float(deal.savings_amount) == 3.0
+        assert float(deal.savings_percent) == pytest.approx(33.33, abs=0.01)
+        assert deal.category_id == 'dairy'
+        assert deal.location_bucket == 'M5V'
+
+
+def test_sale_ending_removes_the_deal(app):
+    with app.app_context():
+        PriceIngestService().ingest([_price('milk', 'store_a', 5.00, 5.00, False)])
+
+    assert ('milk', 'store_a') not in _deal_pairs(app)
+
+
+def test_deactivated_store_leaves_the_feed(app):
+    with app.app_context():
+        db.session.get(Store, 'store_a').is_active = False
+        Deal.refresh(store_ids=['store_a'])
+        db.session.commit()
+
+    assert _deal_pairs(app) == [('apples', 'store_b')]
+
+
+def test_deals_sorted_by_savings(app):
+    data = app.test_client().get('/api/prices/deals?sort=savings').get_json()
+
+    assert [deal['savings'] for deal in data['deals']] == [3.0, 1.0, 0.5]
+    assert data['deals'][0]['product']['product_id'] == 'cheese'
+
+
+def test_deals_filtered_by_category(app):
+    data = app.test_client().get('/api/prices/deals?category=produce').get_json()
+    assert [deal['product']['product_id'] for deal in data['deals']] == ['apples']
+
+
+def test_deal_pages_follow_the_cursor(app):
+    client = app.test_client()
+    first = client.get('/api/prices/deals?sort=savings&limit=2').get_json()
+    second = client.get(f"/api/prices/deals?sort=savings&limit=2&cursor={first['next_cursor']}").get_json()
+
+    assert [deal['savings'] for deal in first['deals']] == [3.0, 1.0]
+    assert [deal['savings'] for deal in second['deals']] == [0.5]
+    assert second['next_cursor'] is None
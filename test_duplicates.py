@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Duplicate filter tests
+
+FingerprintSet on its own, and DuplicatesPipeline across two crawls sharing
+a fingerprint file.
+"""
+import logging
+import os
+import sys
+import tempfile
+
+import pytest
+from scrapy.exceptions import DropItem
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from grocery_scraper.items import GroceryProductItem
+from grocery_scraper.pipelines import DuplicatesPipeline, FingerprintSet, fingerprint
+
+
+class Spider:
+    name = 'test'
+    logger = logging.getLogger('test')
+
+
+def test_add_reports_new_fingerprints():
+    fingerprints = FingerprintSet()
+    assert fingerprints.add(42)
+    assert not fingerprints.add(42)
+    assert 42 in fingerprints
+    assert 43 not in fingerprints
+    assert len(fingerprints) == 1
+
+
+def test_set_grows_past_its_capacity():
+    fingerprints = FingerprintSet(capacity=4)
+    values = [fingerprint(i) for i in range(1000)]
+    for value in values:
+        fingerprints.add(value)
+
+    assert len(fingerprints) == 1000
+    assert all(value in fingerprints for value in values)
+    assert sorted(fingerprints) == sorted(values)
+    assert fingerprints.memory_bytes >= 1000 / FingerprintSet.MAX_LOAD * 8
+
+
+def test_colliding_slots_probe_onwards():
+    fingerprints = FingerprintSet(capacity=4)
+    # Same low bits, so they all start at the same slot
+    values = [1 + (n << 40) for n in range(5)]
+    for value in values:
+        assert fingerprints.add(value)
+
+    assert all(value in fingerprints for value in values)
+    assert (1 + (9 << 40)) not in fingerprints
+
+
+def test_save_and_load_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), 'fingerprints.bin')
+    fingerprints = FingerprintSet()
+    values = {fingerprint(f'item-{i}') for i in range(500)}
+    for value in values:
+        fingerprints.add(value)
+    fingerprints.save(path)
+
+    loaded = FingerprintSet.load(path)
+    assert set(loaded) == values
+    assert not os.path.exists(path + '.part')
+
+
+def test_load_missing_file_is_empty():
+    assert len(FingerprintSet.load(os.path.join(tempfile.mkdtemp(), 'missing.bin'))) == 0
+
+
+def test_fingerprint_ignores_key_order_and_is_never_zero():
+    assert fingerprint({'a': 1, 'b': 2}) == fingerprint({'b': 2, 'a': 1})
+    assert fingerprint({'a': 1}) != fingerprint({'a': 2})
+    assert all(fingerprint(i) for i in range(1000))
+
+
+def _product(product_id, price, store_id='store_1'):
+    return GroceryProductItem(product_id=product_id, name=product_id, store_id=store_id, current_price=price)
+
+
+def _crawl(path, items, reason='finished', **kwargs):
+    """Run items through a pipeline; returns the ones that passed"""
+    pipeline = DuplicatesPipeline(path=path, **kwargs)
+    passed = []
+    for item in items:
+        try:
+            passed.append(pipeline.process_item(item, Spider()))
+        except DropItem:
+            pass
+    pipeline.spider_closed(Spider(), reason)
+    return [item['product_id'] for item in passed]
+
+
+def test_repeats_within_a_crawl_are_dropped():
+    items = [_product('milk', 4.99), _product('milk', 4.99), _product('milk', 4.99, 'store_2')]
+    assert _crawl(None, items) == ['milk', 'milk']
+
+
+def test_unchanged_items_pass_by_default():
+    path = os.path.join(tempfile.mkdtemp(), 'dedupe.bin')
+    _crawl(path, [_product('milk', 4.99), _product('bread', 2.49)])
+
+    assert _crawl(path, [_product('milk', 4.99), _product('bread', 2.49)]) == ['milk', 'bread']
+
+
+def test_drop_unchanged_keeps_only_changes():
+    path = os.path.join(tempfile.mkdtemp(), 'dedupe.bin')
+    _crawl(path, [_product('milk', 4.99), _product('bread', 2.49)])
+
+    assert _crawl(path, [_product('milk', 4.99), _product('bread', 1.99)], drop_unchanged=True) == ['bread']
+
+
+def test_interrupted_crawl_keeps_previous_fingerprints():
+    path = os.path.join(tempfile.mkdtemp(), 'dedupe.bin')
+    _crawl(path, [_product('milk', 4.99), _product('bread', 2.49)])
+    _crawl(path, [_product('eggs', 3.49)], reason='shutdown')
+
+    assert _crawl(path, [_product('milk', 4.99), _product('eggs', 3.49)], drop_unchanged=True) == []
+
+
+def test_finished_crawl_replaces_fingerprints():
+    path = os.path.join(tempfile.mkdtemp(), 'dedupe.bin')
+    _crawl(path, [_product('milk', 4.99), _product('bread', 2.49)])
+    _crawl(path, [_product('eggs', 3.49)])
+
+    assert _crawl(path, [_product('milk', 4.99), _product('eggs', 3.49)], drop_unchanged=True) == ['milk']
+
+
+@pytest.mark.parametrize('volatile', DuplicatesPipeline.VOLATILE_FIELDS)
+def test_volatile_fields_do_not_count_as_changes(volatile):
+    path = os.path.join(tempfile.mkdtemp(), 'dedupe.bin')
+    first = _product('milk', 4.99)
+    second = _product('milk', 4.99)
+    first[volatile], second[volatile] = 'before', 'after'
+    _crawl(path, [first])
+
+    assert _crawl(path, [second], drop_unchanged=True) == []
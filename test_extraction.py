@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compiled extraction tests
+
+CompiledExtractor and FieldRule on small lxml documents, and MetroSpider's
+spec applied to a catalog tile.
+"""
+import os
+import sys
+
+from lxml import html
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from grocery_scraper.extraction import CompiledExtractor, FieldRule
+from grocery_scraper.spiders.metro_spider import MetroSpider
+
+SPEC = {
+    'tiles': ['.product-tile', '.product-card'],
+    'tile_fallback': '//*[contains(@class, "product") and contains(., "$")]',
+    'name': ['.product-name::text', 'h3::text'],
+    'brand': ['.brand::text'],
+    'size': ['.size::text'],
+    'prices': ['.price', '.sale-price'],
+    'sale_indicators': ['.sale', '.promo'],
+}
+
+
+def _root(body):
+    return html.fromstring(f'<html><body>{body}</body></html>')
+
+
+def test_css_is_compiled_to_xpath_once():
+    rule = FieldRule(['.product-name::text', 'h3::text'])
+    assert len(rule.variants) == 2
+    assert rule.last == 0
+
+
+def test_last_matching_variant_is_tried_first():
+    rule = FieldRule(['.product-name::text', 'h3::text'])
+
+    assert rule.first(_root('<h3>Milk</h3>')) == 'Milk'
+    assert rule.last == 1
+    assert rule.first(_root('<h3>Bread</h3>')) == 'Bread'
+    assert rule.last == 1
+
+    assert rule.first(_root('<div class="product-name">Eggs</div>')) == 'Eggs'
+    assert rule.last == 0
+
+
+def test_earlier_variants_keep_priority_over_the_last_match():
+    rule = FieldRule(['.product-name::text', 'h3::text'])
+    both = '<div class="product-name">Milk 2%</div><h3>Milk</h3>'
+
+    assert rule.first(_root('<h3>Bread</h3>')) == 'Bread'
+    assert rule.first(_root(both)) == 'Milk 2%'
+
+    assert rule.select(_root('<h3>Bread</h3>')) == ['Bread']
+    assert rule.select(_root(both)) == ['Milk 2%']
+
+
+def test_empty_element_falls_through_to_the_next_variant():
+    rule = FieldRule(['.product-name::text', 'h3::text'])
+    assert rule.first(_root('<div class="product-name"></div><h3>Milk</h3>')) == 'Milk'
+    assert rule.first(_root('<p>nothing</p>')) is None
+
+
+def test_tiles_try_each_variant_then_the_fallback():
+    extractor = CompiledExtractor(SPEC)
+
+    tiles = extractor.find_tiles(_root('<div class="product-card">A $1</div><div class="product-card">B $2</div>'))
+    assert [tile.text for tile in tiles] == ['A $1', 'B $2']
+
+    tiles = extractor.find_tiles(_root('<section class="product-list-item">C $3</section>'))
+    assert [tile.text for tile in tiles] == ['C $3']
+
+
+def test_fields_prices_and_sale_flag_are_read_per_tile():
+    extractor = CompiledExtractor(SPEC)
+    root = _root(
+        '<div class="product-tile"><h3>Milk</h3><span class="brand">Natrel</span><span class="size">2 L</span>'
+        '<span class="price">$5.49</span><span class="sale-price">$4.99</span><span class="promo">Save</span></div>'
+        '<div class="product-tile"><h3>Bread</h3><span class="price">$2.49</span></div>'
+    )
+    milk, bread = extractor.find_tiles(root)
+
+    assert extractor.field('name', milk) == 'Milk'
+    assert extractor.field('brand', milk) == 'Natrel'
+    assert extractor.field('size', milk) == '2 L'
+    assert [element.text for element in extractor.prices(milk)] == ['$5.49', '$4.99']
+    assert extractor.sale_indicators(milk) is True
+
+    # Relative to the tile, not the document
+    assert extractor.field('brand', bread) is None
+    assert extractor.sale_indicators(bread) is False
+
+
+def test_metro_spec_parses_a_catalog_tile():
+    spider = MetroSpider()
+    root = _root(
+        '<div class="product-tile"><div class="product-name">Organic Milk</div>'
+        '<div class="product-brand">Natrel</div><div class="product-size">2 L</div>'
+        '<span class="price">$4.99</span></div>'
+    )
+    tile, = spider.extractor.find_tiles(root)
+
+    product = spider.parse_product_element(tile, {'store_id': 'metro_1', 'store_name': 'Metro'}, 'https://www.metro.ca/')
+    assert product['name'] == 'Organic Milk'
+    assert product['brand'] == 'Natrel'
+    assert product['current_price'] == 4.99
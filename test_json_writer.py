@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+JSON Lines writer tests
+
+Writes items through JsonWriterPipeline into a temporary directory and
+reads the finished files back with read_json_lines.
+"""
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+import pytest
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from grocery_scraper import pipelines
+from grocery_scraper.pipelines import JsonWriterPipeline, read_json_lines
+
+
+class Spider:
+    name = 'test'
+
+
+def _items(count):
+    # The digest keeps compressed output from shrinking below the rotation size
+    return [{'product_id': f'p{i:04d}', 'name': f'Product {i}', 'current_price': Decimal('4.99'),
+             'sku': hashlib.sha1(str(i).encode()).hexdigest()}
+            for i in range(count)]
+
+
+def _run(directory, items, **kwargs):
+    pipeline = JsonWriterPipeline(directory, stats=MemoryStatsCollector(get_crawler()), **kwargs)
+    pipeline.open_spider(Spider())
+    for item in items:
+        pipeline.process_item(item, Spider())
+    pipeline.close_spider(Spider())
+    return pipeline
+
+
+def _read_back(directory):
+    paths = sorted(glob.glob(os.path.join(directory, 'grocery_data_test_*')))
+    return paths, [item for path in paths for item in read_json_lines(path)]
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_rotated_files_read_back_in_order(compression):
+    if compression == 'zstd' and pipelines.zstandard is None:
+        pytest.skip('zstandard is not installed')
+
+    directory = tempfile.mkdtemp()
+    items = _items(2000)
+    pipeline = _run(directory, items, compression=compression, max_bytes=8 * 1024, buffer_size=1024)
+
+    paths, read = _read_back(directory)
+    assert len(paths) > 1
+    assert all(path.endswith(JsonWriterPipeline.EXTENSIONS[compression]) for path in paths)
+    assert read == [dict(item, current_price='4.99') for item in items]
+
+    stats = pipeline.stats.get_stats()
+    assert stats['jsonl/files'] == len(paths)
+    assert stats['jsonl/items'] == len(items)
+
+
+def test_lines_are_compact():
+    directory = tempfile.mkdtemp()
+    _run(directory, _items(3))
+
+    paths, _ = _read_back(directory)
+    with open(paths[0], 'rb') as handle:
+        lines = handle.read().splitlines()
+
+    assert len(lines) == 3
+    assert lines[0].startswith(b'{"product_id":"p0000","name":"Product 0","current_price":"4.99","sku":"')
+
+
+def test_no_partial_or_empty_files_are_left():
+    directory = tempfile.mkdtemp()
+    _run(directory, [])
+
+    assert os.listdir(directory) == []
+
+
+def test_unsupported_compression_is_rejected():
+    with pytest.raises(pipelines.NotConfigured):
+        JsonWriterPipeline(tempfile.mkdtemp(), compression='bz2')
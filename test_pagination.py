@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination tests
+
+Cursor encoding on its own, and paging through /api/stores on a small app
+backed by a throwaway SQLite file.
+"""
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from sqlalchemy import insert
+from werkzeug.datastructures import MultiDict
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+from src.models.store import Store
+# Imported so create_schema can resolve the deals table's foreign keys
+from src.models.product_category import ProductCategory
+from src.models.product import Product
+from src.routes.stores import stores_bp
+from src.services.database import create_schema, init_database
+from src.services.pagination import decode_cursor, encode_cursor, parse_page_args
+
+STORE_COUNT = 7
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(1.25, 'store_0003')
+    assert decode_cursor(cursor, float, str) == [1.25, 'store_0003']
+
+
+def test_cursor_round_trip_keeps_none():
+    assert decode_cursor(encode_cursor(None, 'a'), float, str) == [None, 'a']
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor('??>>~~', 'ÿÿ')
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', encode_cursor('a', 'b'), encode_cursor('x')])
+def test_decode_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, float)
+
+
+def test_parse_page_args_clamps_limit():
+    assert parse_page_args(MultiDict({'limit': '1000'}), 100, 500, str) == (500, None)
+    assert parse_page_args(MultiDict({'limit': '0'}), 100, 500, str) == (1, None)
+    assert parse_page_args(MultiDict(), 100, 500, str) == (100, None)
+
+
+def test_parse_page_args_decodes_cursor():
+    args = MultiDict({'cursor': encode_cursor('store_0002')})
+    assert parse_page_args(args, 100, 500, str) == (100, ['store_0002'])
+
+
+@pytest.fixture()
+def client():
+    db_path = os.path.join(tempfile.mkdtemp(), 'pagination.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    init_database(app)
+    app.register_blueprint(stores_bp, url_prefix='/api')
+
+    with app.app_context():
+        create_schema()
+        db.session.add(GroceryChain(chain_id='metro', chain_name='Metro'))
+        db.session.flush()
+        db.session.execute(insert(Store), [{
+            'store_id': f'store_{i:04d}',
+            'chain_id': 'metro',
+            'store_name': f'Store {i}',
+            'address_street': f'{i} Main St',
+            'address_city': 'Toronto',
+            'address_province': 'ON',
+            'postal_code': 'M5V 3A8',
+            'latitude': Decimal('43.6532') + Decimal(i) / 1000,
+            'longitude': Decimal('-79.3832'),
+            'is_active': True
+        } for i in range(STORE_COUNT)])
+        db.session.commit()
+
+    yield app.test_client()
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _walk(client, url):
+    pages = []
+    cursor = None
+    while True:
+        page = client.get(f'{url}&cursor={cursor}' if cursor else url).get_json()
+        pages.append(page)
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_stores_without_paging_args_are_a_bare_list(client):
+    stores = client.get('/api/stores').get_json()
+    assert isinstance(stores, list)
+    assert len(stores) == STORE_COUNT
+
+
+def test_store_pages_cover_every_store_once(client):
+    pages = _walk(client, '/api/stores?limit=3')
+
+    assert [page['total_stores'] for page in pages] == [3, 3, 1]
+    ids = [store['store_id'] for page in pages for store in page['stores']]
+    assert ids == [f'store_{i:04d}' for i in range(STORE_COUNT)]
+
+
+def test_nearby_store_pages_follow_distance(client):
+    pages = _walk(client, '/api/stores?limit=2&latitude=43.6532&longitude=-79.3832&radius_km=5')
+
+    stores = [store for page in pages for store in page['stores']]
+    assert [store['store_id'] for store in stores] == [f'store_{i:04d}' for i in range(STORE_COUNT)]
+    distances = [store['distance_km'] for store in stores]
+    assert distances == sorted(distances)
+
+
+def test_chain_without_paging_args_lists_every_store(client):
+    chain = client.get('/api/stores/chains/metro').get_json()
+    assert len(chain['stores']) == STORE_COUNT
+    assert 'next_cursor' not in chain
+
+
+def test_chain_store_pages_cover_every_store_once(client):
+    pages = []
+    url = '/api/stores/chains/metro?limit=3'
+    while url:
+        page = client.get(url).get_json()
+        pages.append(page)
+        url = f"/api/stores/chains/metro?limit=3&cursor={page['next_cursor']}" if page['next_cursor'] else None
+
+    assert [len(page['stores']) for page in pages] == [3, 3, 1]
+    ids = [store['store_id'] for page in pages for store in page['stores']]
+    assert ids == [f'store_{i:04d}' for i in range(STORE_COUNT)]
+
+
+def test_nearby_stores_without_paging_args_are_a_bare_list(client):
+    stores = client.get('/api/stores?latitude=43.6532&longitude=-79.3832&radius_km=0.5').get_json()
+    # Stores sit 111 m apart going north, so 0.5 km reaches the first five
+    assert [store['store_id'] for store in stores] == [f'store_{i:04d}' for i in range(5)]
+    assert [store['distance_km'] for store in stores] == [0.0, 0.11, 0.22, 0.33, 0.44]
+
+
+def test_invalid_cursor_is_a_bad_request(client):
+    response = client.get('/api/stores?cursor=garbage')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
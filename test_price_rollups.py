@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Price rollup tests
+
+Builds rollups from a few price versions in a throwaway SQLite file and
+reads back the stores and filled-forward series the history endpoint uses.
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+from src.models.product_category import ProductCategory
+from src.models.product import Product
+from src.models.store import Store
+from src.models.price import Price
+from src.models.current_price import CurrentPrice
+from src.models.price_rollup import PriceRollup
+from src.services.database import create_schema, init_database
+
+# (store_id, price, valid_from, valid_to)
+PRICES = [
+    # Changes inside the window and is still current
+    ('store_a', 4.00, datetime(2024, 1, 1), datetime(2024, 3, 3)),
+    ('store_a', 3.50, datetime(2024, 3, 3), None),
+    # Listed for one day inside the window, then dropped
+    ('store_b', 5.00, datetime(2024, 3, 2), datetime(2024, 3, 3)),
+    # Dropped years before the window
+    ('store_c', 6.00, datetime(2020, 1, 1), datetime(2020, 2, 1)),
+]
+
+
+@pytest.fixture()
+def app():
+    db_path = os.path.join(tempfile.mkdtemp(), 'rollups.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    init_database(app)
+
+    with app.app_context():
+        create_schema()
+        db.session.add(GroceryChain(chain_id='metro', chain_name='Metro'))
+        db.session.add(ProductCategory(category_id='dairy', category_name='Dairy'))
+        db.session.add(Product(product_id='milk', name='Milk', category_id='dairy'))
+        db.session.add_all(Store(store_id=store_id, chain_id='metro', store_name=store_id,
+                                 address_street='1 Main St', address_city='Toronto', address_province='ON',
+                                 postal_code='M5V 3A8', latitude=43.65, longitude=-79.38)
+                           for store_id in ('store_a', 'store_b', 'store_c'))
+        db.session.add_all(Price(product_id='milk', store_id=store_id, current_price=price, data_source='test',
+                                 scraped_at=valid_from, valid_from=valid_from, valid_to=valid_to)
+                           for store_id, price, valid_from, valid_to in PRICES)
+        db.session.flush()
+        CurrentPrice.rebuild()
+        PriceRollup.rebuild()
+        db.session.commit()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _closes(rows):
+    return [(store_id, start.isoformat(), float(close)) for store_id, start, _, _, close, _ in rows]
+
+
+def test_store_ids_skip_stores_gone_before_the_window(app):
+    with app.app_context():
+        assert PriceRollup.get_store_ids('milk', 'day', date(2024, 3, 1)) == ['store_a', 'store_b']
+        assert PriceRollup.get_store_ids('milk', 'day', date(2024, 3, 4)) == ['store_a']
+        assert PriceRollup.get_store_ids('milk', 'day', date(2019, 12, 1)) == ['store_a', 'store_b', 'store_c']
+
+
+def test_daily_series_fills_every_day_forward(app):
+    with app.app_context():
+        rows = PriceRollup.get_series('milk', 'day', date(2024, 3, 1), ['store_a', 'store_b'], until=date(2024, 3, 5))
+
+    assert sorted(_closes(rows)) == [
+        ('store_a', '2024-03-01', 4.0),
+        ('store_a', '2024-03-02', 4.0),
+        ('store_a', '2024-03-03', 3.5),
+        ('store_a', '2024-03-04', 3.5),
+        ('store_a', '2024-03-05', 3.5),
+        # No current price, so the series ends at the last rollup
+        ('store_b', '2024-03-02', 5.0),
+    ]
+    assert [row[1] for row in rows] == sorted((row[1] for row in rows), reverse=True)
+
+
+def test_weekly_series_fills_every_week_forward(app):
+    with app.app_context():
+        rows = PriceRollup.get_series('milk', 'week', date(2024, 3, 1), ['store_a'], until=date(2024, 3, 20))
+
+    assert _closes(rows) == [
+        ('store_a', '2024-03-18', 3.5),
+        ('store_a', '2024-03-11', 3.5),
+        ('store_a', '2024-03-04', 3.5),
+        ('store_a', '2024-02-26', 3.5),
+    ]
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Streaming price upload tests
+
+Posts newline-delimited JSON to /api/prices/bulk/stream on a small app
+backed by a throwaway SQLite file and reads back the progress and summary
+lines it streams.
+"""
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+from src.models.product_category import ProductCategory
+from src.models.product import Product
+from src.models.store import Store
+from src.models.price import Price
+from src.routes.prices import prices_bp
+from src.services.database import create_schema, init_database
+
+URL = '/api/prices/bulk/stream'
+PRODUCTS = ['milk', 'bread', 'eggs']
+STORES = ['store_a', 'store_b']
+
+
+class TrickleStream(io.RawIOBase):
+    """Body that arrives a few bytes per read, splitting lines across reads"""
+
+    def __init__(self, data, read_size=7):
+        self.data = io.BytesIO(data)
+        self.read_size = read_size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data.read(min(len(buffer), self.read_size))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+@pytest.fixture()
+def app():
+    db_path = os.path.join(tempfile.mkdtemp(), 'stream.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    init_database(app)
+    app.register_blueprint(prices_bp, url_prefix='/api')
+
+    with app.app_context():
+        create_schema()
+        db.session.add(GroceryChain(chain_id='metro', chain_name='Metro'))
+        db.session.add(ProductCategory(category_id='grocery', category_name='Grocery'))
+        db.session.add_all(Product(product_id=product_id, name=product_id.title(), category_id='grocery')
+                           for product_id in PRODUCTS)
+        db.session.add_all(Store(store_id=store_id, chain_id='metro', store_name=store_id,
+                                 address_street='1 Main St', address_city='Toronto', address_province='ON',
+                                 postal_code='M5V 3A8', latitude=43.65, longitude=-79.38)
+                           for store_id in STORES)
+        db.session.commit()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _line(product_id, store_id, price):
+    return json.dumps({
+        'product_id': product_id,
+        'store_id': store_id,
+        'current_price': price,
+        'data_source': 'test'
+    })
+
+
+def _post(app, body, url=URL, **kwargs):
+    """Upload body; returns the streamed lines as dicts"""
+    response = app.test_client().post(url, data=body, content_type='application/x-ndjson', **kwargs)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _price_count(app):
+    with app.app_context():
+        return Price.query.count()
+
+
+def test_progress_per_batch_then_summary(app):
+    body = '\n'.join(_line(product_id, store_id, 1.99) for product_id in PRODUCTS for store_id in STORES)
+    lines = _post(app, body, f'{URL}?batch_size=4')
+
+    assert [(line['batch'], line['received'], line['created']) for line in lines[:-1]] == [(0, 4, 4), (1, 2, 2)]
+    assert lines[-1] == {'received': 6, 'created': 6, 'unchanged': 0, 'failed': 0, 'done': True}
+    assert _price_count(app) == 6
+
+
+def test_malformed_lines_fail_on_their_own(app):
+    body = '\n'.join([
+        _line('milk', 'store_a', 4.99),
+        '{"product_id": "milk", ',
+        '',
+        '   ',
+        json.dumps({'product_id': 'milk', 'store_id': 'store_b'}),
+        _line('caviar', 'store_a', 99.0),
+        _line('bread', 'store_a', 2.49),
+    ])
+    lines = _post(app, body)
+
+    errors = lines[0]['errors']
+    # Blank lines are skipped and do not count as records
+    assert [error.split(':')[0] for error in errors] == ['Price 1', 'Price 2', 'Price 3']
+    assert 'Invalid JSON' in errors[0]
+    assert errors[2] == 'Price 3: Product not found'
+    assert lines[-1] == {'received': 5, 'created': 2, 'unchanged': 0, 'failed': 3, 'done': True}
+    assert _price_count(app) == 2
+
+
+def test_repeats_across_batch_boundaries_are_unchanged(app):
+    body = '\n'.join([
+        _line('milk', 'store_a', 4.99),
+        _line('milk', 'store_a', 4.99),
+        _line('milk', 'store_a', 4.99),
+        _line('milk', 'store_a', 3.99),
+    ])
+    lines = _post(app, body, f'{URL}?batch_size=2')
+
+    assert [(line['created'], line['unchanged']) for line in lines[:-1]] == [(1, 1), (1, 1)]
+    assert lines[-1]['created'] == 2 and lines[-1]['unchanged'] == 2
+    assert _price_count(app) == 2
+
+
+def test_lines_split_across_reads(app):
+    body = '\n'.join(_line(product_id, 'store_a', 1.49) for product_id in PRODUCTS).encode()
+    lines = _post(app, TrickleStream(body), content_length=len(body))
+
+    assert lines[-1] == {'received': 3, 'created': 3, 'unchanged': 0, 'failed': 0, 'done': True}
+
+
+def test_gzip_upload(app):
+    body = gzip.compress('\n'.join(_line('eggs', store_id, 3.49) for store_id in STORES).encode())
+    lines = _post(app, body, headers={'Content-Encoding': 'gzip'})
+
+    assert lines[-1] == {'received': 2, 'created': 2, 'unchanged': 0, 'failed': 0, 'done': True}
+
+
+def test_truncated_gzip_reports_an_error_after_committed_batches(app):
+    body = gzip.compress('\n'.join(_line(product_id, 'store_a', 1.0) for product_id in PRODUCTS).encode())
+    lines = _post(app, body[:-12], f'{URL}?batch_size=1', headers={'Content-Encoding': 'gzip'})
+
+    assert 'Could not read upload' in lines[-2]['error']
+    assert lines[-1]['done'] is True
+    assert lines[-1]['created'] == _price_count(app)
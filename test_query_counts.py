@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Query count tests
+
+Reads the X-Query-Count header of the price endpoints on a small app backed
+by a throwaway SQLite file. Each endpoint must run a fixed number of
+statements however many stores carry the product, so eager loading
+regressions (N+1 queries per price, store or product) fail here.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+from src.models.product_category import ProductCategory
+from src.models.product import Product
+from src.models.store import Store
+from src.routes.prices import prices_bp
+from src.services.database import create_schema, init_database
+from src.services.price_ingest_service import PriceIngestService
+from src.services.query_counter import QUERY_COUNT_HEADER, init_query_counter
+
+PRODUCTS = ['milk', 'cheese', 'apples']
+
+# Statements per request, whatever the store count
+MAX_QUERIES = {
+    # Deals page, then its prices with stores and products
+    '/api/prices/deals': 2,
+    '/api/prices/deals?sort=savings': 2,
+    # Product, its category, then the current prices with their stores
+    '/api/prices/current/milk': 3,
+    '/api/prices/compare?product_id=milk': 3,
+    '/api/prices/compare?product_id=milk&postal_code=M5V3A8': 3,
+}
+
+
+def _client(store_count):
+    db_path = os.path.join(tempfile.mkdtemp(), 'query_counts.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['QUERY_COUNT_HEADER'] = True
+    init_database(app)
+    init_query_counter(app)
+    app.register_blueprint(prices_bp, url_prefix='/api')
+
+    stores = [f'store_{i}' for i in range(store_count)]
+    with app.app_context():
+        create_schema()
+        db.session.add(GroceryChain(chain_id='metro', chain_name='Metro'))
+        db.session.add(ProductCategory(category_id='grocery', category_name='Grocery'))
+        db.session.add_all(Product(product_id=product_id, name=product_id.title(), category_id='grocery')
+                           for product_id in PRODUCTS)
+        db.session.add_all(Store(store_id=store_id, chain_id='metro', store_name=store_id,
+                                 address_street='1 Main St', address_city='Toronto', address_province='ON',
+                                 postal_code='M5V 3A8', latitude=43.64 + i / 1000, longitude=-79.38)
+                           for i, store_id in enumerate(stores))
+        db.session.commit()
+
+        # Every product on sale in every store, so each endpoint returns one row per store
+        PriceIngestService().ingest([{
+            'product_id': product_id,
+            'store_id': store_id,
+            'current_price': 3.00 + i / 100,
+            'regular_price': 5.00,
+            'on_sale': True,
+            'data_source': 'test'
+        } for product_id in PRODUCTS for i, store_id in enumerate(stores)])
+        db.session.remove()
+
+    return app.test_client()
+
+
+def _query_count(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return int(response.headers[QUERY_COUNT_HEADER])
+
+
+@pytest.fixture(scope='module')
+def clients():
+    return _client(2), _client(8)
+
+
+@pytest.mark.parametrize('url', list(MAX_QUERIES))
+def test_query_count_is_bounded(clients, url):
+    few_stores, many_stores = clients
+    counts = [_query_count(few_stores, url), _query_count(many_stores, url)]
+
+    assert counts[0] == counts[1]
+    assert counts[1] <= MAX_QUERIES[url]
+
+
+def test_responses_cover_every_store(clients):
+    few_stores, many_stores = clients
+    assert len(many_stores.get('/api/prices/current/milk').get_json()['current_prices']) == 8
+    assert len(many_stores.get('/api/prices/compare?product_id=milk').get_json()['price_comparison']) == 8
+    assert many_stores.get('/api/prices/deals').get_json()['total_deals'] == 24
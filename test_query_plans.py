@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Query plan regression tests for the hot read endpoints
+
+Seeds a database at realistic scale, calls each hot endpoint in prices.py,
+stores.py and locations.py, and runs EXPLAIN QUERY PLAN on every statement
+it executed. A plain "SCAN <table>" of one of the large tables means a
+missing or unusable index and fails the test.
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, insert
+
+# Point the app at a throwaway database before it is imported
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'query_plans.db')}"
+os.environ.pop('DATABASE_READ_URL', None)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app
+from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+from src.models.store import Store
+from src.models.product_category import ProductCategory
+from src.models.product import Product
+from src.models.price import Price
+from src.models.current_price import CurrentPrice
+from src.models.price_rollup import PriceRollup
+from src.models.deal import Deal
+from src.services.database import create_schema
+
+CHAINS = ['walmart', 'loblaws', 'metro', 'nofrills', 'costco']
+CATEGORIES = ['dairy', 'produce', 'meat', 'bakery', 'pantry']
+STORE_COUNT = 2000
+PRODUCT_COUNT = 300
+STORES_PER_PRODUCT = 60
+VERSIONS_PER_PRICE = 3
+
+# Tables large enough that a full scan is a regression
+HOT_TABLES = {'prices', 'current_prices', 'stores', 'products', 'price_rollups', 'deals'}
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+HOT_ENDPOINTS = [
+    # prices.py
+    '/api/prices/compare?product_id=product_0001',
+    '/api/prices/compare?product_id=product_0001&postal_code=M5V3A8&radius_km=25',
+    '/api/prices/history/product_0001?days=30',
+    '/api/prices/history/product_0001?days=30&store_ids=store_0001&store_ids=store_0002',
+    '/api/prices/history/product_0001?days=90',
+    '/api/prices/history/product_0001?days=365',
+    '/api/prices/current/product_0001',
+    '/api/prices/current/product_0001?fields=current_price,store_name',
+    '/api/prices/deals',
+    '/api/prices/deals?sort=savings',
+    '/api/prices/deals?category=dairy',
+    '/api/prices/deals?category=dairy&sort=savings',
+    # stores.py
+    '/api/stores',
+    '/api/stores?chains=metro',
+    '/api/stores?view=compact&latitude=43.6532&longitude=-79.3832&radius_km=10',
+    '/api/stores/store_0001',
+    '/api/stores/chains/metro',
+    # locations.py
+    '/api/locations/stores?latitude=43.6532&longitude=-79.3832&radius_km=25',
+    '/api/locations/stores?latitude=43.6532&longitude=-79.3832&chains=metro',
+    '/api/locations/postal-code/M5V3A8',
+]
+
+
+def _seed():
+    rng = random.Random(42)
+    now = datetime.utcnow()
+
+    db.session.add_all(GroceryChain(chain_id=chain, chain_name=chain.title()) for chain in CHAINS)
+    db.session.add_all(ProductCategory(category_id=category, category_name=category.title()) for category in CATEGORIES)
+    db.session.flush()
+
+    db.session.execute(insert(Store), [{
+        'store_id': f'store_{i:04d}',
+        'chain_id': CHAINS[i % len(CHAINS)],
+        'store_name': f'Store {i}',
+        'address_street': f'{i} Main St',
+        'address_city': 'Toronto',
+        'address_province': 'ON',
+        'postal_code': f'M{i % 10}V {i % 10}A{i % 10}',
+        # Spread across southern Ontario
+        'latitude': Decimal(str(round(rng.uniform(42.0, 46.5), 6))),
+        'longitude': Decimal(str(round(rng.uniform(-83.0, -74.5), 6))),
+        'is_active': i % 20 != 0
+    } for i in range(STORE_COUNT)])
+
+    db.session.execute(insert(Product), [{
+        'product_id': f'product_{i:04d}',
+        'name': f'Product {i}',
+        'category_id': CATEGORIES[i % len(CATEGORIES)]
+    } for i in range(PRODUCT_COUNT)])
+
+    prices = []
+    for i in range(PRODUCT_COUNT):
+        for s in rng.sample(range(STORE_COUNT), STORES_PER_PRODUCT):
+            regular = Decimal(rng.randint(100, 2000)) / 100
+            for version in range(VERSIONS_PER_PRICE):
+                valid_from = now - timedelta(days=rng.randint(1, 400) if version < VERSIONS_PER_PRICE - 1 else 0)
+                on_sale = rng.random() < 0.2
+                prices.append({
+                    'product_id': f'product_{i:04d}',
+                    'store_id': f'store_{s:04d}',
+                    'current_price': regular * Decimal('0.8') if on_sale else regular,
+                    'regular_price': regular,
+                    'on_sale': on_sale,
+                    'data_source': 'test',
+                    'scraped_at': valid_from,
+                    'valid_from': valid_from,
+                    'valid_to': None if version == VERSIONS_PER_PRICE - 1 else valid_from + timedelta(days=1),
+                    'created_at': valid_from
+                })
+    db.session.execute(insert(Price), prices)
+
+    CurrentPrice.rebuild()
+    PriceRollup.rebuild()
+    Deal.refresh()
+    db.session.commit()
+
+    # Give the planner real statistics, as a long-running database would have
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def client():
+    app.config['TESTING'] = True
+    # Every request must reach the database
+    app.extensions['response_cache'] = None
+
+    with app.app_context():
+        db.drop_all(bind_key=None)
+        create_schema()
+        _seed()
+
+    yield app.test_client()
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all(bind_key=None)
+
+
+def _capture_statements(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200, f'{url} returned {response.status_code}: {response.get_data(as_text=True)}'
+    return statements
+
+
+def _full_scans(statement, parameters):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+
+    scans = []
+    for row in plan:
+        match = FULL_SCAN.match(row[-1])
+        if match and match.group(1) in HOT_TABLES:
+            scans.append(row[-1])
+    return scans
+
+
+@pytest.mark.parametrize('url', HOT_ENDPOINTS)
+def test_hot_endpoint_avoids_full_table_scans(client, url):
+    statements = _capture_statements(client, url)
+    assert statements, f'{url} ran no queries'
+
+    failures = []
+    for statement, parameters in statements:
+        scans = _full_scans(statement, parameters)
+        if scans:
+            failures.append(f'{", ".join(scans)} in:\n{statement}')
+
+    assert not failures, f'{url} falls back to full table scans:\n\n' + '\n\n'.join(failures)
+
+
+def test_models_declare_hot_indexes(client):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            indexes = {name for name, in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )}
+
+    for name in (
+        'ix_prices_product_store_valid_to',
+        'ix_prices_product_valid_from',
+        'ix_prices_open',
+        'ix_stores_active_chain',
+        'ix_stores_active_location',
+        'ix_current_prices_store',
+        'ix_price_rollups_product_period',
+    ):
+        assert name in indexes
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Read routing tests
+
+Runs a small app against two SQLite files, a primary and a replica, each
+holding a differently named chain, so the response shows which database
+served the read.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.cache_tag import CacheTag
+from src.models.grocery_chain import GroceryChain
+# Imported so the chain's relationships resolve when this module runs alone
+from src.models.store import Store
+from src.models.price import Price
+from src.services.database import init_database
+from src.services.read_routing import READ_PRIMARY_HEADER, READ_REPLICA_BIND, read_from_primary, use_primary
+
+
+def _make_database(path, chain_name, tag_version):
+    engine = create_engine(f'sqlite:///{path}')
+    GroceryChain.__table__.create(engine)
+    CacheTag.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(GroceryChain), [{'chain_id': chain_name, 'chain_name': chain_name}])
+        conn.execute(insert(CacheTag), [{'tag': 'prices', 'version': tag_version}])
+    engine.dispose()
+
+
+def _chain_names():
+    return sorted(name for name, in db.session.query(GroceryChain.chain_name))
+
+
+@pytest.fixture()
+def app():
+    db_dir = tempfile.mkdtemp()
+    primary_path = os.path.join(db_dir, 'primary.db')
+    replica_path = os.path.join(db_dir, 'replica.db')
+    # The replica lags one invalidation behind
+    _make_database(primary_path, 'primary', 2)
+    _make_database(replica_path, 'replica', 1)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary_path}'
+    app.config['READ_DATABASE_URI'] = f'sqlite:///{replica_path}'
+    init_database(app)
+
+    @app.route('/chains', methods=['GET'])
+    def list_chains():
+        return jsonify(_chain_names())
+
+    @app.route('/chains/primary', methods=['GET'])
+    @read_from_primary
+    def list_primary_chains():
+        return jsonify(_chain_names())
+
+    @app.route('/chains/block', methods=['GET'])
+    def list_chains_in_block():
+        with use_primary():
+            names = _chain_names()
+        return jsonify({'inside': names, 'after': _chain_names()})
+
+    @app.route('/cache-tags', methods=['GET'])
+    def list_cache_tags():
+        return jsonify(CacheTag.get_versions())
+
+    @app.route('/chains', methods=['POST'])
+    def add_chain():
+        db.session.add(GroceryChain(chain_id='added', chain_name='added'))
+        db.session.commit()
+        return jsonify(_chain_names())
+
+    @app.route('/chains/touch', methods=['GET'])
+    def touch_chain():
+        # A GET that writes reads its own write from the primary afterwards
+        db.session.add(GroceryChain(chain_id='touched', chain_name='touched'))
+        db.session.flush()
+        names = _chain_names()
+        db.session.commit()
+        return jsonify(names)
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_get_reads_from_replica(app):
+    assert app.test_client().get('/chains').get_json() == ['replica']
+
+
+def test_read_primary_header_reads_from_primary(app):
+    response = app.test_client().get('/chains', headers={READ_PRIMARY_HEADER: '1'})
+    assert response.get_json() == ['primary']
+
+
+def test_read_from_primary_view_reads_from_primary(app):
+    assert app.test_client().get('/chains/primary').get_json() == ['primary']
+
+
+def test_use_primary_block_reads_from_primary(app):
+    assert app.test_client().get('/chains/block').get_json() == {'inside': ['primary'], 'after': ['replica']}
+
+
+def test_cache_tags_are_read_from_primary(app):
+    assert app.test_client().get('/cache-tags').get_json() == {'prices': 2}
+
+
+def test_post_writes_and_reads_primary(app):
+    assert app.test_client().post('/chains').get_json() == ['added', 'primary']
+
+
+def test_reads_after_a_write_stay_on_primary(app):
+    assert app.test_client().get('/chains/touch').get_json() == ['primary', 'touched']
+
+
+def test_replica_connection_rejects_writes(app):
+    with app.app_context():
+        engine = db.engines[READ_REPLICA_BIND]
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA query_only').scalar() == 1
+            with pytest.raises(OperationalError):
+                conn.execute(insert(GroceryChain), [{'chain_id': 'x', 'chain_name': 'x'}])
+
+
+def test_pragmas_apply_to_the_primary_engine_only(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        with db.engines[READ_REPLICA_BIND].connect() as conn:
+            assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'delete'
+
+    other = create_engine(f'sqlite:///{os.path.join(tempfile.mkdtemp(), "other.db")}')
+    with other.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'delete'
+    other.dispose()
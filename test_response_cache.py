@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Response cache tests
+
+Runs a small app with the in-process cache backend over a throwaway SQLite
+file holding the shared cache_tags table.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.cache_tag import CacheTag
+from src.services.database import init_database
+from src.services.response_cache import cached_response, init_response_cache, invalidate_tags
+
+
+@pytest.fixture()
+def app():
+    db_path = os.path.join(tempfile.mkdtemp(), 'response_cache.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    # Re-read the shared tag versions on every request
+    app.config['RESPONSE_CACHE_TAG_POLL_SECONDS'] = 0
+    init_database(app)
+    init_response_cache(app)
+    app.calls = 0
+
+    with app.app_context():
+        CacheTag.__table__.create(db.engine)
+
+    @app.route('/items', methods=['GET'])
+    @cached_response(tags=('items',))
+    def list_items():
+        app.calls += 1
+        return jsonify({'calls': app.calls, 'args': request.args.to_dict(flat=False)})
+
+    @app.route('/items/missing', methods=['GET'])
+    @cached_response(tags=('items',))
+    def missing_item():
+        app.calls += 1
+        return jsonify({'error': 'Not found'}), 404
+
+    @app.route('/items', methods=['POST'])
+    def add_item():
+        invalidate_tags('items')
+        return jsonify({'ok': True}), 201
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_second_request_is_served_from_cache(app):
+    client = app.test_client()
+    first = client.get('/items')
+    second = client.get('/items')
+
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_json() == first.get_json()
+    assert app.calls == 1
+
+
+def test_argument_order_shares_an_entry(app):
+    client = app.test_client()
+    client.get('/items?a=1&b=2')
+    assert client.get('/items?b=2&a=1').headers['X-Cache'] == 'HIT'
+    assert client.get('/items?a=2&b=2').headers['X-Cache'] == 'MISS'
+
+
+def test_matching_etag_returns_not_modified(app):
+    client = app.test_client()
+    etag = client.get('/items').headers['ETag']
+
+    response = client.get('/items', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_stale_etag_returns_the_body(app):
+    client = app.test_client()
+    client.get('/items')
+
+    response = client.get('/items', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert response.get_json()['calls'] == 1
+
+
+def test_write_invalidates_tagged_responses(app):
+    client = app.test_client()
+    client.get('/items')
+    client.post('/items')
+
+    response = client.get('/items')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['calls'] == 2
+
+
+def test_shared_tag_bump_invalidates_the_in_process_cache(app):
+    client = app.test_client()
+    client.get('/items')
+
+    # A writer outside this worker, such as the scraper's ingest pipeline
+    with app.app_context():
+        CacheTag.bump(['items'])
+
+    assert client.get('/items').headers['X-Cache'] == 'MISS'
+
+
+def test_error_responses_are_not_cached(app):
+    client = app.test_client()
+    client.get('/items/missing')
+    response = client.get('/items/missing')
+
+    assert response.status_code == 404
+    assert 'X-Cache' not in response.headers
+    assert app.calls == 2
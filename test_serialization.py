@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Serialization tests
+
+Checks that the column-level store encoder selects fields and views as
+requested and produces the same output as Store.to_dict().
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from werkzeug.datastructures import MultiDict
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.models.user import db
+from src.models.grocery_chain import GroceryChain
+# Imported so create_schema can resolve the deals table's foreign keys
+from src.models.product_category import ProductCategory
+from src.models.product import Product
+from src.models.store import STORE_ENCODER, Store
+from src.services.database import create_schema, init_database
+from src.services.serialization import json_response, parse_fields
+
+
+def _names(fields):
+    return [field.name for field in fields]
+
+
+def test_resolve_without_selection_returns_every_field():
+    assert STORE_ENCODER.resolve(None) is STORE_ENCODER.fields
+
+
+def test_resolve_selects_whole_groups():
+    fields = STORE_ENCODER.resolve(['store_id', 'coordinates'])
+    assert _names(fields) == ['store_id', 'coordinates.latitude', 'coordinates.longitude']
+
+
+def test_resolve_rejects_unknown_fields():
+    with pytest.raises(ValueError, match='bogus'):
+        STORE_ENCODER.resolve(['store_id', 'bogus'])
+
+
+def test_compact_view():
+    fields = STORE_ENCODER.resolve_args(MultiDict({'view': 'compact'}))
+    assert _names(fields) == [
+        'store_id', 'chain_id', 'store_name', 'coordinates.latitude', 'coordinates.longitude'
+    ]
+
+
+def test_full_view_and_fields_argument():
+    assert STORE_ENCODER.resolve_args(MultiDict({'view': 'full'})) is STORE_ENCODER.fields
+    assert _names(STORE_ENCODER.resolve_args(MultiDict({'fields': 'hours, services'}))) == ['hours', 'services']
+
+
+def test_unknown_view_is_rejected():
+    with pytest.raises(ValueError, match='Unknown view'):
+        STORE_ENCODER.resolve_args(MultiDict({'view': 'tiny'}))
+
+
+def test_parse_fields_skips_blank_names():
+    assert parse_fields(MultiDict({'fields': 'a,,b ,'})) == ['a', 'b']
+    assert parse_fields(MultiDict()) is None
+
+
+def test_compile_nests_dotted_fields_and_converts():
+    fields = STORE_ENCODER.resolve(['store_id', 'coordinates', 'services'])
+    encode = STORE_ENCODER.compile(fields)
+
+    assert encode(('s1', Decimal('43.65'), None, None)) == {
+        'store_id': 's1',
+        'coordinates': {'latitude': 43.65, 'longitude': None},
+        'services': []
+    }
+    assert STORE_ENCODER._plans[tuple(_names(fields))] is not None
+
+
+@pytest.fixture()
+def app():
+    db_path = os.path.join(tempfile.mkdtemp(), 'serialization.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    init_database(app)
+
+    with app.app_context():
+        create_schema()
+        db.session.add(GroceryChain(chain_id='metro', chain_name='Metro'))
+        db.session.add(Store(
+            store_id='store_1', chain_id='metro', store_name='Metro Queen',
+            address_street='1 Queen St', address_city='Toronto', address_province='ON',
+            postal_code='M5V 3A8', latitude=Decimal('43.6532'), longitude=Decimal('-79.3832'),
+            phone='416-555-0100', hours={'mon': '8-22'}, services=['pharmacy'],
+            updated_at=datetime(2024, 1, 2, 3, 4, 5)
+        ))
+        # No services or features
+        db.session.add(Store(
+            store_id='store_2', chain_id='metro', store_name='Metro King',
+            address_street='2 King St', address_city='Toronto', address_province='ON',
+            postal_code='M5H 1A1', latitude=Decimal('43.6487'), longitude=Decimal('-79.3817')
+        ))
+        db.session.commit()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_encoder_matches_to_dict(app):
+    with app.app_context():
+        encode = STORE_ENCODER.compile(STORE_ENCODER.fields)
+        rows = STORE_ENCODER.query(STORE_ENCODER.fields).order_by(Store.store_id).all()
+        stores = Store.query.order_by(Store.store_id).all()
+
+        assert [encode(row) for row in rows] == [store.to_dict() for store in stores]
+
+
+def test_query_appends_key_columns(app):
+    with app.app_context():
+        fields = STORE_ENCODER.resolve(['store_name'])
+        rows = STORE_ENCODER.query(fields).order_by(Store.store_id).all()
+
+        assert [tuple(row) for row in rows] == [('Metro Queen', 'store_1'), ('Metro King', 'store_2')]
+
+
+def test_json_response_writes_compact_bytes(app):
+    with app.test_request_context():
+        response = json_response({'a': [1, 2], 'b': 'é'}, status=201)
+
+    assert response.status_code == 201
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == {'a': [1, 2], 'b': 'é'}
+    assert b' ' not in response.data
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+SQLite pipeline tests
+
+Drives SQLitePipeline's writer methods directly against a throwaway file,
+and the batch queue of BatchWriterPipeline without a running reactor.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+from collections import deque
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from grocery_scraper.items import GroceryProductItem, StoreLocationItem
+from grocery_scraper.pipelines import BatchWriterPipeline, SQLitePipeline
+
+
+def _product(product_id, current_price, scraped_at, store_id='store_1'):
+    item = GroceryProductItem(
+        product_id=product_id,
+        name=product_id.title(),
+        store_id=store_id,
+        current_price=current_price,
+        regular_price=current_price,
+        on_sale=False,
+        source_url=f'https://example.com/{scraped_at}'
+    )
+    # Set after construction, which stamps the current time
+    item['scraped_at'] = scraped_at
+    return item
+
+
+@pytest.fixture()
+def pipeline():
+    pipeline = SQLitePipeline(os.path.join(tempfile.mkdtemp(), 'grocery_data.db'))
+    pipeline.logger = logging.getLogger('test')
+    pipeline.open_writer()
+    yield pipeline
+    pipeline.close_writer()
+
+
+def _write(pipeline, *items):
+    return pipeline.write([pipeline.item_row(item, dict(item)) for item in items])
+
+
+def _products(pipeline):
+    connection = sqlite3.connect(pipeline.sqlite_db)
+    rows = connection.execute(
+        'SELECT product_id, current_price, scraped_at FROM products ORDER BY product_id, id'
+    ).fetchall()
+    connection.close()
+    return rows
+
+
+def test_connection_pragmas(pipeline):
+    assert pipeline.cursor.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert pipeline.cursor.execute('PRAGMA synchronous').fetchone()[0] == 1
+
+
+def test_unchanged_price_refreshes_scraped_at(pipeline):
+    assert _write(pipeline, _product('milk', 4.99, '2024-01-01')) == \
+        {'products_inserted': 1, 'products_refreshed': 0, 'failed': 0}
+    assert _write(pipeline, _product('milk', 4.99, '2024-01-02')) == \
+        {'products_inserted': 0, 'products_refreshed': 1, 'failed': 0}
+
+    assert _products(pipeline) == [('milk', 4.99, '2024-01-02')]
+
+
+def test_changed_price_adds_a_version(pipeline):
+    _write(pipeline, _product('milk', 4.99, '2024-01-01'))
+    assert _write(pipeline, _product('milk', 3.99, '2024-01-02'))['products_inserted'] == 1
+
+    assert _products(pipeline) == [('milk', 4.99, '2024-01-01'), ('milk', 3.99, '2024-01-02')]
+
+
+def test_compares_against_the_latest_version_only(pipeline):
+    _write(pipeline, _product('milk', 4.99, '2024-01-01'))
+    _write(pipeline, _product('milk', 3.99, '2024-01-02'))
+
+    # Matches the older version but not the latest, so it is a change back
+    assert _write(pipeline, _product('milk', 4.99, '2024-01-03'))['products_inserted'] == 1
+    # Matches the latest version
+    assert _write(pipeline, _product('milk', 4.99, '2024-01-04'))['products_refreshed'] == 1
+
+    latest = pipeline.load_latest_versions([('milk', 'store_1')])
+    assert list(latest) == [('milk', 'store_1')]
+    assert len(_products(pipeline)) == 3
+
+
+def test_repeats_within_a_batch_collapse_into_one_row(pipeline):
+    counters = _write(
+        pipeline,
+        _product('milk', 4.99, '2024-01-01'),
+        _product('milk', 4.99, '2024-01-02'),
+        _product('bread', 2.49, '2024-01-01')
+    )
+
+    assert counters == {'products_inserted': 2, 'products_refreshed': 1, 'failed': 0}
+    assert _products(pipeline) == [('bread', 2.49, '2024-01-01'), ('milk', 4.99, '2024-01-02')]
+
+
+def test_lookup_spans_several_chunks(pipeline):
+    pipeline.LOOKUP_CHUNK_SIZE = 4
+    _write(pipeline, *[_product(f'p{i:02d}', 1.0, '2024-01-01') for i in range(9)])
+
+    latest = pipeline.load_latest_versions([(f'p{i:02d}', 'store_1') for i in range(9)] + [('missing', 'store_1')])
+    assert sorted(latest) == [(f'p{i:02d}', 'store_1') for i in range(9)]
+
+
+def test_store_locations_replace_on_store_id(pipeline):
+    _write(pipeline, StoreLocationItem(store_id='s1', store_name='Old'))
+    _write(pipeline, StoreLocationItem(store_id='s1', store_name='New'))
+
+    rows = pipeline.cursor.execute('SELECT store_id, store_name FROM store_locations').fetchall()
+    assert rows == [('s1', 'New')]
+
+
+class ListPipeline(BatchWriterPipeline):
+    def item_row(self, item, adapter):
+        return adapter['name']
+
+
+@pytest.fixture()
+def batch_pipeline():
+    # The queue state open_spider sets up, without the writer thread
+    pipeline = ListPipeline(batch_size=2, queue_size=1)
+    pipeline.pending = []
+    pipeline.queue = queue.Queue(maxsize=pipeline.queue_size)
+    pipeline.blocked = deque()
+    return pipeline
+
+
+def test_full_queue_holds_back_the_scraper(batch_pipeline):
+    pipeline = batch_pipeline
+    items = [{'name': name} for name in 'abcd']
+
+    assert pipeline.process_item(items[0], None) is items[0]
+    assert pipeline.process_item(items[1], None) is items[1]
+    assert pipeline.queue.qsize() == 1
+
+    pipeline.process_item(items[2], None)
+    waiting = pipeline.process_item(items[3], None)
+    results = []
+    waiting.addCallback(results.append)
+    assert not results
+
+    # The writer takes the first batch, freeing a slot for the parked one
+    assert pipeline.queue.get_nowait() == ['a', 'b']
+    pipeline.release_blocked()
+
+    assert results == [items[3]]
+    assert pipeline.queue.get_nowait() == ['c', 'd']
+
+
+def test_parked_batches_keep_their_order(batch_pipeline):
+    pipeline = batch_pipeline
+    pipeline.enqueue(['first'])
+    second = pipeline.enqueue(['second'])
+    third = pipeline.enqueue(['third'])
+
+    written = []
+    for waiting in (second, third):
+        written.append(pipeline.queue.get_nowait())
+        pipeline.release_blocked()
+        assert waiting.called
+    written.append(pipeline.queue.get_nowait())
+
+    assert written == [['first'], ['second'], ['third']]